@@ -0,0 +1,113 @@
+"""Crash-safe, multi-process helpers for the airport cache directory.
+
+Custom airports are appended to a small JSON-lines journal instead of
+rewriting the whole cache; the journal is folded back into the JSON cache
+and snapshot (compaction) once it grows past a threshold. Every full
+rewrite goes through a temp file and an atomic rename, and writers
+serialize on an advisory lock file so concurrent runs can share one
+cache directory.
+"""
+import contextlib
+import json
+import os
+import re
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+# Journal entries at which it is compacted (on startup or when one is appended)
+JOURNAL_COMPACT_THRESHOLD = 64
+
+# Airport codes the cache can hold; the snapshot stores codes as ASCII
+_CODE = re.compile(r'[A-Z0-9]{2,8}')
+
+
+def valid_code(code):
+    """True for an (uppercase) airport code of 2-8 ASCII letters or digits."""
+    return isinstance(code, str) and _CODE.fullmatch(code) is not None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on `path` for the duration of the block."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path, data):
+    """Replace `path` with `data` (str or bytes) via a temp file and rename.
+
+    Readers see either the old file or the new one, never a partial write.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    mode = 'wb' if isinstance(data, (bytes, bytearray)) else 'w'
+    encoding = None if 'b' in mode else 'utf-8'
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class AirportJournal:
+    """Append-only JSON-lines log of custom airports."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def append(self, code, info):
+        """Append one airport record; a single short write with O_APPEND."""
+        line = json.dumps({'code': code, 'info': info}, ensure_ascii=False) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self):
+        """Return {code: info} for all journal entries, last write wins.
+
+        A torn final line (crash during append) and entries whose code the
+        cache cannot store are ignored.
+        """
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    code = entry['code'].upper()
+                    if valid_code(code):
+                        entries[code] = entry['info']
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+        return entries
+
+    def reset(self):
+        """Empty the journal after its entries have been compacted."""
+        if self.path.exists():
+            atomic_write(self.path, '')
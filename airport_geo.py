@@ -0,0 +1,179 @@
+"""Spatial index over airport coordinates (requires NumPy).
+
+Airports are bucketed into a fixed latitude/longitude grid stored as two
+arrays: airport ids sorted by cell, and the start of every cell in that
+order. A radius query only measures the airports in the cells overlapping
+the search circle; nearest-N grows the radius until enough airports fall
+inside it. Distances are great-circle kilometres on a spherical Earth,
+computed from precomputed unit vectors so millions of code pairs are
+measured in one vectorized pass.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+# Grid resolution; one degree keeps cells small without a huge cell table
+CELL_DEGREES = 1.0
+_ROWS = int(round(180 / CELL_DEGREES))
+_COLS = int(round(360 / CELL_DEGREES))
+
+# First radius tried by nearest(); doubled until enough airports are found
+_INITIAL_RADIUS_KM = 100.0
+
+# Fastest plausible gate-to-gate average for a scheduled airliner, tailwinds included
+MAX_SPEED_KMH = 1200.0
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def _chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2.0, 1.0))
+
+
+def great_circle_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees (array-like)."""
+    chord = np.linalg.norm(_unit_vectors(lat1, lon1) - _unit_vectors(lat2, lon2), axis=-1)
+    return _chord_to_km(chord)
+
+
+def _cells(lat, lon):
+    rows = np.clip(np.floor((np.asarray(lat) + 90.0) / CELL_DEGREES), 0, _ROWS - 1).astype(np.int64)
+    cols = np.floor((np.asarray(lon) + 180.0) / CELL_DEGREES).astype(np.int64) % _COLS
+    return rows * _COLS + cols
+
+
+class AirportGeoIndex:
+    """Grid index answering nearest-airport, radius and bulk distance queries."""
+
+    def __init__(self, codes, lat, lon, resolve=None):
+        self.codes = list(codes)
+        # Optional code -> indexed code fallback for codes that are not keys (e.g. ICAO codes)
+        self.resolve = resolve
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.xyz = _unit_vectors(self.lat, self.lon)
+        self._ids = {code: i for i, code in enumerate(self.codes)}
+
+        # Only airports with coordinates go into the grid
+        located = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        cells = _cells(self.lat[located], self.lon[located])
+        order = np.argsort(cells, kind='stable')
+        self._cell_ids = located[order]
+        self._cell_starts = np.searchsorted(cells[order], np.arange(_ROWS * _COLS + 1))
+
+    @classmethod
+    def build(cls, coordinates, resolve=None):
+        """Build an index from (code, lat, lon) tuples; missing coordinates may be NaN or ''."""
+        codes, lat, lon = [], [], []
+        for code, la, lo in coordinates:
+            codes.append(code.upper())
+            lat.append(_float(la))
+            lon.append(_float(lo))
+        return cls(codes, lat, lon, resolve)
+
+    def __len__(self):
+        return len(self._cell_ids)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Ids of airports in grid cells that may lie within radius_km of the point."""
+        radius_deg = math.degrees(radius_km / EARTH_RADIUS_KM)
+        lat_min, lat_max = lat - radius_deg, lat + radius_deg
+        if lat_min <= -90.0 or lat_max >= 90.0 or radius_deg >= 90.0:
+            lon_span = 180.0  # the circle reaches a pole: every longitude
+        else:
+            lon_span = math.degrees(math.asin(min(1.0, math.sin(math.radians(radius_deg))
+                                                  / math.cos(math.radians(lat)))))
+
+        row_min = max(0, int((lat_min + 90.0) // CELL_DEGREES))
+        row_max = min(_ROWS - 1, int((lat_max + 90.0) // CELL_DEGREES))
+        if lon_span >= 180.0:
+            col_ranges = [(0, _COLS - 1)]
+        else:
+            col_min = int((lon - lon_span + 180.0) // CELL_DEGREES)
+            col_max = int((lon + lon_span + 180.0) // CELL_DEGREES)
+            if col_max - col_min >= _COLS - 1:
+                col_ranges = [(0, _COLS - 1)]
+            elif col_min < 0:
+                col_ranges = [(0, col_max), (col_min % _COLS, _COLS - 1)]
+            elif col_max >= _COLS:
+                col_ranges = [(col_min, _COLS - 1), (0, col_max % _COLS)]
+            else:
+                col_ranges = [(col_min, col_max)]
+
+        # Cells in one row are contiguous, so each (row, column range) is a single slice
+        starts = self._cell_starts
+        pieces = [self._cell_ids[starts[row * _COLS + c0]:starts[row * _COLS + c1 + 1]]
+                  for row in range(row_min, row_max + 1) for c0, c1 in col_ranges]
+        return np.concatenate(pieces) if pieces else np.empty(0, dtype=np.intp)
+
+    def within(self, lat, lon, radius_km):
+        """Return [(code, km), ...] for airports within radius_km of a point, nearest first."""
+        ids = self._candidates(lat, lon, radius_km)
+        distances = _chord_to_km(np.linalg.norm(self.xyz[ids] - _unit_vectors(lat, lon), axis=-1))
+        keep = distances <= radius_km
+        ids, distances = ids[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return [(self.codes[i], float(d)) for i, d in zip(ids[order], distances[order])]
+
+    def nearest(self, lat, lon, n=1, max_km=None):
+        """Return the n airports nearest to a point as [(code, km), ...]."""
+        limit = HALF_CIRCUMFERENCE_KM if max_km is None else min(max_km, HALF_CIRCUMFERENCE_KM)
+        radius = min(_INITIAL_RADIUS_KM, limit)
+        while True:
+            found = self.within(lat, lon, radius)
+            # Everything outside the radius is farther than everything inside it
+            if len(found) >= n or radius >= limit:
+                return found[:n]
+            radius = min(radius * 2.0, limit)
+
+    def ids(self, codes):
+        """Map airport codes to row ids (-1 for unknown codes)."""
+        get = self._ids.get
+        codes = list(codes)
+        ids = np.fromiter((get(code, -1) for code in codes), dtype=np.intp, count=len(codes))
+        resolved = {}
+        for i in np.flatnonzero(ids < 0):
+            code = str(codes[i]).upper()
+            if code not in resolved:
+                resolved[code] = get(code, -1)
+                if resolved[code] < 0 and self.resolve is not None:
+                    resolved[code] = get(self.resolve(code), -1)
+            ids[i] = resolved[code]
+        return ids
+
+    def distances(self, codes_a, codes_b):
+        """Great-circle km between paired airport codes; NaN where either is unknown."""
+        a, b = self.ids(codes_a), self.ids(codes_b)
+        known = (a >= 0) & (b >= 0)
+        result = np.full(len(a), np.nan)
+        result[known] = _chord_to_km(np.linalg.norm(self.xyz[a[known]] - self.xyz[b[known]], axis=-1))
+        return result
+
+    def distance(self, code_a, code_b):
+        """Great-circle km between two airports (NaN if either is unknown)."""
+        return float(self.distances([code_a], [code_b])[0])
+
+    def impossible_flights(self, departure_airports, arrival_airports, durations, max_speed_kmh=MAX_SPEED_KMH):
+        """Flag flights too fast to be real, e.g. a 30-minute SYD-LHR.
+
+        `durations` are in seconds (like tz_batch.normalize_flights()['duration']).
+        Returns a boolean array; flights with unknown airports are never flagged.
+        """
+        km = self.distances(departure_airports, arrival_airports)
+        hours = np.maximum(np.asarray(durations, dtype=np.float64), 0.0) / 3600.0
+        with np.errstate(invalid='ignore'):
+            return km > hours * max_speed_kmh
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,90 @@
+"""Compact, read-only airport records.
+
+A dict per airport costs a hash table plus eight key slots, and repeats the
+same timezone, country and city strings thousands of times. AirportRecord
+keeps the fields in __slots__ and interns the shared strings, while still
+reading like the old dicts (record['tz'], record.get('name', default),
+dict(record), json.dumps(..., default=dict)).
+"""
+import sys
+from collections.abc import Mapping
+
+# Field order matches the JSON cache and the airportsdata conversion
+FIELDS = ('name', 'city', 'country', 'tz', 'lat', 'lon', 'alt', 'icao')
+_FIELD_SET = frozenset(FIELDS)
+
+# Strings repeated across many airports share one object
+_INTERNED = frozenset(('city', 'country', 'tz', 'alt'))
+
+
+class AirportRecord(Mapping):
+    """Immutable airport record with dict-style read access.
+
+    Fields that were never given stay absent, exactly like a missing dict
+    key, so record.get('icao', default) behaves as before.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        setattr_ = object.__setattr__
+        for field, value in fields.items():
+            if field not in _FIELD_SET:
+                raise KeyError(field)
+            if field in _INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr_(self, field, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Compact a plain dict record; dicts with unknown fields are returned unchanged."""
+        if isinstance(data, AirportRecord) or not _FIELD_SET.issuperset(data):
+            return data
+        return cls(**data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("airport records are read-only")
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return default
+
+    def __contains__(self, key):
+        return key in _FIELD_SET and hasattr(self, key)
+
+    def __iter__(self):
+        return (field for field in FIELDS if hasattr(self, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        # Truth tests are common (`if info:`); stop at the first field present
+        return any(hasattr(self, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f"AirportRecord({dict(self)!r})"
+
+    def __reduce__(self):
+        return (_rebuild, (dict(self),))
+
+
+def _rebuild(fields):
+    return AirportRecord(**fields)
+
+
+def compact_airports(airports):
+    """Replace the dict records of an {code: info} mapping in place; returns it."""
+    from_dict = AirportRecord.from_dict
+    for code, info in airports.items():
+        airports[code] = from_dict(info)
+    return airports
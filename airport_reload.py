@@ -0,0 +1,80 @@
+"""Background hot reload of the airport data for long-lived processes.
+
+AirportReloader polls the files an AirportDatabase is built from (the
+JSON cache, snapshot and journal, and the airportsdata table itself) and
+calls AirportDatabase.reload() when any of them changes. Lookups never
+wait for it: the new version is loaded on the reloader thread and swapped
+in with a single reference assignment, and a failed reload keeps the
+current data.
+"""
+import os
+import threading
+from pathlib import Path
+
+from instrumentation import metrics
+
+try:
+    import airportsdata
+    AIRPORTSDATA_FILE = Path(airportsdata.__file__).with_name('airports.csv')
+except ImportError:
+    AIRPORTSDATA_FILE = None
+
+# Seconds between checks of the source files
+DEFAULT_INTERVAL = 30.0
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def source_signature(airport_db):
+    """Return (airportsdata stamp, cache file stamps) to compare between polls."""
+    package = _stamp(AIRPORTSDATA_FILE) if AIRPORTSDATA_FILE is not None else None
+    if not airport_db.use_cache:
+        return package, ()
+    files = (airport_db.cache_file, airport_db.snapshot_file, airport_db.journal.path)
+    return package, tuple(_stamp(path) for path in files)
+
+
+class AirportReloader(threading.Thread):
+    """Daemon thread that reloads an AirportDatabase when its sources change."""
+
+    def __init__(self, airport_db, interval=DEFAULT_INTERVAL):
+        super().__init__(name='airport-reloader', daemon=True)
+        self.airport_db = airport_db
+        self.interval = interval
+        self._signature = source_signature(airport_db)
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Reload if a source changed since the last check. Returns True if it did."""
+        signature = source_signature(self.airport_db)
+        if signature == self._signature:
+            return False
+        # A new airportsdata table is only picked up by rebuilding the snapshot
+        rebuild = signature[0] != self._signature[0]
+        try:
+            version = self.airport_db.reload(rebuild=rebuild)
+        except Exception as e:
+            print(f"Note: Could not reload airport data: {e}")
+            metrics.incr('reloads_total', result='error')
+            return False
+        # Taken after the reload, which may rewrite the cache and snapshot itself;
+        # otherwise its own writes would trigger a second, pointless reload
+        self._signature = source_signature(self.airport_db)
+        print(f"✓ Reloaded airport data (version {version})")
+        return True
+
+    def stop(self, timeout=None):
+        """Stop polling and wait for the thread to exit."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,223 @@
+"""Free-text airport search ("Osaka", "Kansai", "KIX") over a prebuilt index.
+
+The index mirrors the web app's Fuse.js search over code, name and city:
+exact and prefix matches on IATA/ICAO codes rank first, then whole-word and
+prefix matches on name and city words, with a trigram pass over the word
+vocabulary to tolerate typos in words that match nothing directly (ranked
+by edit distance, so "Kansia" prefers "kansai" over "kansas"). Each query
+word counts once per airport, and rarer words weigh a little more, so
+"kansai intl" is decided by "kansai". Query words are walked rarest first:
+a common word ("airport") only scores the airports a rarer one found, and
+a word on its own walks at most MAX_POSTINGS postings (lowest codes
+first, which is also how ties rank). The index is built once from the
+airport table and persisted next to the cache as JSON.
+"""
+import json
+import re
+import unicodedata
+from bisect import bisect_left
+from heapq import nsmallest
+
+INDEX_VERSION = 1
+
+# Field tags stored in token postings
+NAME, CITY = 0, 1
+
+# Candidate caps keep very short or very common queries well under a millisecond
+MAX_PREFIX_TOKENS = 64
+MAX_FUZZY_TOKENS = 8
+MAX_POSTINGS = 512
+MIN_TRIGRAM_SIMILARITY = 0.5
+# Extra weight of a word matching a single airport; it fades as the word gets common.
+# Kept below 0.5 so a prefix or typo match never outranks an exact word match.
+RARITY_BONUS = 0.45
+
+_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to spaces."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(_SPLIT.split(text)).strip()
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    """Levenshtein distance counting a swap of adjacent letters as one edit."""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def _index_trigrams(tokens):
+    """Map each trigram to the ids of the (sorted) tokens containing it."""
+    trigrams = {}
+    for token_id, token in enumerate(tokens):
+        for gram in _trigrams(token):
+            trigrams.setdefault(gram, []).append(token_id)
+    return trigrams
+
+
+class AirportSearchIndex:
+    """Inverted index over airport codes, names and cities."""
+
+    def __init__(self, codes, icaos, tokens, postings, trigrams, signature=''):
+        self.codes = codes              # airport id -> IATA code
+        self.icaos = icaos              # airport id -> ICAO code
+        self.tokens = tokens            # sorted unique name/city words
+        self.postings = postings        # token id -> [airport_id * 2 + field, ...]
+        self.trigrams = trigrams        # trigram -> [token id, ...]
+        self.signature = signature
+        self._code_ids = {code: i for i, code in enumerate(codes)}
+        self._icao_ids = {icao: i for i, icao in enumerate(icaos) if icao}
+        self._sorted_codes = sorted(codes)
+
+    @classmethod
+    def build(cls, airports, signature=''):
+        """Build an index from an {code: info} mapping."""
+        codes = sorted(code.upper() for code in airports)
+        records = {code.upper(): info for code, info in airports.items()}
+        icaos = [str(records[code].get('icao') or '').upper() for code in codes]
+
+        token_postings = {}
+        for airport_id, code in enumerate(codes):
+            info = records[code]
+            for field, value in ((NAME, info.get('name')), (CITY, info.get('city'))):
+                for word in normalize(value).split():
+                    token_postings.setdefault(word, set()).add(airport_id * 2 + field)
+
+        tokens = sorted(token_postings)
+        postings = [sorted(token_postings[token]) for token in tokens]
+        return cls(codes, icaos, tokens, postings, _index_trigrams(tokens), signature)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"unsupported search index version {data.get('version')}")
+        # Exports for the web app leave the trigram table out; it is cheap to rebuild
+        trigrams = data.get('trigrams') or _index_trigrams(data['tokens'])
+        return cls(data['codes'], data['icaos'], data['tokens'], data['postings'], trigrams,
+                   data.get('signature', ''))
+
+    def to_json(self, trigrams=True):
+        data = {
+            'version': INDEX_VERSION,
+            'signature': self.signature,
+            'codes': self.codes,
+            'icaos': self.icaos,
+            'tokens': self.tokens,
+            'postings': self.postings,
+        }
+        if trigrams:
+            data['trigrams'] = self.trigrams
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    def _prefix_range(self, sorted_list, prefix):
+        start = bisect_left(sorted_list, prefix)
+        end = bisect_left(sorted_list, prefix + '￿', start)
+        return start, end
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (code, score) pairs, best match first."""
+        text = normalize(query)
+        if not text:
+            return []
+        words = text.split()
+        scores = {}
+
+        def add(airport_id, points):
+            scores[airport_id] = scores.get(airport_id, 0.0) + points
+
+        def add_token(best, postings, points):
+            # A word matching both the name and the city (or several words) counts once, at its best
+            for posting in postings:
+                if points > best.get(posting >> 1, 0.0):
+                    best[posting >> 1] = points
+
+        # Codes: a single 3-4 character word is most likely an IATA/ICAO code
+        compact = text.replace(' ', '').upper()
+        code_match = False
+        if len(words) == 1 and len(compact) <= 4:
+            if compact in self._code_ids:
+                add(self._code_ids[compact], 100.0)
+                code_match = True
+            if compact in self._icao_ids:
+                add(self._icao_ids[compact], 90.0)
+                code_match = True
+            start, end = self._prefix_range(self._sorted_codes, compact)
+            for code in self._sorted_codes[start:min(end, start + MAX_PREFIX_TOKENS)]:
+                if code != compact:
+                    add(self._code_ids[code], 40.0)
+
+        # Words: exact word matches beat prefix matches; shorter completions rank higher
+        matches = []
+        for word in words:
+            matched = []
+            start, end = self._prefix_range(self.tokens, word)
+            if start == end:
+                if not code_match:
+                    matched.extend((token_id, 20.0 * similarity) for token_id, similarity in self._fuzzy_tokens(word))
+            for token_id in range(start, min(end, start + MAX_PREFIX_TOKENS)):
+                token = self.tokens[token_id]
+                matched.append((token_id, 30.0 if token == word else 20.0 * len(word) / len(token)))
+            matches.append((sum(len(self.postings[token_id]) for token_id, _ in matched), matched))
+
+        for size, matched in sorted(matches, key=lambda match: match[0]):
+            best = {}
+            candidates = sorted(scores) if size > MAX_POSTINGS else ()
+            budget = MAX_POSTINGS
+            for token_id, points in matched:
+                postings = self.postings[token_id]
+                points *= 1.0 + RARITY_BONUS / len(postings)
+                if candidates:
+                    # A common word behind a rarer one: look up only the airports found so far
+                    add_token(best, self._postings_of(postings, candidates), points)
+                elif budget > 0:
+                    add_token(best, postings[:budget], points)
+                    budget -= len(postings)
+            for airport_id, points in best.items():
+                add(airport_id, points)
+
+        ranked = nsmallest(limit, scores.items(), key=lambda item: (-item[1], self.codes[item[0]]))
+        return [(self.codes[airport_id], round(score, 2)) for airport_id, score in ranked]
+
+    @staticmethod
+    def _postings_of(postings, airport_ids):
+        """Yield the postings (sorted) that belong to the given airports."""
+        for airport_id in airport_ids:
+            i = bisect_left(postings, airport_id * 2)
+            if i < len(postings) and postings[i] >> 1 == airport_id:
+                yield postings[i]
+
+    def _fuzzy_tokens(self, word):
+        """Return [(token_id, similarity)] for words close to a misspelled word, best first.
+
+        Trigram overlap (Dice) finds the candidates; edit distance ranks them.
+        """
+        grams = _trigrams(word)
+        overlap = {}
+        for gram in grams:
+            for token_id in self.trigrams.get(gram, ()):
+                overlap[token_id] = overlap.get(token_id, 0) + 1
+
+        similar = []
+        for token_id, count in overlap.items():
+            token = self.tokens[token_id]
+            if 2.0 * count / (len(grams) + len(token) + 1) >= MIN_TRIGRAM_SIMILARITY:
+                similarity = 1.0 - _edit_distance(word, token) / max(len(word), len(token))
+                if similarity > 0:
+                    similar.append((-similarity, token_id))
+        return [(token_id, -negated) for negated, token_id in sorted(similar)[:MAX_FUZZY_TOKENS]]
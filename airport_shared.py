@@ -0,0 +1,72 @@
+"""Read-only airport table shared between processes through shared memory.
+
+The parent process serializes its whole airport table once, in the
+airport_snapshot format, into a multiprocessing.shared_memory block.
+Worker processes attach to the block by name and read the snapshot
+straight from the shared pages, so N workers cost one copy of the data
+and start without parsing airportsdata or the JSON cache.
+
+    with airport_db.share() as table:             # parent
+        ...pass table.name to the workers...
+    AirportDatabase.attach_shared(name)           # worker
+
+A published table is fixed at the version it was published from; reloads
+of the parent's database do not change it.
+"""
+from multiprocessing import shared_memory
+
+from airport_snapshot import AirportSnapshot, build_snapshot
+
+SHARED_SOURCE = 'shared'
+
+
+class SharedAirportTable:
+    """Owner of the shared memory block holding one published airport table.
+
+    Closing it (or leaving the with block) unlinks the block; processes
+    that are still attached keep their mapping until they close it.
+    """
+
+    def __init__(self, airport_db):
+        snapshot = airport_db.snapshot
+        if snapshot is not None and not airport_db.airports:
+            # Already in snapshot format: publish the mapped bytes as they are
+            data = snapshot.buf
+        else:
+            data = build_snapshot(airport_db.all_airports(), source=SHARED_SOURCE)
+        self._shm = shared_memory.SharedMemory(create=True, size=len(data))
+        self._shm.buf[:len(data)] = data
+        self.name = self._shm.name
+        self.size = len(data)
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AttachedAirportTable:
+    """A worker's mapping of a published table, read through an AirportSnapshot."""
+
+    def __init__(self, name):
+        try:
+            # Only the publisher should unlink the block (Python 3.13+)
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        # The snapshot reads the shared pages in place; nothing is copied
+        self.snapshot = AirportSnapshot(self._shm.buf)
+
+    def close(self):
+        # The snapshot's views must be released before the mapping can close
+        if self._shm is not None:
+            self.snapshot.close()
+            self._shm.close()
+            self._shm = None
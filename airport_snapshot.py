@@ -0,0 +1,372 @@
+"""Compact, memory-mapped binary snapshot of the airport database.
+
+Layout (little-endian, every section 8-byte aligned):
+
+    header    magic, format version, key width, record count,
+              string count, string blob size, source tag,
+              ICAO entry count, city entry count
+    keys      record_count fixed-width airport codes, sorted, NUL padded
+    records   record_count x (name, city, country, tz, icao, alt, lat, lon)
+              string indexes, a word of 3-bit type tags (one per field),
+              then lat, lon as float64 (NaN when unknown)
+    icao      (ICAO code, record index) pairs sorted by code, then record
+    cities    (normalized city string index, record index) pairs sorted
+              by city, then record
+    offsets   string_count + 1 uint32 offsets into the string blob
+    strings   UTF-8 blob of the interned string table (index 0 is '')
+
+Lookups binary-search the key section (or one of the two secondary
+indexes, for ICAO codes and city names) and decode only the fields they
+touch, so opening a snapshot costs the same whether it holds ten airports
+or ten thousand, and every process mapping it shares the same pages.
+The type tags record which fields a record had and whether each was a
+str, int, float or None, so decoded records equal the ones written.
+Numeric lat/lon values live in the float64 columns, other values of any
+field in the string table.
+"""
+import math
+import mmap
+import struct
+from bisect import bisect_left
+from pathlib import Path
+
+from airport_cache import atomic_write
+from airport_records import AirportRecord
+from airport_search import normalize
+
+MAGIC = b'A2CSNAP\x00'
+VERSION = 3
+
+HEADER = struct.Struct('<8sHHIII32sII')
+RECORD = struct.Struct('<9I2d')
+OFFSET = struct.Struct('<I')
+ICAO_ENTRY = struct.Struct('<8sI')
+CITY_ENTRY = struct.Struct('<2I')
+# lat, lon at the end of each RECORD
+COORDS = struct.Struct('<2d')
+
+# Order of the string indexes (and type tags) in RECORD
+STRING_FIELDS = ('name', 'city', 'country', 'tz', 'icao', 'alt', 'lat', 'lon')
+TZ_INDEX = STRING_FIELDS.index('tz')
+COORD_FIELDS = frozenset(('lat', 'lon'))
+# Type tags: what a field held when the snapshot was written
+ABSENT, STR, INT, FLOAT, NONE = range(5)
+_TAGS = {str: STR, int: INT, float: FLOAT, type(None): NONE}
+TAG_BITS = 3
+# Codes remembered as missing (e.g. ICAO codes tried as IATA keys) before the memo is reset
+MAX_MISSES = 65536
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated or of another version."""
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _coord(value):
+    """Store a lat/lon value as float64, using NaN for missing values."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def build_snapshot(airports, source=''):
+    """Serialize an {code: info} mapping into snapshot bytes."""
+    codes = sorted(code.upper() for code in airports)
+    encoded = [code.encode('ascii') for code in codes]
+    key_width = max((len(k) for k in encoded), default=3)
+
+    strings = ['']
+    string_index = {'': 0}
+
+    def intern(value):
+        value = '' if value is None else str(value)
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    def field(info, name):
+        """Return (type tag, string index) of one field."""
+        if name not in info:
+            return ABSENT, 0
+        value = info[name]
+        tag = _TAGS.get(type(value), STR)
+        if tag == NONE or (name in COORD_FIELDS and tag in (INT, FLOAT)):
+            # Numeric coordinates are read back from the float64 columns
+            return tag, 0
+        return tag, intern(value)
+
+    records = bytearray()
+    icao_entries, city_entries = [], []
+    lookup = {code.upper(): info for code, info in airports.items()}
+    for i, code in enumerate(codes):
+        info = lookup[code]
+        tags, indexes = 0, []
+        for n, name in enumerate(STRING_FIELDS):
+            tag, index = field(info, name)
+            tags |= tag << (n * TAG_BITS)
+            indexes.append(index)
+        records += RECORD.pack(*indexes, tags, _coord(info.get('lat')), _coord(info.get('lon')))
+        icao = str(info.get('icao') or '').strip().upper().encode('ascii', 'ignore')
+        if 0 < len(icao) <= ICAO_ENTRY.size - 4:
+            icao_entries.append((icao, i))
+        city = normalize(info.get('city'))
+        if city:
+            city_entries.append((city, i))
+
+    icao_section = b''.join(ICAO_ENTRY.pack(icao, i) for icao, i in sorted(icao_entries))
+    city_section = b''.join(CITY_ENTRY.pack(intern(city), i) for city, i in sorted(city_entries))
+
+    blob = bytearray()
+    offsets = bytearray(OFFSET.pack(0))
+    for value in strings:
+        blob += value.encode('utf-8')
+        offsets += OFFSET.pack(len(blob))
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, key_width, len(codes), len(strings),
+                                len(blob), source.encode('utf-8')[:32], len(icao_entries), len(city_entries)))
+    for section in (b''.join(k.ljust(key_width, b'\x00') for k in encoded), records,
+                    icao_section, city_section, offsets, blob):
+        out += b'\x00' * (_align(len(out)) - len(out))
+        out += section
+    return bytes(out)
+
+
+def write_snapshot(airports, path, source=''):
+    """Write a snapshot atomically (temp file + rename) so readers never see a partial file."""
+    atomic_write(path, build_snapshot(airports, source))
+
+
+class _Keys:
+    """Sequence view over a sorted section of fixed-width keys, for bisect."""
+
+    def __init__(self, buf, offset, width, count, stride=None):
+        self.buf, self.offset, self.width, self.count = buf, offset, width, count
+        self.stride = stride or width
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.stride
+        return bytes(self.buf[start:start + self.width])
+
+
+class _CityKeys:
+    """Sequence view over the normalized city names of the city section, for bisect."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.city_count
+
+    def __getitem__(self, i):
+        snapshot = self.snapshot
+        return snapshot._string(CITY_ENTRY.unpack_from(snapshot.buf, snapshot.cities_offset + i * CITY_ENTRY.size)[0])
+
+
+class AirportSnapshot:
+    """Read-only airport table backed by a snapshot buffer (usually an mmap)."""
+
+    def __init__(self, buffer, source_file=None):
+        self._mmap = buffer if isinstance(buffer, mmap.mmap) else None
+        self.source_file = source_file
+
+        # Validate before taking a memoryview, so a rejected mmap can still be closed
+        if len(buffer) < HEADER.size:
+            raise SnapshotError("snapshot is truncated")
+        (magic, version, key_width, count, string_count, blob_size, source,
+         icao_count, city_count) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise SnapshotError("not an airport snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}")
+
+        self.key_width = key_width
+        self.count = count
+        self.icao_count = icao_count
+        self.city_count = city_count
+        self.source = source.rstrip(b'\x00').decode('utf-8')
+
+        self.keys_offset = _align(HEADER.size)
+        self.records_offset = _align(self.keys_offset + count * key_width)
+        self.icao_offset = _align(self.records_offset + count * RECORD.size)
+        self.cities_offset = _align(self.icao_offset + icao_count * ICAO_ENTRY.size)
+        self.offsets_offset = _align(self.cities_offset + city_count * CITY_ENTRY.size)
+        self.strings_offset = _align(self.offsets_offset + (string_count + 1) * OFFSET.size)
+        if len(buffer) < self.strings_offset + blob_size:
+            raise SnapshotError("snapshot is truncated")
+        self.buf = memoryview(buffer)
+
+        self._keys = _Keys(self.buf, self.keys_offset, key_width, count)
+        self._icao_keys = _Keys(self.buf, self.icao_offset, ICAO_ENTRY.size - 4, icao_count, ICAO_ENTRY.size)
+        self._city_keys = _CityKeys(self)
+        self._strings = {}
+        # Records decoded so far, by index and by looked-up code; they are
+        # immutable and safe to share, so repeat lookups skip the bisect
+        self._records = {}
+        self._by_code = {}
+        self._by_icao = {}
+        self._misses = set()
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a snapshot file read-only."""
+        with open(path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError("snapshot is empty")
+        try:
+            return cls(mm, source_file=Path(path))
+        except SnapshotError:
+            mm.close()
+            raise
+
+    def close(self):
+        self.buf.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, code):
+        return self._find(code) >= 0
+
+    def _find(self, code):
+        """Return the record index for a code, or -1."""
+        if code in self._misses:
+            return -1
+        i = self._bisect(code)
+        if i < 0:
+            if len(self._misses) >= MAX_MISSES:
+                self._misses.clear()
+            self._misses.add(code)
+        return i
+
+    def _bisect(self, code):
+        try:
+            key = code.upper().encode('ascii')
+        except (AttributeError, UnicodeEncodeError):
+            return -1
+        if len(key) > self.key_width:
+            return -1
+        key = key.ljust(self.key_width, b'\x00')
+        i = bisect_left(self._keys, key)
+        if i < self.count and self._keys[i] == key:
+            return i
+        return -1
+
+    def _string(self, index):
+        value = self._strings.get(index)
+        if value is None:
+            start, end = struct.unpack_from('<2I', self.buf, self.offsets_offset + index * OFFSET.size)
+            value = bytes(self.buf[self.strings_offset + start:self.strings_offset + end]).decode('utf-8')
+            self._strings[index] = value
+        return value
+
+    def _record(self, i):
+        record = self._records.get(i)
+        if record is None:
+            *indexes, tags, lat, lon = RECORD.unpack_from(self.buf, self.records_offset + i * RECORD.size)
+            numbers = {'lat': lat, 'lon': lon}
+            fields = {}
+            for n, (name, index) in enumerate(zip(STRING_FIELDS, indexes)):
+                tag = (tags >> (n * TAG_BITS)) & ((1 << TAG_BITS) - 1)
+                if tag == ABSENT:
+                    continue
+                if tag == NONE:
+                    fields[name] = None
+                elif name in COORD_FIELDS and tag != STR:
+                    fields[name] = int(numbers[name]) if tag == INT else numbers[name]
+                else:
+                    value = self._string(index)
+                    fields[name] = int(value) if tag == INT else float(value) if tag == FLOAT else value
+            record = self._records[i] = AirportRecord(**fields)
+        return record
+
+    def get(self, code, default=None):
+        """Return the airport record for a code (a read-only AirportRecord)."""
+        record = self._by_code.get(code)
+        if record is None:
+            i = self._find(code)
+            if i < 0:
+                return default
+            record = self._by_code[code] = self._record(i)
+        return record
+
+    def get_timezone(self, code):
+        """Return only the timezone for a code ('' if unknown)."""
+        record = self._by_code.get(code)
+        if record is not None:
+            return record.tz
+        i = self._find(code)
+        if i < 0:
+            return ''
+        index = struct.unpack_from('<I', self.buf, self.records_offset + i * RECORD.size + TZ_INDEX * 4)[0]
+        return self._string(index)
+
+    def _code(self, i):
+        return self._keys[i].rstrip(b'\x00').decode('ascii')
+
+    def code_for_icao(self, icao):
+        """Return the airport code whose record has this ICAO code, or None."""
+        code = self._by_icao.get(icao)
+        if code is not None:
+            return code
+        try:
+            key = icao.upper().encode('ascii')
+        except (AttributeError, UnicodeEncodeError):
+            return None
+        if not key or len(key) > self._icao_keys.width:
+            return None
+        key = key.ljust(self._icao_keys.width, b'\x00')
+        j = bisect_left(self._icao_keys, key)
+        if j < self.icao_count and self._icao_keys[j] == key:
+            _, i = ICAO_ENTRY.unpack_from(self.buf, self.icao_offset + j * ICAO_ENTRY.size)
+            code = self._by_icao[icao] = self._code(i)
+            return code
+        return None
+
+    def codes_in_city(self, city):
+        """Return the codes of the airports in a city (matched after normalize()), sorted."""
+        city = normalize(city)
+        if not city:
+            return []
+        codes = []
+        j = bisect_left(self._city_keys, city)
+        while j < self.city_count and self._city_keys[j] == city:
+            _, i = CITY_ENTRY.unpack_from(self.buf, self.cities_offset + j * CITY_ENTRY.size)
+            codes.append(self._code(i))
+            j += 1
+        return codes
+
+    def codes(self):
+        """Iterate over all airport codes in sorted order."""
+        for i in range(self.count):
+            yield self._keys[i].rstrip(b'\x00').decode('ascii')
+
+    def coordinates(self):
+        """Iterate over (code, lat, lon) without decoding any strings (NaN when unknown).
+
+        Records are unpacked one at a time, so a suspended iteration holds no
+        view of the buffer and does not keep close() from releasing it.
+        """
+        offset = self.records_offset + RECORD.size - COORDS.size
+        for i in range(self.count):
+            lat, lon = COORDS.unpack_from(self.buf, offset + i * RECORD.size)
+            yield self._code(i), lat, lon
+
+    def items(self):
+        """Iterate over (code, record) pairs; decodes every record."""
+        for i, code in enumerate(self.codes()):
+            yield code, self._record(i)
+
+    def to_dict(self):
+        return dict(self.items())
@@ -0,0 +1,503 @@
+"""Non-interactive bulk calendar generation from CSV or JSONL bookings."""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+from collections import deque
+from datetime import datetime
+from multiprocessing import Pool
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from fanout import DEFAULT_KEY_FIELD, DEFAULT_RUN_SIZE, ManifestWriter, calendar_path, group_records, write_calendar_file
+from ics_update import update_calendar
+from ics_writer import ICSWriter
+from instrumentation import enable as enable_metrics, metrics
+from main import AirportDatabase, create_flight_ics, flight_uid
+from render_cache import RenderCache
+
+# Same fields as the flight_data dict built by main()
+REQUIRED_FIELDS = (
+    'flight_number', 'passenger_name',
+    'departure_airport', 'departure_time',
+    'arrival_airport', 'arrival_time',
+)
+OPTIONAL_DEFAULTS = {
+    'seat': 'Not assigned',
+    'class': 'Economy',
+    'baggage': 'Not specified',
+}
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+# Control characters (CR/LF above all) could start new lines in the calendar
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+# Values of a record's 'status' field that cancel its flight in update mode
+CANCELLED_STATUSES = ('cancelled', 'canceled')
+
+# Airport database and render cache owned by each worker process (set by _init_worker)
+_airport_db = None
+_render_cache = None
+# Whether this worker ships its metrics back to the parent with each chunk
+_export_metrics = False
+
+
+def read_records(path):
+    """Yield (line_number, record) pairs from a CSV or JSONL file.
+
+    CSV rows are yielded as dicts; JSONL lines are yielded as raw text so a
+    malformed line can be rejected without aborting the run.
+    """
+    path = Path(path)
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if path.suffix.lower() == '.csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_no, line
+
+
+def parse_datetime(value, timezone):
+    """Parse a local 'YYYY-MM-DD HH:MM' (or ISO 8601) time in the given timezone."""
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        value = str(value).strip()
+        try:
+            dt = datetime.strptime(value, DATETIME_FORMAT)
+        except ValueError:
+            dt = datetime.fromisoformat(value)
+    return dt.replace(tzinfo=ZoneInfo(timezone))
+
+
+def parse_flight(record, airport_db):
+    """Turn one input record into the flight_data dict used by create_flight_ics."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+
+    missing = [field for field in REQUIRED_FIELDS if not str(record.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing field(s): {', '.join(missing)}")
+    unsafe = [field for field in (*REQUIRED_FIELDS, 'departure_timezone', 'arrival_timezone', *OPTIONAL_DEFAULTS)
+              if CONTROL_CHARACTERS.search(str(record.get(field) or '').strip())]
+    if unsafe:
+        raise ValueError(f"control characters in field(s): {', '.join(unsafe)}")
+
+    departure_airport = str(record['departure_airport']).strip().upper()
+    arrival_airport = str(record['arrival_airport']).strip().upper()
+
+    # An explicit timezone in the record wins over the airport database
+    departure_timezone = (str(record.get('departure_timezone') or '').strip()
+                          or airport_db.get_timezone(departure_airport, ask_if_missing=False))
+    arrival_timezone = (str(record.get('arrival_timezone') or '').strip()
+                        or airport_db.get_timezone(arrival_airport, ask_if_missing=False))
+
+    flight_data = {
+        'flight_number': str(record['flight_number']).strip(),
+        'passenger_name': str(record['passenger_name']).strip(),
+        'departure_airport': departure_airport,
+        'departure_timezone': departure_timezone,
+        'departure_time': parse_datetime(record['departure_time'], departure_timezone),
+        'arrival_airport': arrival_airport,
+        'arrival_timezone': arrival_timezone,
+        'arrival_time': parse_datetime(record['arrival_time'], arrival_timezone),
+    }
+    for field, default in OPTIONAL_DEFAULTS.items():
+        flight_data[field] = str(record.get(field) or '').strip() or default
+
+    return flight_data
+
+
+def cancelled_uid(record):
+    """Return the event UID a record cancels (status 'cancelled'), or None."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict) or str(record.get('status') or '').strip().lower() not in CANCELLED_STATUSES:
+        return None
+    missing = [field for field in ('flight_number', 'departure_time') if not str(record.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing field(s): {', '.join(missing)}")
+    departure_time = parse_datetime(record['departure_time'], 'UTC')
+    return flight_uid(str(record['flight_number']).strip(), departure_time)
+
+
+def _init_worker(shared_table, metrics_enabled=False, render_cache_path=None):
+    """Attach the per-process airport database (and open the render cache, if any).
+
+    `shared_table` names the airport table the parent published with
+    AirportDatabase.share(); the worker reads it from shared memory and
+    never loads airport data or touches the cache files itself.
+    """
+    global _airport_db, _export_metrics, _render_cache
+    metrics.enabled = _export_metrics = metrics_enabled
+    _airport_db = AirportDatabase.attach_shared(shared_table)
+    if render_cache_path:
+        _render_cache = RenderCache(path=render_cache_path)
+
+
+def _render_chunk(chunk):
+    """Render a chunk of (line_number, flight_data) pairs.
+
+    Returns (events, errors, worker_metrics) where errors is a list of
+    (line_number, message) and worker_metrics holds the metrics collected
+    since the previous chunk (None when metrics are disabled).
+    """
+    events, errors = [], []
+    for line_no, flight_data in chunk:
+        try:
+            events.append(create_flight_ics(flight_data, _airport_db, _render_cache))
+        except Exception as e:
+            errors.append((line_no, str(e)))
+    if _render_cache is not None:
+        _render_cache.flush()
+    worker_metrics = None
+    if _export_metrics:
+        worker_metrics = metrics.to_dict()
+        metrics.reset()
+    return events, errors, worker_metrics
+
+
+def _render_groups(groups, out_dir):
+    """Render and write the calendars of a list of (key, [(line_number, record), ...]) groups.
+
+    Records are parsed here, in the worker. Returns (entries, errors,
+    worker_metrics) where entries are (manifest_entry, written) pairs in
+    group order and errors are (line_number, message, record) triples.
+    """
+    entries, errors = [], []
+    for key, items in groups:
+        buffer = io.BytesIO()
+        with ICSWriter(buffer) as writer:
+            for line_no, record in items:
+                try:
+                    flight_data = parse_flight(record, _airport_db)
+                    writer.write_event(create_flight_ics(flight_data, _airport_db, _render_cache))
+                except Exception as e:
+                    errors.append((line_no, str(e), record))
+        if not writer.count:
+            continue
+        file_name = calendar_path(key)
+        digest, size, written = write_calendar_file(Path(out_dir) / file_name, buffer.getvalue())
+        entry = {'key': key, 'file': file_name, 'events': writer.count, 'bytes': size, 'sha256': digest}
+        entries.append((entry, written))
+    if _render_cache is not None:
+        _render_cache.flush()
+    worker_metrics = None
+    if _export_metrics:
+        worker_metrics = metrics.to_dict()
+        metrics.reset()
+    return entries, errors, worker_metrics
+
+
+def _write_reject(reject_file, line_no, error, record):
+    """Append one rejected record to the reject file as a JSON line."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError:
+            record = record.rstrip('\n')
+    reject_file.write(json.dumps({'line': line_no, 'error': error, 'record': record},
+                                 ensure_ascii=False, default=str) + "\n")
+
+
+def _validate(input_path, report_path, airport_db, scope_field=None, update=False):
+    """Run the bulk validation over the whole input (requires NumPy).
+
+    Writes the report to report_path, prints its summary and returns
+    {line_number: message} for the records that have errors.
+    """
+    import validate
+    report = validate.validate_file(input_path, report_path, airport_db, scope_field, update)
+    validate.print_summary(report)
+    return validate.error_messages(report)
+
+
+def _screen(records, errors, on_reject):
+    """Pass records through, sending those with validation errors to on_reject."""
+    for line_no, record in records:
+        error = errors.get(line_no)
+        if error is None:
+            yield line_no, record
+        else:
+            on_reject(line_no, error, record)
+
+
+def _chunks(records, airport_db, chunk_size, on_reject, on_cancel=None):
+    """Parse records into chunks of flights, sending parse errors to on_reject.
+
+    With on_cancel, records marked as cancelled are passed to it by UID
+    instead of being rendered.
+    """
+    chunk, raw = [], {}
+    for line_no, record in records:
+        try:
+            if on_cancel is not None:
+                uid = cancelled_uid(record)
+                if uid is not None:
+                    on_cancel(uid)
+                    continue
+            chunk.append((line_no, parse_flight(record, airport_db)))
+            raw[line_no] = record
+        except Exception as e:
+            on_reject(line_no, str(e), record)
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk, raw
+            chunk, raw = [], {}
+    if chunk:
+        yield chunk, raw
+
+
+def _group_tasks(groups, chunk_size):
+    """Pack whole groups into tasks of about chunk_size records each."""
+    task, size = [], 0
+    for key, items in groups:
+        task.append((key, items))
+        size += len(items)
+        if size >= chunk_size:
+            yield task
+            task, size = [], 0
+    if task:
+        yield task
+
+
+def _run_ordered(func, tasks, collect, workers, airport_db, render_cache_path):
+    """Run func(*args) for each (args, context) task and collect(result, context) in input order.
+
+    With more than one worker the tasks go to a process pool, keeping a
+    bounded number in flight so memory stays flat regardless of input size.
+    The pool's workers all read airport_db's table from one shared memory copy.
+    """
+    if workers <= 1:
+        for args, context in tasks:
+            collect(func(*args), context)
+        return
+    pending = deque()
+    with airport_db.share() as table, \
+            Pool(workers, initializer=_init_worker,
+                 initargs=(table.name, metrics.enabled, render_cache_path)) as pool:
+        for args, context in tasks:
+            pending.append((pool.apply_async(func, args), context))
+            if len(pending) >= workers * 2:
+                result, context = pending.popleft()
+                collect(result.get(), context)
+        while pending:
+            result, context = pending.popleft()
+            collect(result.get(), context)
+    if render_cache_path:
+        # Pool workers are terminated without closing their caches, so the disk store is trimmed here
+        RenderCache(path=render_cache_path, preload=False).close()
+
+
+def run_batch(input_path, output_path, reject_path, workers=None, chunk_size=500, use_cache=True,
+              update_path=None, render_cache_path=None, validate_path=None):
+    """Convert a CSV/JSONL bookings file into one .ics calendar.
+
+    Timezones are resolved in this process; VEVENT rendering is spread over a
+    pool of `workers` processes (1 renders in-process). Records that fail to
+    parse or render are written to `reject_path` instead of aborting the run.
+
+    With `update_path`, the records are changes to that existing calendar:
+    their events are added or replaced by UID (records with status
+    'cancelled' cancel theirs) and the result goes to `output_path`.
+    `render_cache_path` names a render_cache.RenderCache file shared by
+    all workers, so unchanged flights are not re-rendered on the next run.
+    With `validate_path`, the whole input is validated first (see
+    validate.py), the report is written there and records with errors are
+    rejected before any rendering.
+    Returns (events_written, records_rejected).
+    """
+    global _airport_db, _render_cache
+    workers = workers or os.cpu_count() or 1
+    airport_db = AirportDatabase(use_cache=use_cache)
+    errors = _validate(input_path, validate_path, airport_db, update=bool(update_path)) if validate_path else {}
+    written = rejected = 0
+    updated_events, cancelled = [], []
+
+    with contextlib.ExitStack() as stack:
+        render_cache = None
+        # With a pool only the workers render, each with its own handle on the cache
+        if render_cache_path and workers <= 1:
+            render_cache = stack.enter_context(RenderCache(path=render_cache_path))
+        rejects = stack.enter_context(open(reject_path, 'w', encoding='utf-8'))
+        if update_path:
+            # Changes are usually small; they are applied in one pass at the end
+            write_event = updated_events.append
+        else:
+            out = stack.enter_context(open(output_path, 'wb'))
+            write_event = stack.enter_context(ICSWriter(out)).write_event
+
+        def on_reject(line_no, error, record):
+            nonlocal rejected
+            rejected += 1
+            metrics.incr('batch_records_total', result='rejected')
+            _write_reject(rejects, line_no, error, record)
+
+        def collect(result, raw):
+            nonlocal written
+            events, errors, worker_metrics = result
+            for event_content in events:
+                write_event(event_content)
+            written += len(events)
+            metrics.incr('batch_records_total', len(events), result='written')
+            if worker_metrics:
+                metrics.merge(worker_metrics)
+            for line_no, error in errors:
+                on_reject(line_no, error, raw[line_no])
+
+        chunks = _chunks(_screen(read_records(input_path), errors, on_reject), airport_db, chunk_size, on_reject,
+                         cancelled.append if update_path else None)
+
+        if workers <= 1:
+            _airport_db, _render_cache = airport_db, render_cache
+        _run_ordered(_render_chunk, (((chunk,), raw) for chunk, raw in chunks), collect,
+                     workers, airport_db, render_cache_path)
+
+    if update_path:
+        stats = update_calendar(update_path, updated_events, cancelled, output_path)
+        print(f"✓ Updated calendar: {stats['added']} added, {stats['changed']} changed, "
+              f"{stats['cancelled']} cancelled, {stats['unchanged']} unchanged")
+        if stats['missing']:
+            print(f"⚠️  {stats['missing']} cancelled flight(s) were not in the calendar")
+    return written, rejected
+
+
+def run_fanout(input_path, out_dir, reject_path, key_field=DEFAULT_KEY_FIELD, workers=None, chunk_size=500,
+               use_cache=True, render_cache_path=None, run_size=DEFAULT_RUN_SIZE, prune=False,
+               validate_path=None):
+    """Write one calendar per value of `key_field` (e.g. per passenger) into `out_dir`.
+
+    Records are grouped with fanout.group_records (bounded memory), then
+    each group is parsed, rendered and written by a pool of `workers`
+    processes. Calendars whose events did not change are left untouched,
+    and out_dir/manifest.jsonl lists every calendar with its checksum;
+    with `prune`, calendars of keys no longer in the input are deleted.
+    `validate_path` validates the input first, as in run_batch, with
+    duplicates counted per calendar.
+    Returns a dict of counts.
+    """
+    global _airport_db, _render_cache
+    workers = workers or os.cpu_count() or 1
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    airport_db = AirportDatabase(use_cache=use_cache)
+    errors = _validate(input_path, validate_path, airport_db, key_field) if validate_path else {}
+    stats = {'written': 0, 'unchanged': 0, 'removed': 0, 'events': 0, 'rejected': 0}
+
+    with contextlib.ExitStack() as stack:
+        render_cache = None
+        # With a pool only the workers render, each with its own handle on the cache
+        if render_cache_path and workers <= 1:
+            render_cache = stack.enter_context(RenderCache(path=render_cache_path))
+        rejects = stack.enter_context(open(reject_path, 'w', encoding='utf-8'))
+        manifest = stack.enter_context(ManifestWriter(out_dir, prune=prune))
+
+        def on_reject(line_no, error, record):
+            stats['rejected'] += 1
+            metrics.incr('batch_records_total', result='rejected')
+            _write_reject(rejects, line_no, error, record)
+
+        def collect(result, context):
+            entries, errors, worker_metrics = result
+            for entry, written in entries:
+                manifest.add(entry)
+                stats['written' if written else 'unchanged'] += 1
+                stats['events'] += entry['events']
+                metrics.incr('fanout_files_total', result='written' if written else 'unchanged')
+            metrics.incr('batch_records_total', sum(entry['events'] for entry, _ in entries), result='written')
+            if worker_metrics:
+                metrics.merge(worker_metrics)
+            for line_no, error, record in errors:
+                on_reject(line_no, error, record)
+
+        groups = group_records(_screen(read_records(input_path), errors, on_reject), key_field, on_reject, run_size,
+                               tmp_dir=out_dir.parent)
+        if workers <= 1:
+            _airport_db, _render_cache = airport_db, render_cache
+        _run_ordered(_render_groups, (((task, str(out_dir)), None) for task in _group_tasks(groups, chunk_size)),
+                     collect, workers, airport_db, render_cache_path)
+
+    stats['removed'] = manifest.removed
+    return stats
+
+
+def main():
+    """Command-line entry point for bulk calendar generation."""
+    parser = argparse.ArgumentParser(description="Generate an .ics calendar from a CSV or JSONL bookings file.")
+    parser.add_argument('input', help="bookings file (.csv or .jsonl)")
+    parser.add_argument('-o', '--output', help="output .ics file (default: flights_<timestamp>.ics, "
+                                               "or the --update calendar itself)")
+    parser.add_argument('--update', metavar='CALENDAR',
+                        help="apply the records as changes to an existing .ics (add/replace by UID; "
+                             "records with status 'cancelled' cancel their event)")
+    parser.add_argument('--fan-out', metavar='DIR',
+                        help="write one calendar per --group-by value into DIR (sharded, with manifest.jsonl) "
+                             "instead of a single calendar")
+    parser.add_argument('--group-by', metavar='FIELD', default=DEFAULT_KEY_FIELD,
+                        help=f"record field that selects the calendar in --fan-out mode (default: {DEFAULT_KEY_FIELD})")
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE,
+                        help="records grouped in memory before spilling a sorted run to disk (--fan-out)")
+    parser.add_argument('--prune', action='store_true',
+                        help="delete calendars of keys that are no longer in the input (--fan-out)")
+    parser.add_argument('--validate', metavar='REPORT',
+                        help="validate the whole input first (requires NumPy), write the report to REPORT "
+                             "and reject records with errors before rendering")
+    parser.add_argument('--rejects', help="reject file for bad records (default: <output>.rejects.jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="flights per worker task")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the airport cache")
+    parser.add_argument('--render-cache', metavar='PATH',
+                        help="reuse rendered events across runs from this cache file (SQLite)")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="collect metrics and write them to PATH (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable_metrics()
+    if args.fan_out and (args.output or args.update):
+        parser.error("--fan-out cannot be combined with --output or --update")
+    if args.validate:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            parser.error("--validate requires NumPy")
+
+    if args.fan_out:
+        reject_path = args.rejects or f"{Path(args.fan_out).resolve()}.rejects.jsonl"
+        stats = run_fanout(args.input, args.fan_out, reject_path, key_field=args.group_by, workers=args.workers,
+                           chunk_size=args.chunk_size, use_cache=not args.no_cache,
+                           render_cache_path=args.render_cache, run_size=args.run_size, prune=args.prune,
+                           validate_path=args.validate)
+        print(f"✅ {stats['written'] + stats['unchanged']} calendar(s) with {stats['events']} flight(s) in "
+              f"{os.path.abspath(args.fan_out)}: {stats['written']} written, {stats['unchanged']} unchanged"
+              + (f", {stats['removed']} removed" if args.prune else ""))
+        rejected = stats['rejected']
+    else:
+        output = args.output or args.update or f"flights_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ics"
+        reject_path = args.rejects or f"{Path(output).with_suffix('')}.rejects.jsonl"
+
+        written, rejected = run_batch(args.input, output, reject_path, workers=args.workers,
+                                      chunk_size=args.chunk_size, use_cache=not args.no_cache,
+                                      update_path=args.update, render_cache_path=args.render_cache,
+                                      validate_path=args.validate)
+
+        if args.update:
+            # run_batch has reported the added/changed/cancelled/unchanged counts
+            print(f"✅ Updated {os.path.abspath(output)}")
+        else:
+            print(f"✅ Wrote {written} flight(s) to {os.path.abspath(output)}")
+    if rejected:
+        print(f"⚠️  Rejected {rejected} record(s), see {os.path.abspath(reject_path)}")
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"📊 Metrics written to {os.path.abspath(args.metrics)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Offline benchmark suite for airport loading, lookups and ICS rendering.
+
+Every benchmark runs in a fresh process (so peak RSS is its own) inside a
+scratch copy of the airport cache, first untraced for wall time and then
+under tracemalloc for peak traced memory and the net change in allocated
+blocks (memory still held when the benchmark returns). Results are saved as JSON and can
+be compared against a previous run:
+
+    python3 benchmarks/bench.py -o bench.json
+    python3 benchmarks/bench.py --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+SEED = 20240601
+# Codes present in every data source, including the built-in table
+CODES = ['JFK', 'LAX', 'SFO', 'ORD', 'HNL', 'YVR', 'LHR', 'CDG', 'FRA', 'AMS',
+         'NRT', 'HND', 'KIX', 'PEK', 'HKG', 'SIN', 'DXB', 'SYD', 'AKL', 'GRU']
+LOOKUPS = 200_000
+RENDERS = 20_000
+DEFAULT_SIZES = (10, 10_000, 1_000_000)
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def synthetic_flights(count, seed=SEED):
+    """Yield `count` reproducible flight_data dicts."""
+    from zoneinfo import ZoneInfo
+    from main import AirportDatabase
+
+    with _quiet():
+        db = AirportDatabase(use_cache=False, lazy=True)
+        db.load_builtin_data()
+    zones = {code: ZoneInfo(db.get_timezone(code, ask_if_missing=False)) for code in CODES}
+
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        dep, arr = rng.sample(CODES, 2)
+        departure = start + timedelta(minutes=rng.randrange(0, 365 * 24 * 60, 5))
+        arrival = departure + timedelta(minutes=rng.randrange(45, 16 * 60, 5))
+        yield {
+            'flight_number': f"{rng.choice(['NH', 'HA', 'UA', 'BA', 'QF'])}{rng.randrange(1, 9999)}",
+            'passenger_name': f"Passenger {i % 5000}",
+            'departure_airport': dep,
+            'departure_timezone': zones[dep].key,
+            'departure_time': departure.replace(tzinfo=zones[dep]),
+            'arrival_airport': arr,
+            'arrival_timezone': zones[arr].key,
+            'arrival_time': arrival.replace(tzinfo=zones[arr]),
+            'seat': f"{rng.randrange(1, 60)}{rng.choice('ABCDEF')}",
+            'class': rng.choice(['Economy', 'Business', 'First']),
+            'baggage': '1 checked',
+        }
+
+
+# --- benchmark bodies: each returns the number of operations performed ---
+
+def bench_load_airportsdata():
+    import main
+    if not main.AIRPORTSDATA_AVAILABLE:
+        raise RuntimeError("airportsdata is not installed")
+    with _quiet():
+        db = main.AirportDatabase(use_cache=False)
+    return len(db.airports)
+
+
+def bench_load_json_cache():
+    from main import AirportDatabase
+    with _quiet():
+        db = AirportDatabase(use_cache=False, lazy=True)
+        db.load_cache()
+    return len(db.airports)
+
+
+def bench_load_builtin():
+    from main import AirportDatabase
+    with _quiet():
+        db = AirportDatabase(use_cache=False, lazy=True)
+        db.load_builtin_data()
+    return len(db.airports)
+
+
+def bench_load_snapshot():
+    from main import AirportDatabase
+    with _quiet():
+        db = AirportDatabase(use_cache=True)
+    return len(db.snapshot) if db.snapshot is not None else len(db.airports)
+
+
+def _lookup_codes():
+    rng = random.Random(SEED)
+    # 5% misses exercise the placeholder path
+    return [rng.choice(CODES) if rng.random() < 0.95 else f"Z{rng.randrange(100):02d}"
+            for _ in range(LOOKUPS)]
+
+
+def _bench_lookups(use_cache):
+    from main import AirportDatabase
+    with _quiet():
+        db = AirportDatabase(use_cache=use_cache)
+    codes = _lookup_codes()
+    get_timezone, get_airport_info = db.get_timezone, db.get_airport_info
+    start = time.perf_counter()
+    for code in codes:
+        get_timezone(code, ask_if_missing=False)
+        get_airport_info(code)
+    return len(codes) * 2, time.perf_counter() - start
+
+
+def bench_lookups_snapshot():
+    return _bench_lookups(use_cache=True)
+
+
+def bench_lookups_dict():
+    return _bench_lookups(use_cache=False)
+
+
+def bench_render_events():
+    from main import AirportDatabase, create_flight_ics
+    with _quiet():
+        db = AirportDatabase(use_cache=True)
+    flights = list(synthetic_flights(RENDERS))
+    start = time.perf_counter()
+    for flight_data in flights:
+        create_flight_ics(flight_data, db)
+    return len(flights), time.perf_counter() - start
+
+
+def bench_calendar(count):
+    from main import AirportDatabase, write_calendar
+    with _quiet():
+        db = AirportDatabase(use_cache=True)
+    with open(os.devnull, 'wb') as out:
+        return write_calendar(synthetic_flights(count), db, out)
+
+
+def _run(name, args, workdir, trace):
+    """Child-process entry point: run one benchmark and measure it."""
+    os.chdir(workdir)
+    func = globals()[name]
+    if trace:
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - start
+
+    # Benchmarks with setup return (ops, timed_seconds) for their hot loop
+    ops, timed = result if isinstance(result, tuple) else (result, wall)
+    stats = {'wall_s': round(wall, 6), 'ops': ops, 'ops_per_s': round(ops / timed, 1) if timed else None}
+    if trace:
+        stats['alloc_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        # Net: blocks freed during the run cancel out, so this is what the run left behind
+        stats['net_blocks'] = sys.getallocatedblocks() - blocks
+        tracemalloc.stop()
+    else:
+        stats['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return stats
+
+
+def _isolated(name, args, workdir, trace):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_run, name, args, workdir, trace).result()
+
+
+def _prepare_workdir(root):
+    """Scratch copy of the JSON cache plus a freshly built snapshot."""
+    workdir = Path(root) / 'cache'
+    workdir.mkdir()
+    shutil.copy(REPO_ROOT / 'airport_timezone_cache.json', workdir)
+    _isolated('bench_load_snapshot', (), str(workdir), False)  # builds the snapshot
+    return workdir
+
+
+def run_suite(sizes, allocations=True, only=None):
+    # (label, function, args, what one operation is)
+    benchmarks = [
+        ('load.airportsdata', 'bench_load_airportsdata', (), 'airports'),
+        ('load.json_cache', 'bench_load_json_cache', (), 'airports'),
+        ('load.builtin', 'bench_load_builtin', (), 'airports'),
+        ('load.snapshot', 'bench_load_snapshot', (), 'airports'),
+        ('lookup.snapshot', 'bench_lookups_snapshot', (), 'lookups'),
+        ('lookup.dict', 'bench_lookups_dict', (), 'lookups'),
+        ('render.create_flight_ics', 'bench_render_events', (), 'events'),
+    ] + [(f'calendar.{size}', 'bench_calendar', (size,), 'events') for size in sizes]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        workdir = str(_prepare_workdir(root))
+        for label, name, args, unit in benchmarks:
+            if only and not any(part in label for part in only):
+                continue
+            print(f"  {label:<28}", end='', flush=True)
+            try:
+                stats = dict(_isolated(name, args, workdir, False), unit=unit)
+                if allocations:
+                    traced = _isolated(name, args, workdir, True)
+                    stats['alloc_peak_kb'] = traced['alloc_peak_kb']
+                    stats['net_blocks'] = traced['net_blocks']
+            except Exception as e:
+                stats = {'skipped': str(e)}
+                print(f"skipped ({e})")
+            else:
+                print(f"{stats['wall_s']:>10.3f}s  {stats['ops_per_s'] or 0:>14,.0f} {unit + '/s':<10}"
+                      f"  {stats['peak_rss_kb'] / 1024:>7.1f} MB RSS")
+            results[label] = stats
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """Print the relative change of each metric against a baseline run."""
+    print(f"\nComparison against {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for label, stats in current['results'].items():
+        before = baseline.get('results', {}).get(label)
+        if not before or 'skipped' in stats or 'skipped' in before:
+            continue
+        changes = []
+        for metric in ('wall_s', 'peak_rss_kb', 'alloc_peak_kb'):
+            if stats.get(metric) and before.get(metric):
+                delta = (stats[metric] - before[metric]) / before[metric] * 100
+                changes.append(f"{metric} {delta:+.1f}%")
+        print(f"  {label:<28}{'  '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the air2cal benchmark suite.")
+    parser.add_argument('-o', '--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated calendar sizes (default: %(default)s)")
+    parser.add_argument('--no-allocations', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--only', nargs='*', help="run only benchmarks whose name contains one of these")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    print(f"Running benchmarks (Python {platform.python_version()})...")
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run_suite(sizes, allocations=not args.no_allocations, only=args.only),
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📁 Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
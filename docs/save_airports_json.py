@@ -1,13 +1,46 @@
 # save_airports_json.py
 # Run this where airportsdata is installed (e.g., your dev machine / CI).
+#
+# Exports the airport table for the web app as compact, content-addressed
+# files under docs/data/:
+#
+#   manifest.json               small index the page revalidates on every load
+#   airports[-<prefix>].<hash>.json
+#                               columnar, minified data; the name changes
+#                               whenever the content does, so browsers and
+#                               CDNs can cache it forever
+#   search.<hash>.json          prebuilt search index (airport_search.py format)
+#                               loaded by the page's search worker
+#   *.json.gz / *.json.br       precompressed copies for servers that serve
+#                               them directly (nginx gzip_static/brotli_static)
+#
+# Usage:
+#   python3 docs/save_airports_json.py                   # from airportsdata
+#   python3 docs/save_airports_json.py --input docs/airports.json
+#   python3 docs/save_airports_json.py --shard-prefix 1  # one file per first letter
+import argparse
+import gzip
+import hashlib
 import json
-import airportsdata
+import sys
 from pathlib import Path
 
-out_path = Path("docs/airports.json")  # or wherever your Pages assets live
-out_path.parent.mkdir(parents=True, exist_ok=True)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+FORMAT_VERSION = 2
+DOCS_DIR = Path(__file__).resolve().parent
+HASH_LENGTH = 12
+
+sys.path.insert(0, str(DOCS_DIR.parent))
+from airport_search import AirportSearchIndex  # noqa: E402
+
 
 def build_iata_map():
+    import airportsdata
     iata = airportsdata.load('IATA')
     icao = airportsdata.load('ICAO')
     out = {}
@@ -38,14 +71,143 @@ def build_iata_map():
             }
     return out
 
-print("Building airports JSON (can take a few seconds)...")
-m = build_iata_map()
 
-# Optional: you can trim to only entries with tz or top N airports to reduce size.
-# Example — keep only airports with timezone:
-m_trimmed = {k:v for k,v in m.items() if v.get("tz")}
+def to_columnar(airports):
+    """Turn {code: info} into parallel column arrays with deduplicated tz/country tables."""
+    codes = sorted(airports)
+    tables = {"tz": [], "country": []}
+    ids = {"tz": {}, "country": {}}
+
+    def intern(field, value):
+        value = value or ""
+        if value not in ids[field]:
+            ids[field][value] = len(tables[field])
+            tables[field].append(value)
+        return ids[field][value]
+
+    columns = {"code": codes, "name": [], "city": [], "country": [], "tz": [], "lat": [], "lon": [], "icao": []}
+    for code in codes:
+        info = airports[code]
+        columns["name"].append(info.get("name") or "")
+        columns["city"].append(info.get("city") or "")
+        columns["country"].append(intern("country", info.get("country")))
+        columns["tz"].append(intern("tz", info.get("tz")))
+        columns["lat"].append(info.get("lat"))
+        columns["lon"].append(info.get("lon"))
+        columns["icao"].append(info.get("icao") or "")
+    return {"version": FORMAT_VERSION, "count": len(codes), "tables": tables, "columns": columns}
+
+
+def minify(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_asset(out_dir, stem, payload):
+    """Write a content-hashed file plus its precompressed copies; return its manifest entry."""
+    digest = hashlib.sha256(payload).hexdigest()
+    name = f"{stem}.{digest[:HASH_LENGTH]}.json"
+    (out_dir / name).write_bytes(payload)
+    entry = {"file": name, "sha256": digest, "bytes": len(payload)}
+
+    # mtime=0 keeps the gzip output byte-for-byte reproducible
+    compressed = gzip.compress(payload, compresslevel=9, mtime=0)
+    (out_dir / f"{name}.gz").write_bytes(compressed)
+    entry["gzip_bytes"] = len(compressed)
+    if BROTLI_AVAILABLE:
+        compressed = brotli.compress(payload, quality=11)
+        (out_dir / f"{name}.br").write_bytes(compressed)
+        entry["br_bytes"] = len(compressed)
+    return entry
+
+
+def shard(airports, prefix_length):
+    """Split {code: info} by code prefix; a prefix length of 0 means a single shard."""
+    shards = {}
+    for code, info in airports.items():
+        shards.setdefault(code[:prefix_length], {})[code] = info
+    return dict(sorted(shards.items()))
+
+
+def export(airports, out_dir, prefix_length=0, source="", search_index=True):
+    """Write the manifest, data files and search index, removing files of earlier exports."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for prefix, part in shard(airports, prefix_length).items():
+        stem = f"airports-{prefix}" if prefix else "airports"
+        entry = write_asset(out_dir, stem, minify(to_columnar(part)))
+        entry["prefix"] = prefix
+        entries.append(entry)
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "format": "columnar",
+        "source": source,
+        "count": len(airports),
+        "shard_prefix_length": prefix_length,
+        "shards": entries,
+    }
+    if search_index:
+        # The worker rebuilds the trigram table itself, which halves the download
+        index = AirportSearchIndex.build(airports, f"{source}:{len(airports)}")
+        manifest["search"] = write_asset(out_dir, "search", index.to_json(trigrams=False).encode("utf-8"))
+        entries = entries + [manifest["search"]]
+    (out_dir / "manifest.json").write_bytes(minify(manifest))
+
+    keep = {"manifest.json"}
+    for entry in entries:
+        keep.update({entry["file"], f"{entry['file']}.gz", f"{entry['file']}.br"})
+    for path in list(out_dir.glob("airports*.json*")) + list(out_dir.glob("search*.json*")):
+        if path.name not in keep:
+            path.unlink()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the airport table for the web app.")
+    parser.add_argument("--input", help="convert an existing airports.json instead of reading airportsdata")
+    parser.add_argument("--out-dir", default=str(DOCS_DIR / "data"), help="output directory (default: docs/data)")
+    parser.add_argument("--shard-prefix", type=int, default=0, metavar="LEN",
+                        help="write one file per code prefix of this length (default: single file)")
+    parser.add_argument("--no-search-index", action="store_true",
+                        help="skip the prebuilt search index (the page then builds it in a worker)")
+    parser.add_argument("--legacy", action="store_true",
+                        help="also rewrite docs/airports.json in the old keyed format")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            m_trimmed = {code.upper(): info for code, info in json.load(f).items()}
+        source = Path(args.input).name
+    else:
+        import airportsdata
+        print("Building airports JSON (can take a few seconds)...")
+        m = build_iata_map()
+        # Optional: you can trim to only entries with tz or top N airports to reduce size.
+        # Example — keep only airports with timezone:
+        m_trimmed = {k: v for k, v in m.items() if v.get("tz")}
+        source = f"airportsdata-{getattr(airportsdata, '__version__', '')}"
+
+    out_dir = Path(args.out_dir)
+    print(f"Exporting {len(m_trimmed)} airports to {out_dir}")
+    manifest = export(m_trimmed, out_dir, args.shard_prefix, source, not args.no_search_index)
+    total = sum(entry["bytes"] for entry in manifest["shards"])
+    gz = sum(entry["gzip_bytes"] for entry in manifest["shards"])
+    print(f"✓ {len(manifest['shards'])} file(s): {total / 1024:.0f} KB, {gz / 1024:.0f} KB gzip", end="")
+    if BROTLI_AVAILABLE:
+        print(f", {sum(entry['br_bytes'] for entry in manifest['shards']) / 1024:.0f} KB brotli")
+    else:
+        print("\nNote: brotli package not installed; skipped .br files.")
+    if "search" in manifest:
+        print(f"✓ Search index: {manifest['search']['bytes'] / 1024:.0f} KB, "
+              f"{manifest['search']['gzip_bytes'] / 1024:.0f} KB gzip")
+
+    if args.legacy:
+        legacy_path = DOCS_DIR / "airports.json"
+        with open(legacy_path, "w", encoding="utf-8") as f:
+            json.dump(m_trimmed, f, ensure_ascii=False, separators=(",", ":"))
+        print(f"✓ Wrote {legacy_path}")
+    print("Done.")
+
 
-print(f"Exporting {len(m_trimmed)} airports to {out_path}")
-with open(out_path, "w", encoding="utf-8") as f:
-    json.dump(m_trimmed, f, ensure_ascii=False, indent=2)
-print("Done.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
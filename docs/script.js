@@ -1,10 +1,11 @@
 // script.js
-// Uses Luxon (loaded in index.html via CDN) and Fuse.js for fuzzy search
+// Uses Luxon (loaded in index.html via CDN); fuzzy search runs in search-worker.js
 const DateTime = luxon.DateTime;
 
 /*
-  This script loads docs/airports.json (if available), builds a Fuse index
-  and provides suggestion dropdowns for airport inputs (code, city, name).
+  This script loads the airport table exported to docs/data/ (falling back to
+  docs/airports.json) and provides suggestion dropdowns for airport inputs
+  (code, city, name), answered by a search worker so typing never blocks.
 
   Change: inline-first flight form is saved via the top-level "Save first flight"
   button. The top-level "+ Add flight" button remains disabled until the first
@@ -18,73 +19,105 @@ let AIRPORTS = {
   "HND": {"tz":"Asia/Tokyo","name":"Haneda Airport","city":"Tokyo","country":"JP"}
 };
 
-let FUSE = null;
-let FUSE_LIST = []; // array of {code,name,city,tz}
+let AIRPORT_LIST = []; // array of {code,name,city,tz} for the substring fallback
+let SEARCH_WORKER = null;
+let searchSeq = 0;
+const pendingSearches = new Map();
 
-// Load airports.json into AIRPORTS and init fuse
-async function loadAirportsJson(options = {useLocalStorage: true}) {
-  if (options.useLocalStorage) {
-    try {
-      const cached = localStorage.getItem('airports_json_v1');
-      if (cached) {
-        const parsed = JSON.parse(cached);
-        if (parsed && typeof parsed === 'object') {
-          AIRPORTS = {};
-          for (const [k, v] of Object.entries(parsed)) AIRPORTS[k.toUpperCase()] = v;
-          console.log(`Loaded ${Object.keys(AIRPORTS).length} airports from localStorage cache`);
-        }
-      }
-    } catch (e) {
-      console.warn('Could not read airports cache:', e);
-    }
+// Start the search worker; it loads (or builds) the index while the page renders
+function initSearchWorker() {
+  try {
+    SEARCH_WORKER = new Worker('search-worker.js');
+  } catch (e) {
+    console.warn('Search worker unavailable; using substring suggestions', e);
+    return;
+  }
+  SEARCH_WORKER.onmessage = (e) => {
+    const resolve = pendingSearches.get(e.data.id);
+    if (resolve) { pendingSearches.delete(e.data.id); resolve(e.data.results); }
+  };
+  SEARCH_WORKER.onerror = (e) => {
+    console.warn('Search worker failed; using substring suggestions', e);
+    SEARCH_WORKER = null;
+    for (const resolve of pendingSearches.values()) resolve(null);
+    pendingSearches.clear();
+  };
+  SEARCH_WORKER.postMessage({type: 'init', manifestUrl: new URL('data/manifest.json', location.href).toString()});
+}
+
+// Ask the worker for [{code, score}, ...]; resolves to null when it has no index
+function searchAirports(query, limit) {
+  if (!SEARCH_WORKER) return Promise.resolve(null);
+  const id = ++searchSeq;
+  return new Promise((resolve) => {
+    pendingSearches.set(id, resolve);
+    SEARCH_WORKER.postMessage({type: 'search', id, query, limit});
+  });
+}
+
+// Expand one columnar shard written by save_airports_json.py into AIRPORTS entries
+function addColumnarShard(target, data) {
+  const c = data.columns;
+  const tz = data.tables.tz, country = data.tables.country;
+  for (let i = 0; i < c.code.length; i++) {
+    target[c.code[i].toUpperCase()] = {
+      name: c.name[i], city: c.city[i], country: country[c.country[i]], tz: tz[c.tz[i]],
+      lat: c.lat[i], lon: c.lon[i], icao: c.icao[i]
+    };
   }
+}
+
+// Load the airport table into AIRPORTS.
+// data/manifest.json is tiny and revalidated on every load; the shards it lists
+// have content hashes in their names, so the browser cache can keep them for good.
+async function loadAirportsJson() {
+  // Older versions kept a full copy in localStorage; free that space
+  try { localStorage.removeItem('airports_json_v1'); } catch (e) {}
 
   try {
-    const url = new URL('airports.json', location.href).toString();
-    const resp = await fetch(url, {cache: 'no-cache'});
+    const manifestUrl = new URL('data/manifest.json', location.href);
+    const resp = await fetch(manifestUrl, {cache: 'no-cache'});
     if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
-    const data = await resp.json();
-    const normalized = {};
-    for (const [code, info] of Object.entries(data)) normalized[code.toUpperCase()] = info;
-    AIRPORTS = normalized;
-    console.log(`Loaded ${Object.keys(AIRPORTS).length} airports from airports.json`);
-    try { localStorage.setItem('airports_json_v1', JSON.stringify(normalized)); } catch(e){}
+    const manifest = await resp.json();
+    if (manifest.version !== 2 || manifest.format !== 'columnar') {
+      throw new Error(`unsupported airports format ${manifest.version}`);
+    }
+
+    const shards = await Promise.all(manifest.shards.map(async (shard) => {
+      const r = await fetch(new URL(shard.file, manifestUrl));
+      if (!r.ok) throw new Error(`HTTP ${r.status} for ${shard.file}`);
+      return r.json();
+    }));
+    const loaded = {};
+    for (const data of shards) addColumnarShard(loaded, data);
+    AIRPORTS = loaded;
+    console.log(`Loaded ${Object.keys(AIRPORTS).length} airports from ${manifest.shards.length} shard(s)`);
   } catch (err) {
-    console.warn('Could not load airports.json; using fallback AIRPORTS:', err);
+    console.warn('Could not load data/manifest.json; trying airports.json:', err);
+    try {
+      const resp = await fetch(new URL('airports.json', location.href));
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const data = await resp.json();
+      const normalized = {};
+      for (const [code, info] of Object.entries(data)) normalized[code.toUpperCase()] = info;
+      AIRPORTS = normalized;
+      console.log(`Loaded ${Object.keys(AIRPORTS).length} airports from airports.json`);
+    } catch (e) {
+      console.warn('Could not load airports.json; using fallback AIRPORTS:', e);
+    }
   }
 
-  initFuse();
+  buildAirportList();
 }
 
-// Prepare Fuse.js index
-function initFuse() {
-  // Build list including city explicitly
-  FUSE_LIST = Object.entries(AIRPORTS).map(([code, info]) => ({
+// Flat list used by the substring fallback when the search worker is unavailable
+function buildAirportList() {
+  AIRPORT_LIST = Object.entries(AIRPORTS).map(([code, info]) => ({
     code,
     name: info.name || '',
     city: info.city || '',
     tz: info.tz || ''
   }));
-
-  // Configure Fuse: code (higher weight), name and city (fuzzy)
-  const options = {
-    includeScore: true,
-    shouldSort: true,
-    threshold: 0.35, // adjust if results are too loose/strict
-    keys: [
-      { name: 'code', weight: 0.6 },
-      { name: 'name', weight: 0.25 },
-      { name: 'city', weight: 0.25 }
-    ],
-    useExtendedSearch: true
-  };
-
-  try {
-    FUSE = new Fuse(FUSE_LIST, options);
-  } catch (e) {
-    console.warn('Fuse initialization failed; suggestions disabled', e);
-    FUSE = null;
-  }
 }
 
 // Utility: extract code if user typed "JFK — New York" or just "JFK"
@@ -153,8 +186,11 @@ function attachSuggestions(inputEl, suggContainer) {
     inputEl.focus();
   }
 
-  function onInput() {
+  let inputSeq = 0;
+
+  async function onInput() {
     const q = inputEl.value.trim();
+    const seq = ++inputSeq;
     if (!q) { hideSuggestions(); return; }
 
     // If query looks like an exact code, surface it first
@@ -165,20 +201,20 @@ function attachSuggestions(inputEl, suggContainer) {
       results.push({ code: codeCandidate, name: exact.name, city: exact.city, tz: exact.tz });
     }
 
-    // Fuse search will now consider city as well
-    if (FUSE && q.length >= 1) {
-      // Use Fuse over FUSE_LIST; Fuse will match code, name, city
-      const fuseResults = FUSE.search(q, {limit: 12});
-      for (const r of fuseResults) {
-        const item = r.item;
-        if (item.code === codeCandidate) continue;
-        results.push(item);
+    // The worker matches code, name and city; only show answers to the latest input
+    const matches = await searchAirports(q, 12);
+    if (seq !== inputSeq) return;
+    if (matches) {
+      for (const {code} of matches) {
+        const info = AIRPORTS[code];
+        if (!info || code === codeCandidate) continue;
+        results.push({ code, name: info.name || '', city: info.city || '', tz: info.tz || '' });
         if (results.length >= 10) break;
       }
     } else {
       // fallback substring match including city
       const lowered = q.toLowerCase();
-      for (const item of FUSE_LIST) {
+      for (const item of AIRPORT_LIST) {
         if (item.code.toLowerCase().startsWith(lowered)
             || item.name.toLowerCase().includes(lowered)
             || item.city.toLowerCase().includes(lowered)) {
@@ -235,8 +271,9 @@ function escapeHtml(s){ return (s||'').toString().replace(/&/g,'&amp;').replace(
 
 // rest of the UI logic (modal, saving, ICS building)
 document.addEventListener('DOMContentLoaded', () => {
-  // load airports and build fuse index
-  loadAirportsJson().catch(() => { initFuse(); });
+  // search index loads in the worker while the airport table loads here
+  initSearchWorker();
+  loadAirportsJson().catch(() => { buildAirportList(); });
 
   // State
   let flights = [];
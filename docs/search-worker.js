@@ -0,0 +1,237 @@
+// search-worker.js
+// Airport suggestions off the main thread. Loads the search index exported by
+// save_airports_json.py (same format and scoring as airport_search.py) or, if
+// the export has none, builds it here from the airport data, so typing in an
+// airport field never waits on index construction.
+//
+// Messages in:  {type: 'init', manifestUrl}
+//               {type: 'search', id, query, limit}
+// Messages out: {type: 'results', id, results: [{code, score}]}  (results is null
+//               when no index could be loaded)
+
+const MAX_PREFIX_TOKENS = 64;
+const MAX_FUZZY_TOKENS = 8;
+const MAX_POSTINGS = 512;
+const MIN_TRIGRAM_SIMILARITY = 0.5;
+const RARITY_BONUS = 0.45;
+
+let READY = null;
+
+// Lowercase, strip accents and collapse punctuation to spaces (as airport_search.normalize)
+function normalize(text) {
+  return (text || '').toString().normalize('NFKD').replace(/\p{M}/gu, '').toLowerCase()
+    .split(/[^0-9a-z]+/).filter(Boolean).join(' ');
+}
+
+function trigrams(text) {
+  const padded = `  ${text} `;
+  const grams = new Set();
+  for (let i = 0; i < padded.length - 2; i++) grams.add(padded.slice(i, i + 3));
+  return grams;
+}
+
+// Levenshtein distance counting a swap of adjacent letters as one edit
+function editDistance(a, b) {
+  let before = null;
+  let previous = null;
+  let current = Array.from({length: b.length + 1}, (_, j) => j);
+  for (let i = 1; i <= a.length; i++) {
+    [before, previous, current] = [previous, current, [i]];
+    for (let j = 1; j <= b.length; j++) {
+      const cost = a[i - 1] === b[j - 1] ? 0 : 1;
+      current[j] = Math.min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost);
+      if (i > 1 && j > 1 && a[i - 1] === b[j - 2] && a[i - 2] === b[j - 1]) {
+        current[j] = Math.min(current[j], before[j - 2] + 1);
+      }
+    }
+  }
+  return current[b.length];
+}
+
+function lowerBound(list, value, lo = 0) {
+  let hi = list.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (list[mid] < value) lo = mid + 1; else hi = mid;
+  }
+  return lo;
+}
+
+function prefixRange(list, prefix) {
+  const start = lowerBound(list, prefix);
+  return [start, lowerBound(list, prefix + '￿', start)];
+}
+
+// Build an index in the exported format from [{code, name, city, icao}, ...]
+function buildIndex(airports) {
+  const sorted = airports.slice().sort((a, b) => (a.code < b.code ? -1 : a.code > b.code ? 1 : 0));
+  const tokenPostings = new Map();
+  sorted.forEach((airport, id) => {
+    [airport.name, airport.city].forEach((value, field) => {
+      for (const word of normalize(value).split(' ')) {
+        if (!word) continue;
+        if (!tokenPostings.has(word)) tokenPostings.set(word, new Set());
+        tokenPostings.get(word).add(id * 2 + field);
+      }
+    });
+  });
+  const tokens = Array.from(tokenPostings.keys()).sort();
+  return {
+    codes: sorted.map(a => a.code),
+    icaos: sorted.map(a => (a.icao || '').toUpperCase()),
+    tokens,
+    postings: tokens.map(t => Array.from(tokenPostings.get(t)).sort((a, b) => a - b))
+  };
+}
+
+// Add the lookup tables that are not shipped (code maps and the trigram table)
+function prepare(index) {
+  index.codeIds = new Map(index.codes.map((code, i) => [code, i]));
+  index.icaoIds = new Map();
+  index.icaos.forEach((icao, i) => { if (icao) index.icaoIds.set(icao, i); });
+  index.sortedCodes = index.codes.slice().sort();
+  index.trigrams = new Map();
+  index.tokens.forEach((token, id) => {
+    for (const gram of trigrams(token)) {
+      if (!index.trigrams.has(gram)) index.trigrams.set(gram, []);
+      index.trigrams.get(gram).push(id);
+    }
+  });
+  return index;
+}
+
+// [[tokenId, similarity], ...] for words close to a misspelled word, best first
+function fuzzyTokens(index, word) {
+  const grams = trigrams(word);
+  const overlap = new Map();
+  for (const gram of grams) {
+    for (const id of index.trigrams.get(gram) || []) overlap.set(id, (overlap.get(id) || 0) + 1);
+  }
+  const similar = [];
+  for (const [id, count] of overlap) {
+    const token = index.tokens[id];
+    if (2 * count / (grams.size + token.length + 1) < MIN_TRIGRAM_SIMILARITY) continue;
+    const similarity = 1 - editDistance(word, token) / Math.max(word.length, token.length);
+    if (similarity > 0) similar.push([id, similarity]);
+  }
+  similar.sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+  return similar.slice(0, MAX_FUZZY_TOKENS);
+}
+
+// Postings of a sorted postings list that belong to the given airports
+function postingsOf(postings, ids) {
+  const found = [];
+  for (const id of ids) {
+    const i = lowerBound(postings, id * 2);
+    if (i < postings.length && postings[i] >> 1 === id) found.push(postings[i]);
+  }
+  return found;
+}
+
+function search(index, query, limit) {
+  const text = normalize(query);
+  if (!text) return [];
+  const words = text.split(' ');
+  const scores = new Map();
+  const add = (id, points) => scores.set(id, (scores.get(id) || 0) + points);
+  // A word matching both the name and the city (or several words) counts once, at its best
+  const addToken = (best, postings, points) => {
+    for (const posting of postings) {
+      if (points > (best.get(posting >> 1) || 0)) best.set(posting >> 1, points);
+    }
+  };
+
+  // Codes: a single 3-4 character word is most likely an IATA/ICAO code
+  const compact = text.replace(/ /g, '').toUpperCase();
+  let codeMatch = false;
+  if (words.length === 1 && compact.length <= 4) {
+    if (index.codeIds.has(compact)) { add(index.codeIds.get(compact), 100); codeMatch = true; }
+    if (index.icaoIds.has(compact)) { add(index.icaoIds.get(compact), 90); codeMatch = true; }
+    const [start, end] = prefixRange(index.sortedCodes, compact);
+    for (const code of index.sortedCodes.slice(start, Math.min(end, start + MAX_PREFIX_TOKENS))) {
+      if (code !== compact) add(index.codeIds.get(code), 40);
+    }
+  }
+
+  // Words: exact word matches beat prefix matches; shorter completions rank higher
+  const matches = words.map(word => {
+    const matched = [];
+    const [start, end] = prefixRange(index.tokens, word);
+    if (start === end && !codeMatch) {
+      for (const [id, similarity] of fuzzyTokens(index, word)) matched.push([id, 20 * similarity]);
+    }
+    for (let id = start; id < Math.min(end, start + MAX_PREFIX_TOKENS); id++) {
+      const token = index.tokens[id];
+      matched.push([id, token === word ? 30 : 20 * word.length / token.length]);
+    }
+    return {size: matched.reduce((sum, [id]) => sum + index.postings[id].length, 0), matched};
+  });
+
+  // Rarest word first; a common word behind a rarer one only scores the airports found so far
+  for (const {size, matched} of matches.sort((a, b) => a.size - b.size)) {
+    const best = new Map();
+    const candidates = size > MAX_POSTINGS ? Array.from(scores.keys()) : [];
+    let budget = MAX_POSTINGS;
+    for (let [id, points] of matched) {
+      const postings = index.postings[id];
+      points *= 1 + RARITY_BONUS / postings.length;
+      if (candidates.length) {
+        addToken(best, postingsOf(postings, candidates), points);
+      } else if (budget > 0) {
+        addToken(best, postings.slice(0, budget), points);
+        budget -= postings.length;
+      }
+    }
+    for (const [id, points] of best) add(id, points);
+  }
+
+  return Array.from(scores)
+    .sort((a, b) => b[1] - a[1] || (index.codes[a[0]] < index.codes[b[0]] ? -1 : 1))
+    .slice(0, limit)
+    .map(([id, score]) => ({code: index.codes[id], score: Math.round(score * 100) / 100}));
+}
+
+async function fetchJson(url) {
+  const resp = await fetch(url);
+  if (!resp.ok) throw new Error(`HTTP ${resp.status} for ${url}`);
+  return resp.json();
+}
+
+async function loadIndex(manifestUrl) {
+  let manifest = null;
+  try {
+    manifest = await fetchJson(manifestUrl);
+  } catch (e) {
+    // No export at all: fall back to the legacy keyed airports.json
+    const data = await fetchJson(new URL('../airports.json', manifestUrl));
+    return prepare(buildIndex(Object.entries(data).map(([code, info]) => ({
+      code: code.toUpperCase(), name: info.name, city: info.city, icao: info.icao
+    }))));
+  }
+
+  if (manifest.search) return prepare(await fetchJson(new URL(manifest.search.file, manifestUrl)));
+
+  const shards = await Promise.all(manifest.shards.map(s => fetchJson(new URL(s.file, manifestUrl))));
+  const airports = [];
+  for (const data of shards) {
+    const c = data.columns;
+    for (let i = 0; i < c.code.length; i++) {
+      airports.push({code: c.code[i].toUpperCase(), name: c.name[i], city: c.city[i], icao: c.icao[i]});
+    }
+  }
+  return prepare(buildIndex(airports));
+}
+
+self.onmessage = async (event) => {
+  const msg = event.data;
+  if (msg.type === 'init') {
+    READY = loadIndex(msg.manifestUrl);
+    READY.catch(err => console.warn('Search worker could not load an index:', err));
+  } else if (msg.type === 'search') {
+    let results = null;
+    try {
+      results = search(await READY, msg.query, msg.limit || 10);
+    } catch (e) {}
+    self.postMessage({type: 'results', id: msg.id, results});
+  }
+};
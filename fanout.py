@@ -0,0 +1,184 @@
+"""Grouping, file layout and manifest for per-passenger calendar fan-out.
+
+Bookings are grouped by a key field (passenger name, booking reference,
+...) with an external sort: sorted runs of at most `run_size` records are
+spilled to temp files and merged, so memory is bounded by the run size
+plus the largest single group, not by the input. Each group's calendar
+goes to a sharded path (ab/cd/<name>-<hash>.ics) and is replaced
+atomically, and only when something besides DTSTAMP changed.
+manifest.jsonl lists every calendar in key order with its SHA-256, so a
+downstream sync can skip files whose checksum it has already seen.
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import tempfile
+from operator import itemgetter
+from pathlib import Path
+
+from airport_cache import atomic_write
+from ics_update import without_dtstamp
+
+DEFAULT_KEY_FIELD = 'passenger_name'
+# Records held in memory per sorted run before it is spilled to disk
+DEFAULT_RUN_SIZE = 200_000
+MANIFEST_NAME = 'manifest.jsonl'
+
+_SLUG = re.compile(r'[^0-9a-z]+')
+_SORT_KEY = itemgetter(0, 1)
+
+
+def record_key(record, key_field):
+    """Return the grouping key of one raw record (CSV dict or JSONL line)."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    key = str(record.get(key_field) or '').strip()
+    if not key:
+        raise ValueError(f"missing field(s): {key_field}")
+    return key
+
+
+def _spill(run, spill_dir, number):
+    """Write one sorted run as JSON lines and return its path."""
+    path = Path(spill_dir) / f"run-{number:05d}.jsonl"
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in run:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def group_records(records, key_field=DEFAULT_KEY_FIELD, on_reject=None, run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """Group (line_number, record) pairs by key field, in key order.
+
+    Yields (key, [(line_number, record), ...]) with each group's records in
+    input order. Records without a key go to on_reject(line_no, error, record).
+    """
+    run, run_paths = [], []
+    with tempfile.TemporaryDirectory(prefix='fanout-', dir=tmp_dir) as spill_dir:
+        for line_no, record in records:
+            try:
+                key = record_key(record, key_field)
+            except Exception as e:
+                if on_reject is not None:
+                    on_reject(line_no, str(e), record)
+                continue
+            run.append((key, line_no, record))
+            if len(run) >= run_size:
+                run.sort(key=_SORT_KEY)
+                run_paths.append(_spill(run, spill_dir, len(run_paths)))
+                run = []
+
+        # The last run never needs to touch the disk
+        run.sort(key=_SORT_KEY)
+        merged = heapq.merge(*(_read_run(path) for path in run_paths), run, key=_SORT_KEY)
+        for key, items in itertools.groupby(merged, key=itemgetter(0)):
+            yield key, [(line_no, record) for _, line_no, record in items]
+
+
+def calendar_path(key):
+    """Relative, sharded path of the calendar for a key: ab/cd/<slug>-<hash>.ics.
+
+    The two hash-prefix levels keep directories small with millions of files;
+    the slug only makes paths readable, the hash keeps them unique.
+    """
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    slug = _SLUG.sub('-', key.lower()).strip('-')[:40] or 'calendar'
+    return f"{digest[:2]}/{digest[2:4]}/{slug}-{digest[:16]}.ics"
+
+
+def write_calendar_file(path, data):
+    """Atomically write calendar bytes unless the file only differs in DTSTAMP.
+
+    Returns (sha256, size, written) of the file as it is on disk afterwards.
+    """
+    path = Path(path)
+    try:
+        # DTSTAMP has a fixed width, so a size change always means new content
+        if path.stat().st_size == len(data):
+            existing = path.read_bytes()
+            if without_dtstamp(existing) == without_dtstamp(data):
+                return hashlib.sha256(existing).hexdigest(), len(existing), False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, data)
+    return hashlib.sha256(data).hexdigest(), len(data), True
+
+
+def read_manifest(path):
+    """Yield the entries of a manifest.jsonl; a missing manifest has none."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def stale_entries(old_entries, new_entries):
+    """Yield entries of an old manifest whose key is gone from the new one.
+
+    Both manifests are in key order, so this is a single merge pass.
+    """
+    new_keys = (entry['key'] for entry in new_entries)
+    current = next(new_keys, None)
+    for entry in old_entries:
+        while current is not None and current < entry['key']:
+            current = next(new_keys, None)
+        if entry['key'] != current:
+            yield entry
+
+
+class ManifestWriter:
+    """Stream manifest entries (in key order) to <out_dir>/manifest.jsonl.
+
+    The manifest is written to a temp file and swapped in on a clean exit,
+    so readers always see a complete one. With prune=True the calendars of
+    keys that were in the previous manifest but not in this one are deleted.
+    """
+
+    def __init__(self, out_dir, prune=False):
+        self.path = Path(out_dir) / MANIFEST_NAME
+        self.prune = prune
+        self.count = 0
+        self.removed = 0
+        self._tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        return self
+
+    def add(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            if exc_type is None:
+                if self.prune:
+                    for entry in stale_entries(read_manifest(self.path), read_manifest(self._tmp_path)):
+                        try:
+                            (self.path.parent / entry['file']).unlink()
+                            self.removed += 1
+                        except FileNotFoundError:
+                            pass
+                os.replace(self._tmp_path, self.path)
+        finally:
+            if self._tmp_path.exists():
+                self._tmp_path.unlink()
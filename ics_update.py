@@ -0,0 +1,264 @@
+"""Incremental updates of an existing .ics calendar by event UID.
+
+A calendar is indexed once into UID -> (start, end) byte ranges of its
+VEVENT blocks; the index is kept next to the calendar (<name>.ics.uidx)
+and reused while the calendar's size and mtime match. An update copies the
+unchanged byte ranges between edits straight from the old file (with
+os.copy_file_range where available) and only encodes the added, changed
+or cancelled events, so its cost follows the size of the change rather
+than the size of the calendar.
+"""
+import json
+import mmap
+import os
+import re
+from bisect import bisect_right
+from pathlib import Path
+
+from airport_cache import atomic_write
+from ics_writer import CRLF, encode_event
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.uidx'
+
+BEGIN_EVENT = b"BEGIN:VEVENT"
+END_EVENT = b"END:VEVENT"
+END_CALENDAR = b"END:VCALENDAR"
+
+# DTSTAMP only records when a file was generated, so it is ignored when comparing events
+_DTSTAMP = re.compile(rb"^DTSTAMP:[^\r\n]*\r?\n", re.MULTILINE)
+_COPY_CHUNK = 1024 * 1024
+
+
+class CalendarIndex:
+    """UID -> (start, end) byte ranges of the VEVENTs in one calendar file."""
+
+    def __init__(self, events, footer, size, mtime_ns):
+        self.events = events      # uid -> [start, end), end includes the line break
+        self.footer = footer      # offset of the END:VCALENDAR line
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def scan(cls, path):
+        """Build the index by scanning the calendar (memory-mapped)."""
+        stat = os.stat(path)
+        events = {}
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while True:
+                start = mm.find(BEGIN_EVENT, pos)
+                if start < 0:
+                    break
+                end = mm.find(END_EVENT, start)
+                if end < 0:
+                    raise ValueError(f"unterminated VEVENT at byte {start}")
+                end = mm.find(b"\n", end) + 1 or len(mm)
+                uid = _event_uid(mm[start:end])
+                if uid:
+                    events[uid] = (start, end)
+                pos = end
+            footer = mm.rfind(END_CALENDAR)
+        if footer < 0:
+            raise ValueError("missing END:VCALENDAR")
+        return cls(events, footer, stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def load(cls, path):
+        """Return the saved index if it still matches the calendar, else rescan."""
+        index_path = Path(f"{path}{INDEX_SUFFIX}")
+        stat = os.stat(path)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') == INDEX_VERSION and data['size'] == stat.st_size
+                    and data['mtime_ns'] == stat.st_mtime_ns):
+                return cls({uid: tuple(span) for uid, span in data['events'].items()},
+                           data['footer'], data['size'], data['mtime_ns'])
+        except (OSError, ValueError, KeyError):
+            pass
+        index = cls.scan(path)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        """Store the index next to the calendar; failures only cost a rescan later."""
+        data = {'version': INDEX_VERSION, 'size': self.size, 'mtime_ns': self.mtime_ns,
+                'footer': self.footer, 'events': self.events}
+        try:
+            atomic_write(Path(f"{path}{INDEX_SUFFIX}"), json.dumps(data, separators=(',', ':')))
+        except OSError as e:
+            print(f"Note: Could not save calendar index: {e}")
+
+
+def without_dtstamp(data):
+    """Return encoded calendar data with its DTSTAMP lines removed, for comparisons."""
+    return _DTSTAMP.sub(b"", data)
+
+
+def _event_uid(block):
+    """Return the (unfolded) UID of one encoded VEVENT block, or ''."""
+    start = block.find(b"\nUID:")
+    if start < 0:
+        return ''
+    start += len(b"\nUID:")
+    end = block.find(b"\n", start)
+    value = block[start:end].rstrip(b"\r")
+    # Folded continuation lines start with a single space
+    while end + 1 < len(block) and block[end + 1:end + 2] == b" ":
+        next_end = block.find(b"\n", end + 1)
+        value += block[end + 2:next_end].rstrip(b"\r")
+        end = next_end
+    return value.decode('utf-8')
+
+
+def _content_uid(event_content):
+    for line in event_content.split("\n"):
+        if line.startswith("UID:"):
+            return line[4:]
+    raise ValueError("event has no UID")
+
+
+def _cancel(block):
+    """Mark an encoded VEVENT as cancelled (RFC 5545 STATUS:CANCELLED)."""
+    if b"\nSTATUS:CANCELLED" in block:
+        return block
+    end = block.rfind(END_EVENT)
+    return block[:end] + b"STATUS:CANCELLED" + CRLF + block[end:]
+
+
+def _copy_range(src, dst, start, end):
+    """Copy bytes [start, end) of src into dst at its current position."""
+    dst.flush()
+    remaining = end - start
+    if hasattr(os, 'copy_file_range'):
+        try:
+            offset = start
+            while remaining:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset)
+                if not copied:
+                    break
+                offset += copied
+                remaining -= copied
+            # Resync the buffered writer with the file position copy_file_range advanced
+            dst.seek(0, os.SEEK_END)
+            if not remaining:
+                return
+            start = offset
+        except OSError:
+            dst.seek(0, os.SEEK_END)
+    src.seek(start)
+    while remaining:
+        data = src.read(min(remaining, _COPY_CHUNK))
+        if not data:
+            raise ValueError("calendar changed while it was being updated")
+        dst.write(data)
+        remaining -= len(data)
+
+
+def update_calendar(path, events=(), cancelled=(), output_path=None, drop_cancelled=False):
+    """Apply added/changed events and cancellations to an existing calendar.
+
+    `events` are VEVENT strings from create_flight_ics: an event whose UID
+    is already in the calendar replaces it (unless only DTSTAMP differs),
+    new UIDs are appended. UIDs in `cancelled` get STATUS:CANCELLED, or are
+    removed with drop_cancelled=True; a cancellation applies after any
+    change of the same UID in `events`. The result replaces `output_path`
+    (default: `path`) atomically. Returns a dict of counts.
+    """
+    path = Path(path)
+    output_path = Path(output_path or path)
+    index = CalendarIndex.load(path)
+    stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'cancelled': 0, 'missing': 0}
+
+    replacements = {}   # start offset -> (end offset, new bytes)
+    appended = {}
+    with open(path, 'rb') as src:
+        def read_block(span):
+            src.seek(span[0])
+            return src.read(span[1] - span[0])
+
+        edited = {}  # uid -> new bytes for events already in the calendar
+        cancelled_uids = set()
+        for event_content in events:
+            uid = _content_uid(event_content)
+            data = encode_event(event_content)
+            if uid in index.events:
+                edited[uid] = data
+            else:
+                if uid not in appended:
+                    stats['added'] += 1
+                appended[uid] = data
+
+        # Cancellations apply after the changes, so a changed-then-cancelled event keeps its change
+        for uid in cancelled:
+            span = index.events.get(uid)
+            if span is None:
+                if appended.pop(uid, None) is None:
+                    stats['missing'] += 1
+                else:
+                    stats['added'] -= 1
+                continue
+            if drop_cancelled:
+                edited[uid] = b""
+            else:
+                edited[uid] = _cancel(edited[uid] if uid in edited else read_block(span))
+            cancelled_uids.add(uid)
+
+        for uid, data in edited.items():
+            span = index.events[uid]
+            if data and without_dtstamp(read_block(span)) == without_dtstamp(data):
+                stats['unchanged'] += 1
+                continue
+            replacements[span[0]] = (span[1], data)
+            stats['cancelled' if uid in cancelled_uids else 'changed'] += 1
+
+        if not replacements and not appended and output_path == path:
+            return stats
+
+        # Copy unchanged ranges between edits; remember where every event ends up
+        tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+        new_events = {}
+        shift = 0
+        try:
+            with open(tmp_path, 'wb') as dst:
+                pos = 0
+                for start in sorted(replacements):
+                    end, data = replacements[start]
+                    _copy_range(src, dst, pos, start)
+                    if data:
+                        new_events[_event_uid(data)] = (start + shift, start + shift + len(data))
+                    dst.write(data)
+                    shift += len(data) - (end - start)
+                    pos = end
+                _copy_range(src, dst, pos, index.footer)
+                footer = index.footer + shift
+                for uid, data in appended.items():
+                    new_events[uid] = (footer, footer + len(data))
+                    dst.write(data)
+                    footer += len(data)
+                _copy_range(src, dst, index.footer, index.size)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, output_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    # Events before the first edit keep their offsets; later ones move by the edits before them
+    edits = sorted(replacements.items())
+    starts = [start for start, _ in edits]
+    deltas, total = [], 0
+    for start, (end, data) in edits:
+        total += len(data) - (end - start)
+        deltas.append(total)
+    for uid, (start, end) in index.events.items():
+        if uid in new_events or (start in replacements and not replacements[start][1]):
+            continue
+        i = bisect_right(starts, start)
+        delta = deltas[i - 1] if i else 0
+        new_events[uid] = (start + delta, end + delta)
+
+    stat = os.stat(output_path)
+    CalendarIndex(new_events, footer, stat.st_size, stat.st_mtime_ns).save(output_path)
+    return stats
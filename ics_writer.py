@@ -0,0 +1,97 @@
+"""Streaming iCalendar writer with RFC 5545 line endings and folding.
+
+Events are folded and flushed as they are written, so memory use does not
+depend on how many events go into a calendar.
+"""
+import io
+
+CRLF = b"\r\n"
+
+# Content lines longer than this many octets are folded (RFC 5545 3.1)
+MAX_LINE_OCTETS = 75
+
+CALENDAR_HEADER = (
+    "BEGIN:VCALENDAR",
+    "VERSION:2.0",
+    "PRODID:-//Flight Calendar Generator//EN",
+    "CALSCALE:GREGORIAN",
+    "METHOD:PUBLISH",
+)
+CALENDAR_FOOTER = ("END:VCALENDAR",)
+
+
+def fold_line(line):
+    """Encode one content line as UTF-8, folded to 75 octets per physical line.
+
+    Continuation lines start with a single space, and multi-byte characters
+    are never split across a fold.
+    """
+    data = line.encode('utf-8')
+    if len(data) <= MAX_LINE_OCTETS:
+        return data
+
+    parts = []
+    start, limit = 0, MAX_LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start = end
+        # The leading space of a continuation line counts towards the limit
+        limit = MAX_LINE_OCTETS - 1
+    return (CRLF + b" ").join(parts)
+
+
+def encode_event(event_content):
+    """Encode one VEVENT block (as produced by create_flight_ics) to folded CRLF bytes."""
+    return b"".join(fold_line(line) + CRLF for line in event_content.split("\n"))
+
+
+class ICSWriter:
+    """Write a VCALENDAR incrementally to a file object or socket.
+
+    Use as a context manager: the calendar header is written on enter and
+    the footer on a clean exit. Binary streams and sockets receive bytes;
+    text streams receive str (open them with newline='').
+    """
+
+    def __init__(self, out, buffer_size=64 * 1024):
+        self.out = out
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._buffer = bytearray()
+        if hasattr(out, 'sendall'):
+            self._send = out.sendall
+        elif isinstance(out, io.TextIOBase):
+            self._send = lambda data: out.write(data.decode('utf-8'))
+        else:
+            self._send = out.write
+
+    def __enter__(self):
+        self.write_lines(CALENDAR_HEADER)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.write_lines(CALENDAR_FOOTER)
+        self.flush()
+
+    def write_lines(self, lines):
+        """Fold and buffer content lines, flushing once the buffer is full."""
+        buffer = self._buffer
+        for line in lines:
+            buffer += fold_line(line)
+            buffer += CRLF
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_event(self, event_content):
+        """Write one VEVENT block as produced by create_flight_ics."""
+        self.write_lines(event_content.split("\n"))
+        self.count += 1
+
+    def flush(self):
+        if self._buffer:
+            self._send(bytes(self._buffer))
+            self._buffer.clear()
@@ -0,0 +1,149 @@
+"""Lightweight counters and timing histograms for hot paths.
+
+Disabled by default; turn on with enable() (e.g. from a --metrics flag) or
+by setting AIR2CAL_METRICS=1. While disabled, instrumented code only pays
+for one attribute check. Set AIR2CAL_METRICS_FILE to dump the collected
+metrics (JSON, or Prometheus text for a .prom file) when the process exits;
+only the main process writes the file, multiprocessing children (which
+inherit the variable) leave it alone.
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+from bisect import bisect_left
+
+ENV_VAR = 'AIR2CAL_METRICS'
+ENV_FILE_VAR = 'AIR2CAL_METRICS_FILE'
+PREFIX = 'air2cal_'
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is +Inf
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_value(value):
+    """Escape a label value for the exposition format (backslash, quote, newline)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Process-wide registry of counters and histograms."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+            hist['buckets'][bisect_left(BUCKETS, seconds)] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    def to_dict(self):
+        """Return all metrics as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'buckets': list(BUCKETS),
+                                'counts': list(hist['buckets']), 'sum': hist['sum'], 'count': hist['count']}
+                               for (name, labels), hist in sorted(self.histograms.items())],
+            }
+
+    def merge(self, data):
+        """Add metrics exported by to_dict() (e.g. from a worker process)."""
+        with self._lock:
+            for counter in data.get('counters', []):
+                key = _key(counter['name'], counter['labels'])
+                self.counters[key] = self.counters.get(key, 0) + counter['value']
+            for item in data.get('histograms', []):
+                key = _key(item['name'], item['labels'])
+                hist = self.histograms.setdefault(
+                    key, {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+                hist['buckets'] = [a + b for a, b in zip(hist['buckets'], item['counts'])]
+                hist['sum'] += item['sum']
+                hist['count'] += item['count']
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Render metrics in the Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{_label_value(v)}"' for k, v in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} counter")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{fmt(labels)} {value}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(list(BUCKETS) + ['+Inf'], hist['buckets']):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{fmt(labels)} {hist['sum']}")
+                lines.append(f"{PREFIX}{name}_count{fmt(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write metrics to a file: Prometheus text for .prom/.txt, JSON otherwise."""
+        text = self.to_prometheus() if str(path).endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+metrics = Metrics(enabled=os.environ.get(ENV_VAR, '').lower() not in ('', '0', 'false', 'no'))
+
+
+def enable():
+    metrics.enabled = True
+
+
+def disable():
+    metrics.enabled = False
+
+
+def _write_at_exit(path):
+    # Pool workers hand their metrics to the parent; one writer per file.
+    # Checked at exit: spawned children import this module before they know their parent.
+    if multiprocessing.parent_process() is None:
+        metrics.write(path)
+
+
+if os.environ.get(ENV_FILE_VAR):
+    metrics.enabled = True
+    atexit.register(_write_at_exit, os.environ[ENV_FILE_VAR])
@@ -1,9 +1,21 @@
+import copy
+import hashlib
 import os
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import json
 from pathlib import Path
 
+from airport_records import AirportRecord, compact_airports
+from airport_search import AirportSearchIndex, normalize
+from airport_cache import AirportJournal, JOURNAL_COMPACT_THRESHOLD, atomic_write, file_lock, valid_code
+from airport_snapshot import AirportSnapshot, SnapshotError, write_snapshot
+from ics_writer import ICSWriter
+from instrumentation import metrics
+from render_cache import DTSTAMP_PLACEHOLDER, render_key
+
 # Try to import airportsdata, install if not available
 try:
     import airportsdata
@@ -12,26 +24,264 @@ except ImportError:
     AIRPORTSDATA_AVAILABLE = False
     print("Note: airportsdata package not installed. Will use limited built-in data.")
 
+# Tag stored in the binary snapshot so a new airportsdata release triggers a rebuild
+if AIRPORTSDATA_AVAILABLE:
+    SNAPSHOT_SOURCE = f"airportsdata-{getattr(airportsdata, '__version__', '')}"
+else:
+    SNAPSHOT_SOURCE = "builtin"
+
+class _AirportState:
+    """One version of the loaded airport data and the indexes built from it.
+    
+    AirportDatabase reaches its data through a single reference to this
+    object, which reload() replaces wholesale (copy-on-write): a lookup
+    that captured the reference sees one consistent version throughout.
+    """
+    
+    __slots__ = ('version', 'airports', 'snapshot', 'search_index', 'geo_index',
+                 'icao_index', 'city_index', 'indexed_size',
+                 'on_demand', 'iata_data', 'icao_by_iata', 'iata_by_icao', 'iata_cities', 'warmed')
+    
+    def __init__(self, version=0):
+        self.version = version
+        self.airports = {}
+        self.snapshot = None
+        self.search_index = None
+        self.geo_index = None
+        # ICAO -> code and city -> codes over `airports` (the snapshot has its own)
+        self.icao_index = None
+        self.city_index = None
+        self.indexed_size = -1
+        # On-demand airportsdata state (lazy mode without a cache)
+        self.on_demand = False
+        self.iata_data = None
+        self.icao_by_iata = None
+        self.iata_by_icao = None
+        # Normalized city -> IATA codes over iata_data (city lookups without warming up)
+        self.iata_cities = None
+        self.warmed = False
+
+def _state_attribute(name):
+    """Property that reads and writes a field of the current _AirportState."""
+    return property(lambda self: getattr(self._state, name),
+                    lambda self, value: setattr(self._state, name, value))
+
 class AirportDatabase:
     """Airport database using airportsdata package."""
     
-    def __init__(self, use_cache=True):
-        self.airports = {}
+    airports = _state_attribute('airports')
+    snapshot = _state_attribute('snapshot')
+    _search_index = _state_attribute('search_index')
+    _geo_index = _state_attribute('geo_index')
+    _on_demand = _state_attribute('on_demand')
+    _iata_data = _state_attribute('iata_data')
+    _icao_by_iata = _state_attribute('icao_by_iata')
+    
+    def __init__(self, use_cache=True, lazy=False):
+        self._state = _AirportState()
+        self._reload_lock = threading.Lock()
+        self._reloader = None
+        self._shared = None
         self.cache_file = Path("airport_timezone_cache.json")
+        self.snapshot_file = self.cache_file.with_suffix(".snap")
+        self.lock_file = self.cache_file.with_suffix(".lock")
+        self.journal = AirportJournal(self.cache_file.with_suffix(".journal"))
+        self.search_file = self.cache_file.with_suffix(".search.json")
         self.use_cache = use_cache
+        self.lazy = lazy
+        self.loaded = False
+        
+        # Lazy mode defers opening any data source until the first lookup
+        if not lazy:
+            self.load()
+    
+    @property
+    def version(self):
+        """Number of reloads applied so far (0 for the data loaded at startup)."""
+        return self._state.version
+    
+    def load(self, rebuild=False):
+        """Open the backing data source (snapshot, airportsdata or built-in table).
+        
+        With rebuild=True the snapshot is ignored and rebuilt from the sources.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        use_cache = self.use_cache
         
-        if AIRPORTSDATA_AVAILABLE:
+        # Lazy lookups without a cache read airportsdata entries one by one
+        if self.lazy and not use_cache and AIRPORTSDATA_AVAILABLE:
+            self._on_demand = True
+            return
+        
+        # Fast path: memory-map the binary snapshot instead of loading everything
+        if not (use_cache and not rebuild and self.load_snapshot()):
+            if AIRPORTSDATA_AVAILABLE:
+                self.load_airportsdata()
+            else:
+                self.load_builtin_data()
+            
+            # Load additional cached airports if available
+            if use_cache and self.cache_file.exists():
+                self.load_cache()
+            
+            # Rebuild the cache and snapshot once so later runs take the fast path
+            if use_cache:
+                self.save_cache()
+        
+        # Custom airports added since the last compaction
+        if use_cache:
+            self.load_journal()
+    
+    def warm_up(self):
+        """Preload every airport into memory, e.g. for long-lived servers."""
+        self.load()
+        if self._on_demand:
+            self._on_demand = False
+            self._iata_data = self._icao_by_iata = None
             self.load_airportsdata()
+        elif self.snapshot is not None:
+            for code, info in self.snapshot.items():
+                self.airports.setdefault(code, info)
+        self._state.warmed = True
+        print(f"✓ Warmed up {len(self.airports)} airports")
+    
+    def reload(self, rebuild=False):
+        """Load the current airport data as a new version and swap it in.
+        
+        The new version is loaded (and its indexes rebuilt) on a separate
+        instance while lookups keep using the old one; the swap itself is a
+        single reference assignment, and the old snapshot is never closed
+        under a running lookup. Pass rebuild=True after airportsdata was
+        upgraded. Returns the new version number.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            old = self._state
+            # Constructed lazily so it opens our files, then loaded the way we were
+            fresh = AirportDatabase(use_cache=self.use_cache, lazy=True)
+            fresh.lazy = self.lazy
+            fresh.cache_file, fresh.snapshot_file, fresh.lock_file = self.cache_file, self.snapshot_file, self.lock_file
+            fresh.journal, fresh.search_file = self.journal, self.search_file
+            fresh.load(rebuild=rebuild)
+            if old.warmed:
+                fresh.warm_up()
+            if old.search_index is not None:
+                fresh.get_search_index()
+            if old.geo_index is not None:
+                fresh.get_geo_index()
+            fresh._state.version = old.version + 1
+            self._state = fresh._state
+            self.loaded = True
+        metrics.observe('reload_seconds', time.perf_counter() - start)
+        metrics.incr('reloads_total', result='ok')
+        return self._state.version
+    
+    def pinned(self):
+        """Return a view of this database fixed at its current data version.
+        
+        Reloads replace the data behind this database but not behind the
+        view, so a long-running job can render every event from one version.
+        """
+        self.load()
+        view = copy.copy(self)
+        view._reloader = None
+        return view
+    
+    def start_auto_reload(self, interval=None):
+        """Reload in a background thread whenever the airport data files change."""
+        from airport_reload import DEFAULT_INTERVAL, AirportReloader
+        if self._reloader is None:
+            self.load()
+            self._reloader = AirportReloader(self, interval or DEFAULT_INTERVAL)
+            self._reloader.start()
+        return self._reloader
+    
+    def stop_auto_reload(self):
+        """Stop the background reloader, if one is running."""
+        if self._reloader is not None:
+            self._reloader.stop()
+            self._reloader = None
+    
+    def share(self):
+        """Publish the current airport table in shared memory for worker processes.
+        
+        Returns an airport_shared.SharedAirportTable; workers open it with
+        AirportDatabase.attach_shared(table.name). Close the table (or use
+        it as a context manager) once the workers are done.
+        """
+        from airport_shared import SharedAirportTable
+        self.load()
+        start = time.perf_counter()
+        table = SharedAirportTable(self)
+        metrics.observe('source_load_seconds', time.perf_counter() - start, source='share')
+        return table
+    
+    @classmethod
+    def attach_shared(cls, name):
+        """Open an airport table published with share(), reading it in place (read-only).
+        
+        The database never touches the cache files; codes missing from the
+        table are unknown, as with any other source.
+        """
+        from airport_shared import AttachedAirportTable
+        db = cls(use_cache=False, lazy=True)
+        db._shared = AttachedAirportTable(name)
+        db.snapshot = db._shared.snapshot
+        db.loaded = True
+        return db
+    
+    @staticmethod
+    def _airport_record(data, icao):
+        """Convert an airportsdata entry into our (compact, read-only) airport record."""
+        return AirportRecord(
+            name=data.get('name', ''),
+            city=data.get('city', ''),
+            country=data.get('country', ''),
+            tz=data.get('tz', ''),
+            lat=data.get('lat', ''),
+            lon=data.get('lon', ''),
+            alt=data.get('alt', ''),
+            icao=icao
+        )
+    
+    def _load_airportsdata_record(self, airport_code):
+        """Materialize a single airport from airportsdata (lazy mode)."""
+        state = self._state
+        if state.iata_data is None:
+            state.iata_data = airportsdata.load('IATA')
+        
+        data = state.iata_data.get(airport_code)
+        if data is not None and len(airport_code) == 3:
+            info = self._airport_record(data, data.get('icao', ''))
         else:
-            self.load_builtin_data()
+            # Only pay for the ICAO dataset when the IATA one misses
+            self._load_icao_by_iata(state)
+            if airport_code not in state.icao_by_iata:
+                return None
+            code, data = state.icao_by_iata[airport_code]
+            info = self._airport_record(data, code)
         
-        # Load additional cached airports if available
-        if use_cache and self.cache_file.exists():
-            self.load_cache()
+        state.airports[airport_code] = info
+        return info
+    
+    @staticmethod
+    def _load_icao_by_iata(state):
+        """Build the IATA <-> ICAO maps of the airportsdata ICAO dataset (lazy mode)."""
+        if state.icao_by_iata is None:
+            icao_by_iata, iata_by_icao = {}, {}
+            for code, data in airportsdata.load('ICAO').items():
+                iata_code = (data.get('iata') or '').upper()
+                if code and len(code) == 4 and iata_code:
+                    icao_by_iata.setdefault(iata_code, (code, data))
+                    iata_by_icao.setdefault(code.upper(), iata_code)
+            state.icao_by_iata, state.iata_by_icao = icao_by_iata, iata_by_icao
     
     def load_airportsdata(self):
         """Load airport data from airportsdata package."""
         print("Loading airport data from airportsdata package...")
+        start = time.perf_counter()
         try:
             # Load IATA airport codes (3-letter codes like JFK, LAX)
             airports_iata = airportsdata.load('IATA')
@@ -42,16 +292,7 @@ class AirportDatabase:
             # Combine both datasets
             for code, data in airports_iata.items():
                 if code and len(code) == 3:  # Only store valid IATA codes
-                    self.airports[code.upper()] = {
-                        'name': data.get('name', ''),
-                        'city': data.get('city', ''),
-                        'country': data.get('country', ''),
-                        'tz': data.get('tz', ''),
-                        'lat': data.get('lat', ''),
-                        'lon': data.get('lon', ''),
-                        'alt': data.get('alt', ''),
-                        'icao': data.get('icao', '')
-                    }
+                    self.airports[code.upper()] = self._airport_record(data, data.get('icao', ''))
             
             # Add ICAO airports that might not be in IATA dataset
             for code, data in airports_icao.items():
@@ -59,30 +300,20 @@ class AirportDatabase:
                     # Try to find corresponding IATA code
                     iata_code = data.get('iata', '')
                     if iata_code and iata_code not in self.airports:
-                        self.airports[iata_code.upper()] = {
-                            'name': data.get('name', ''),
-                            'city': data.get('city', ''),
-                            'country': data.get('country', ''),
-                            'tz': data.get('tz', ''),
-                            'lat': data.get('lat', ''),
-                            'lon': data.get('lon', ''),
-                            'alt': data.get('alt', ''),
-                            'icao': code
-                        }
+                        self.airports[iata_code.upper()] = self._airport_record(data, code)
             
             print(f"✓ Loaded {len(self.airports)} airports from airportsdata")
-            
-            # Save to cache for offline use
-            if self.use_cache:
-                self.save_cache()
+            metrics.observe('source_load_seconds', time.perf_counter() - start, source='airportsdata')
                 
         except Exception as e:
             print(f"Error loading airportsdata: {e}")
+            metrics.incr('source_load_errors_total', source='airportsdata')
             self.load_builtin_data()
     
     def load_builtin_data(self):
         """Load built-in airport data when airportsdata is not available."""
         print("Using built-in airport database...")
+        start = time.perf_counter()
         
         # Comprehensive airport database with timezones
         builtin_airports = {
@@ -169,11 +400,13 @@ class AirportDatabase:
             'SCL': {'tz': 'America/Santiago', 'name': 'Arturo Merino Benítez International Airport', 'city': 'Santiago', 'country': 'CL'},
         }
         
-        self.airports = builtin_airports
+        self.airports = compact_airports(builtin_airports)
         print(f"✓ Loaded {len(self.airports)} airports from built-in database")
+        metrics.observe('source_load_seconds', time.perf_counter() - start, source='builtin')
     
     def load_cache(self):
         """Load additional airports from cache."""
+        start = time.perf_counter()
         try:
             with open(self.cache_file, 'r', encoding='utf-8') as f:
                 cached_data = json.load(f)
@@ -181,33 +414,347 @@ class AirportDatabase:
             # Merge cache with existing data
             for code, data in cached_data.items():
                 if code.upper() not in self.airports:
-                    self.airports[code.upper()] = data
+                    self.airports[code.upper()] = AirportRecord.from_dict(data)
             
             print(f"✓ Loaded {len(cached_data)} airports from cache")
+            metrics.observe('cache_load_seconds', time.perf_counter() - start)
         except Exception as e:
             print(f"Note: Could not load cache: {e}")
+            metrics.incr('cache_errors_total', operation='load')
     
     def save_cache(self):
-        """Save custom airports to cache."""
+        """Compact the cache: fold in the journal and rewrite the JSON cache and snapshot."""
+        start = time.perf_counter()
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.airports, f, indent=2, ensure_ascii=False)
+            with file_lock(self.lock_file):
+                # Pick up airports other processes journaled since we loaded
+                self.airports.update(self.journal.read())
+                airports = self.all_airports()
+                atomic_write(self.cache_file, json.dumps(airports, indent=2, ensure_ascii=False, default=dict))
+                write_snapshot(airports, self.snapshot_file, source=SNAPSHOT_SOURCE)
+                self.journal.reset()
+            metrics.observe('cache_save_seconds', time.perf_counter() - start)
         except Exception as e:
             print(f"Note: Could not save cache: {e}")
+            metrics.incr('cache_errors_total', operation='save')
+    
+    def load_journal(self):
+        """Overlay custom airports from the journal, compacting it once it grows large."""
+        try:
+            entries = self.journal.read()
+        except Exception as e:
+            print(f"Note: Could not load journal: {e}")
+            return
+        if not entries:
+            return
+        
+        self.airports.update(entries)
+        print(f"✓ Loaded {len(entries)} custom airports from journal")
+        
+        if len(entries) >= JOURNAL_COMPACT_THRESHOLD:
+            self.save_cache()
+    
+    def save_custom_airport(self, airport_code, info=None):
+        """Append one custom airport to the journal instead of rewriting the cache.
+        
+        Once the journal holds JOURNAL_COMPACT_THRESHOLD airports it is
+        compacted right away, so long-running processes do not wait for a restart.
+        Codes other than 2-8 ASCII letters or digits are kept for this run only.
+        """
+        if not valid_code(airport_code):
+            print(f"Note: Could not save airport to cache: {airport_code!r} is not an ASCII airport code")
+            return
+        try:
+            with file_lock(self.lock_file):
+                self.journal.append(airport_code, self.airports[airport_code] if info is None else info)
+                compact = len(self.journal.read()) >= JOURNAL_COMPACT_THRESHOLD
+        except Exception as e:
+            print(f"Note: Could not save airport to cache: {e}")
+            return
+        if compact:
+            self.save_cache()
+    
+    def load_snapshot(self):
+        """Memory-map the binary snapshot if it is current. Returns True on success."""
+        if not self.snapshot_file.exists():
+            return False
+        start = time.perf_counter()
+        try:
+            # A hand-edited JSON cache or a new airportsdata release invalidates the snapshot
+            if self.cache_file.exists() and self.cache_file.stat().st_mtime > self.snapshot_file.stat().st_mtime:
+                return False
+            snapshot = AirportSnapshot.open(self.snapshot_file)
+        except (OSError, SnapshotError) as e:
+            print(f"Note: Could not load snapshot: {e}")
+            return False
+        if AIRPORTSDATA_AVAILABLE and snapshot.source != SNAPSHOT_SOURCE:
+            snapshot.close()
+            return False
+        
+        self.snapshot = snapshot
+        print(f"✓ Loaded {len(snapshot)} airports from snapshot")
+        metrics.observe('source_load_seconds', time.perf_counter() - start, source='snapshot')
+        return True
+    
+    def all_airports(self):
+        """Return every known airport as a plain dict (decodes the whole snapshot)."""
+        self.load()
+        if self._on_demand:
+            self.warm_up()
+        state = self._state
+        if state.snapshot is None:
+            return state.airports
+        merged = state.snapshot.to_dict()
+        merged.update(state.airports)
+        return merged
+    
+    def __len__(self):
+        """Number of known airports."""
+        self.load()
+        if self._on_demand:
+            self.warm_up()
+        state = self._state
+        if state.snapshot is None:
+            return len(state.airports)
+        return len(state.snapshot) + sum(1 for code in state.airports if code not in state.snapshot)
+    
+    def get_search_index(self):
+        """Return the free-text search index, loading or building it on first use."""
+        state = self._state
+        if state.search_index is None:
+            state.search_index = self.load_search_index()
+        return state.search_index
+    
+    def load_search_index(self):
+        """Load the persisted search index, rebuilding it if the airport data changed."""
+        signature = self._search_signature()
+        if self.use_cache and self.search_file.exists():
+            try:
+                index = AirportSearchIndex.load(self.search_file)
+                if index.signature == signature:
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Note: Could not load search index: {e}")
+        
+        index = AirportSearchIndex.build(self.all_airports(), signature)
+        if self.use_cache:
+            try:
+                with file_lock(self.lock_file):
+                    atomic_write(self.search_file, index.to_json())
+            except Exception as e:
+                print(f"Note: Could not save search index: {e}")
+        return index
+    
+    def _search_signature(self):
+        """Hash of the indexed fields: the snapshot bytes plus the airports held outside it."""
+        self.load()
+        if self._on_demand:
+            self.warm_up()
+        state = self._state
+        digest = hashlib.blake2b(digest_size=16)
+        if state.snapshot is not None:
+            digest.update(state.snapshot.buf)
+        for code in sorted(state.airports):
+            if state.snapshot is None or code not in state.snapshot:
+                info = state.airports[code]
+                fields = (code, info.get('icao'), info.get('name'), info.get('city'))
+                digest.update('\x1f'.join(str(field or '') for field in fields).encode('utf-8') + b'\x1e')
+        return f"{SNAPSHOT_SOURCE}:{digest.hexdigest()}"
+    
+    def search(self, query, limit=10):
+        """Find airports by free text (code, name or city), best match first.
+        
+        Returns a list of dicts with code, name, city, country, tz and score.
+        """
+        view = self.pinned()
+        index = view.get_search_index()
+        start = time.perf_counter() if metrics.enabled else None
+        results = []
+        for code, score in index.search(query, limit):
+            info = view.lookup(code) or {}
+            results.append({
+                'code': code,
+                'name': info.get('name', ''),
+                'city': info.get('city', ''),
+                'country': info.get('country', ''),
+                'tz': info.get('tz', ''),
+                'score': score
+            })
+        if start is not None:
+            metrics.observe('search_seconds', time.perf_counter() - start)
+        return results
+    
+    def get_geo_index(self):
+        """Return the spatial index over airport coordinates (requires numpy)."""
+        self.load()
+        if self._on_demand:
+            self.warm_up()
+        state = self._state
+        if state.geo_index is None:
+            from airport_geo import AirportGeoIndex
+            if state.snapshot is None:
+                coordinates = [(code, info.get('lat'), info.get('lon')) for code, info in state.airports.items()]
+            else:
+                # Read coordinates straight from the snapshot records, then apply the overlay
+                coordinates = [item for item in state.snapshot.coordinates() if item[0] not in state.airports]
+                coordinates += [(code, info.get('lat'), info.get('lon')) for code, info in state.airports.items()]
+            # ICAO codes are looked up through the ICAO index of the same version
+            state.geo_index = AirportGeoIndex.build(
+                coordinates, resolve=lambda code: self._code_for_icao(state, code) if len(code) == 4 else None)
+        return state.geo_index
+    
+    def nearest_airports(self, lat, lon, n=5, max_km=None):
+        """Return the n airports nearest to a point as [(code, distance_km), ...]."""
+        return self.get_geo_index().nearest(lat, lon, n, max_km)
+    
+    def airports_within(self, lat, lon, radius_km):
+        """Return [(code, distance_km), ...] for airports within radius_km, nearest first."""
+        return self.get_geo_index().within(lat, lon, radius_km)
+    
+    def distance_km(self, code_a, code_b):
+        """Great-circle distance between two airports in km (nan if unknown)."""
+        return self.get_geo_index().distance(code_a.upper(), code_b.upper())
+    
+    def _overlay_indexes(self, state):
+        """Return (icao -> code, city -> codes) for the in-memory airports, rebuilt as they grow."""
+        airports = state.airports
+        if state.indexed_size != len(airports):
+            icao_index, city_index = {}, {}
+            for code in sorted(airports):
+                info = airports[code]
+                icao = str(info.get('icao') or '').strip().upper()
+                if icao:
+                    icao_index.setdefault(icao, code)
+                city = normalize(info.get('city'))
+                if city:
+                    city_index.setdefault(city, []).append(code)
+            state.icao_index, state.city_index = icao_index, city_index
+            state.indexed_size = len(airports)
+        return state.icao_index, state.city_index
+    
+    def _code_for_icao(self, state, icao):
+        """Return the airport code stored for an ICAO code, or None."""
+        code = self._overlay_indexes(state)[0].get(icao)
+        if code is None:
+            if state.snapshot is not None:
+                code = state.snapshot.code_for_icao(icao)
+            elif state.on_demand:
+                self._load_icao_by_iata(state)
+                code = state.iata_by_icao.get(icao)
+        return code
+    
+    def _lookup_code(self, state, airport_code):
+        info = state.airports.get(airport_code)
+        if info is None:
+            if state.snapshot is not None:
+                info = state.snapshot.get(airport_code)
+            elif state.on_demand:
+                info = self._load_airportsdata_record(airport_code)
+        return info
+    
+    def lookup(self, airport_code):
+        """Return the stored record for an airport code, or None.
+        
+        Codes are IATA keys; a 4-letter code that is not one is looked up
+        as an ICAO code through the ICAO index.
+        """
+        self.load()
+        return self._lookup(self._state, airport_code)
+    
+    def _lookup(self, state, airport_code):
+        info = self._lookup_code(state, airport_code)
+        if info is None and len(airport_code) == 4:
+            code = self._code_for_icao(state, airport_code.upper())
+            if code is not None:
+                info = self._lookup_code(state, code)
+        return info
+    
+    def airports_in_city(self, city):
+        """Return the codes of all airports in a city (case, accents and punctuation ignored)."""
+        self.load()
+        return self._airports_in_city(self._state, city)
+    
+    def _airports_in_city(self, state, city):
+        city = normalize(city)
+        codes = set(self._overlay_indexes(state)[1].get(city, ()))
+        if state.snapshot is not None:
+            codes.update(code for code in state.snapshot.codes_in_city(city) if code not in state.airports)
+        elif state.on_demand:
+            # Answered from the IATA table without materializing every airport
+            codes.update(self._load_iata_cities(state).get(city, ()))
+        return sorted(codes)
+    
+    @staticmethod
+    def _load_iata_cities(state):
+        """Build the city -> IATA codes map of the airportsdata IATA dataset (lazy mode)."""
+        if state.iata_cities is None:
+            if state.iata_data is None:
+                state.iata_data = airportsdata.load('IATA')
+            iata_cities = {}
+            for code, data in state.iata_data.items():
+                city = normalize(data.get('city'))
+                if city and len(code) == 3:
+                    iata_cities.setdefault(city, []).append(code.upper())
+            state.iata_cities = iata_cities
+        return state.iata_cities
+    
+    def _city_record(self, state, city):
+        """Return a record for a city whose airports all share one timezone, or None.
+        
+        A single-airport city gets that airport's record; otherwise the
+        record names the city and carries the shared timezone.
+        """
+        records = [info for info in (self._lookup(state, code) for code in self._airports_in_city(state, city)) if info]
+        zones = {info.get('tz', '') for info in records}
+        if len(zones) != 1 or not next(iter(zones)):
+            return None
+        if len(records) == 1:
+            return records[0]
+        countries = {info.get('country', '') for info in records}
+        return AirportRecord(name=f"{records[0].get('city', city)} (all airports)", city=records[0].get('city', city),
+                             country=countries.pop() if len(countries) == 1 else '', tz=zones.pop())
+    
+    def find_timezone(self, airport_code):
+        """Return the timezone of an IATA/ICAO code or city name, or '' if unknown (never prompts)."""
+        self.load()
+        return self._find_timezone(self._state, airport_code.upper())
+    
+    def _find_timezone(self, state, airport_code):
+        # Every step reads the same state, so a concurrent reload never mixes two versions
+        if state.snapshot is not None and airport_code not in state.airports:
+            tz = state.snapshot.get_timezone(airport_code)
+        else:
+            tz = ''
+        if not tz:
+            tz = (self._lookup(state, airport_code) or {}).get('tz', '')
+        if not tz:
+            # Maybe a city name (even a short one like Oslo): fine if all its airports share one timezone
+            tz = (self._city_record(state, airport_code) or {}).get('tz', '')
+        return tz
     
     def get_timezone(self, airport_code, ask_if_missing=True):
         """Get timezone for airport code."""
         airport_code = airport_code.upper()
+        self.load()
+        state = self._state
         
         # Check if we have this airport
-        if airport_code in self.airports:
-            tz = self.airports[airport_code].get('tz', '')
-            if tz:
-                return tz
+        tz = self._find_timezone(state, airport_code)
+        if tz:
+            if metrics.enabled:
+                metrics.incr('lookups_total', method='get_timezone', result='hit')
+            return tz
+        
+        if metrics.enabled:
+            metrics.incr('lookups_total', method='get_timezone',
+                         result='prompted' if ask_if_missing else 'fallback_utc')
         
         # Airport not found, ask user
         if ask_if_missing:
             print(f"\n⚠️  Airport '{airport_code}' not found in database.")
+            suggestions = self.search(airport_code, limit=3)
+            if suggestions:
+                print("Did you mean: " + ", ".join(f"{s['code']} ({s['city'] or s['name']})" for s in suggestions))
             print("Please enter the timezone for this airport.")
             print("Common examples: America/New_York, Asia/Tokyo, Europe/London")
             print("You can find timezone names at: https://en.wikipedia.org/wiki/List_of_tz_database_time_zones")
@@ -223,7 +770,7 @@ class AirportDatabase:
                     ZoneInfo(tz)
                     
                     # Save this airport to cache for future use
-                    self.airports[airport_code] = {
+                    info = state.airports[airport_code] = {
                         'tz': tz,
                         'name': f'Custom Airport ({airport_code})',
                         'city': 'Unknown',
@@ -231,7 +778,7 @@ class AirportDatabase:
                     }
                     
                     if self.use_cache:
-                        self.save_cache()
+                        self.save_custom_airport(airport_code, info)
                     
                     return tz
                 except Exception:
@@ -242,7 +789,12 @@ class AirportDatabase:
     def get_airport_info(self, airport_code):
         """Get complete airport information."""
         airport_code = airport_code.upper()
-        info = self.airports.get(airport_code, {})
+        self.load()
+        state = self._state
+        info = self._lookup(state, airport_code) or self._city_record(state, airport_code) or {}
+        
+        if metrics.enabled:
+            metrics.incr('lookups_total', method='get_airport_info', result='hit' if info else 'placeholder')
         
         # If airport not found, create minimal info
         if not info:
@@ -255,25 +807,61 @@ class AirportDatabase:
         
         return info
 
-def create_flight_ics(flight_data, airport_db):
-    """Create an .ics file from flight data."""
-    
-    # Generate a unique ID for the event
-    flight_id = flight_data['flight_number'].replace(" ", "-").replace("/", "-").lower()
-    date_str = flight_data['departure_time'].strftime("%Y%m%d")
-    uid = f"flight-{flight_id}-{date_str}@python-script"
+def escape_text(value):
+    """Escape a value for an iCalendar TEXT property (RFC 5545 section 3.3.11)."""
+    value = str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+    return value.replace('\r\n', '\n').replace('\r', '\n').replace('\n', '\\n')
+
+def flight_uid(flight_number, departure_time):
+    """Stable event UID for a flight: flight-<number>-<departure date>@python-script."""
+    flight_id = flight_number.replace(" ", "-").replace("/", "-").lower()
+    date_str = departure_time.strftime("%Y%m%d")
+    return f"flight-{flight_id}-{date_str}@python-script"
+
+def create_flight_ics(flight_data, airport_db, cache=None):
+    """Create an .ics file from flight data.
     
-    # Format times for .ics
+    With a render_cache.RenderCache, unchanged flights reuse a cached
+    event body and only get a fresh DTSTAMP.
+    """
+    start = time.perf_counter() if metrics.enabled else None
     dtstamp = datetime.now().strftime("%Y%m%dT%H%M%SZ")
-    dep_time = flight_data['departure_time'].strftime("%Y%m%dT%H%M%S")
-    arr_time = flight_data['arrival_time'].strftime("%Y%m%dT%H%M%S")
     
     # Get airport info
     dep_info = airport_db.get_airport_info(flight_data['departure_airport'])
     arr_info = airport_db.get_airport_info(flight_data['arrival_airport'])
     
-    # Calculate duration
-    duration = flight_data['arrival_time'] - flight_data['departure_time']
+    if cache is None:
+        ics_content = _render_event(flight_data, dep_info, arr_info, dtstamp)
+    else:
+        key = render_key(flight_data, dep_info, arr_info)
+        template = cache.get(key)
+        if template is None:
+            template = _render_event(flight_data, dep_info, arr_info, DTSTAMP_PLACEHOLDER)
+            cache.put(key, template)
+        ics_content = template.replace(DTSTAMP_PLACEHOLDER, dtstamp, 1)
+    
+    if start is not None:
+        metrics.observe('render_seconds', time.perf_counter() - start)
+        metrics.incr('events_rendered_total')
+    
+    return ics_content
+
+def _render_event(flight_data, dep_info, arr_info, dtstamp):
+    """Format one VEVENT block."""
+    # Generate a unique ID for the event
+    uid = flight_uid(flight_data['flight_number'], flight_data['departure_time'])
+    
+    # Format times for .ics
+    dep_time = flight_data['departure_time'].strftime("%Y%m%dT%H%M%S")
+    arr_time = flight_data['arrival_time'].strftime("%Y%m%dT%H%M%S")
+    
+    # Calculate duration (or use one precomputed by tz_batch.normalize_flights, in seconds)
+    duration = flight_data.get('duration')
+    if duration is None:
+        duration = flight_data['arrival_time'] - flight_data['departure_time']
+    elif not isinstance(duration, timedelta):
+        duration = timedelta(seconds=int(duration))
     hours = duration.days * 24 + duration.seconds // 3600
     minutes = (duration.seconds % 3600) // 60
     
@@ -294,22 +882,36 @@ Seat: {flight_data.get('seat', 'Not assigned')}
 Class: {flight_data.get('class', 'Not specified')}
 Baggage: {flight_data.get('baggage', 'Not specified')}"""
     
-    # Replace newlines with \\n for .ics format
-    description = description.replace('\n', '\\n')
+    # Escape commas, semicolons, backslashes and newlines for .ics format
+    description = escape_text(description)
+    summary = escape_text(f"✈️ {flight_data['flight_number']} {flight_data['departure_airport']} → "
+                          f"{flight_data['arrival_airport']}")
+    location = escape_text(f"{dep_info.get('name', flight_data['departure_airport'])} → "
+                           f"{arr_info.get('name', flight_data['arrival_airport'])}")
     
     # Build .ics content
     ics_content = f"""BEGIN:VEVENT
 UID:{uid}
 DTSTAMP:{dtstamp}
-SUMMARY:✈️ {flight_data['flight_number']} {flight_data['departure_airport']} → {flight_data['arrival_airport']}
+SUMMARY:{summary}
 DTSTART;TZID={flight_data['departure_timezone']}:{dep_time}
 DTEND;TZID={flight_data['arrival_timezone']}:{arr_time}
-LOCATION:{dep_info.get('name', flight_data['departure_airport'])} → {arr_info.get('name', flight_data['arrival_airport'])}
+LOCATION:{location}
 DESCRIPTION:{description}
 END:VEVENT"""
     
     return ics_content
 
+def write_calendar(flights, airport_db, out, cache=None):
+    """Stream a calendar for an iterable of flights to a file object or socket.
+    
+    Returns the number of events written.
+    """
+    with ICSWriter(out) as writer:
+        for flight_data in flights:
+            writer.write_event(create_flight_ics(flight_data, airport_db, cache))
+    return writer.count
+
 def main():
     """Main function to create flight calendar events."""
     
@@ -381,7 +983,10 @@ def main():
         except ValueError:
             print("❌ Invalid date/time format. Please use YYYY-MM-DD HH:MM")
             continue
-        
+        if arrival_dt <= departure_dt:
+            print("❌ Arrival must be after departure (compared in UTC)")
+            continue
+
         # Get optional details
         print("\n📝 ADDITIONAL DETAILS (optional)")
         seat = input("Seat assignment: ").strip() or "Not assigned"
@@ -416,26 +1021,12 @@ def main():
         print("\n❌ No flights entered. Exiting.")
         return
     
-    # Create .ics content
-    ics_content = """BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Flight Calendar Generator//EN
-CALSCALE:GREGORIAN
-METHOD:PUBLISH
-"""
-    
-    for flight_data in flights:
-        event_content = create_flight_ics(flight_data, airport_db)
-        ics_content += event_content + "\n"
-    
-    ics_content += "END:VCALENDAR"
-    
     # Save to file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"flights_{timestamp}.ics"
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(ics_content)
+    with open(filename, 'wb') as f:
+        write_calendar(flights, airport_db, f)
     
     # Print summary
     print("\n" + "=" * 60)
@@ -0,0 +1,172 @@
+"""Memoization of rendered VEVENT bodies for repeat runs.
+
+Events are keyed by a hash of every flight_data field create_flight_ics
+reads plus the airport names it looks up, and stored with a DTSTAMP
+placeholder that is filled in when the event is written. An in-memory LRU
+bounded by entry count and total size sits in front of an optional SQLite
+file whose most recently used renders are preloaded on open, so a nightly
+run over mostly unchanged flights is mostly in-memory hits. The file
+records when each render was last used and is trimmed least recently
+used first.
+"""
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+
+from instrumentation import metrics
+
+# Bump when the event template changes so stored renders are discarded
+CACHE_VERSION = 3
+
+DTSTAMP_PLACEHOLDER = "\x00DTSTAMP\x00"
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_ENTRIES = 2_000_000
+# Disk writes are batched into one transaction per this many renders
+FLUSH_EVERY = 1000
+
+# flight_data fields hashed as plain strings; the two datetimes are added separately
+KEY_FIELDS = (
+    'flight_number', 'passenger_name',
+    'departure_airport', 'departure_timezone',
+    'arrival_airport', 'arrival_timezone',
+    'duration', 'seat', 'class', 'baggage',
+)
+
+
+def _wall_clock(value):
+    # Wall-clock fields plus the zone; str() would also compute the UTC offset
+    return (f"{value.year}-{value.month}-{value.day}T{value.hour}:{value.minute}:"
+            f"{value.second}.{value.microsecond}[{value.tzinfo}]")
+
+
+def render_key(flight_data, departure_info, arrival_info):
+    """Stable 16-byte key over the inputs of one rendered event."""
+    parts = list(map(str, map(flight_data.get, KEY_FIELDS)))
+    parts.append(_wall_clock(flight_data['departure_time']))
+    parts.append(_wall_clock(flight_data['arrival_time']))
+    parts.append(str(departure_info.get('name', '')))
+    parts.append(str(arrival_info.get('name', '')))
+    return hashlib.blake2b("\x1f".join(parts).encode('utf-8'), digest_size=16).digest()
+
+
+class RenderCache:
+    """LRU cache of VEVENT templates, optionally backed by a SQLite file."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, path=None,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES, preload=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.path = path
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._used = set()
+        self._db = None
+        if path:
+            self._open(path, preload)
+
+    def _open(self, path, preload):
+        # A generous timeout lets worker processes share one file
+        self._db = sqlite3.connect(str(path), timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None or row[0] != str(CACHE_VERSION):
+            self._db.execute("DROP TABLE IF EXISTS renders")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+        # `used` is when the render was last written or read (ns since the epoch)
+        self._db.execute("CREATE TABLE IF NOT EXISTS renders (key BLOB PRIMARY KEY, body TEXT, used INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS renders_used ON renders (used)")
+        self._db.commit()
+
+        if preload:
+            # One sequential read beats a point query per event; oldest first keeps LRU order
+            rows = self._db.execute("SELECT key, body FROM renders ORDER BY used DESC LIMIT ?",
+                                    (self.max_entries,)).fetchall()
+            for key, body in reversed(rows):
+                self._remember(key, body)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, key):
+        """Return the cached template for a key, or None."""
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        elif self._db is not None:
+            body = self._pending.get(key)
+            if body is None:
+                row = self._db.execute("SELECT body FROM renders WHERE key = ?", (key,)).fetchone()
+                body = row[0] if row else None
+            if body is not None:
+                self._remember(key, body)
+        if body is None:
+            self.misses += 1
+            metrics.incr('render_cache_total', result='miss')
+        else:
+            if self._db is not None:
+                self._used.add(key)
+            self.hits += 1
+            metrics.incr('render_cache_total', result='hit')
+        return body
+
+    def put(self, key, body):
+        """Store a template; disk writes are batched until flush()."""
+        self._remember(key, body)
+        if self._db is not None:
+            self._pending[key] = body
+            if len(self._pending) >= FLUSH_EVERY:
+                self.flush()
+
+    def _remember(self, key, body):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def flush(self):
+        """Write pending renders and the use times of hits to the disk store."""
+        if self._db is None or not (self._pending or self._used):
+            return
+        used = time.time_ns()
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO renders VALUES (?, ?, ?)",
+                                 ((key, body, used) for key, body in self._pending.items()))
+            self._db.executemany("UPDATE renders SET used = ? WHERE key = ?",
+                                 ((used, key) for key in self._used if key not in self._pending))
+        self._pending.clear()
+        self._used.clear()
+
+    def trim(self):
+        """Evict the least recently used renders beyond max_disk_entries from the disk store."""
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute("DELETE FROM renders WHERE key IN "
+                             "(SELECT key FROM renders ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                             (self.max_disk_entries,))
+
+    def close(self):
+        """Flush, trim the disk store to its bound and close it."""
+        if self._db is None:
+            return
+        self.flush()
+        self.trim()
+        self._db.close()
+        self._db = None
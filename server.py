@@ -0,0 +1,239 @@
+"""Long-running local ICS generation service.
+
+Keeps one warm AirportDatabase in memory and turns flight JSON posted over
+HTTP into a calendar, so callers pay no process startup or airport loading
+per request. Stdlib only: a minimal HTTP/1.1 server on asyncio streams with
+keep-alive, bounded concurrency and chunked (streamed) responses. Request
+bodies must come with a Content-Length; chunked uploads are refused with
+411 Length Required. Events are rendered in batches on a thread pool so a
+large calendar does not hold up other requests; a failure in the first
+batch is answered with 500, a later one aborts the stream (the client sees
+no final chunk).
+
+    POST /ics      body: one flight object, a list of them, or {"flights": [...]}
+    GET  /health   liveness check
+    GET  /metrics  Prometheus metrics (when started with --metrics)
+"""
+import argparse
+import asyncio
+import json
+from http import HTTPStatus
+
+from batch import parse_flight
+from ics_writer import ICSWriter
+from instrumentation import enable as enable_metrics, metrics
+from main import AirportDatabase, create_flight_ics
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADER_LINES = 100
+# Events rendered per executor job; the first batch is rendered before the 200 is sent
+RENDER_BATCH = 256
+DEFAULT_MAX_CONCURRENCY = 64
+
+
+class _ChunkedStream:
+    """File-like adapter that writes HTTP/1.1 chunks to an asyncio StreamWriter."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+def _parse_body(body, airport_db):
+    """Parse a /ics request body into flight_data dicts (runs in an executor thread)."""
+    payload = json.loads(body)
+    if isinstance(payload, dict) and 'flights' in payload:
+        payload = payload['flights']
+    records = payload if isinstance(payload, list) else [payload]
+    return [parse_flight(record, airport_db) for record in records]
+
+
+def _render_events(flights, airport_db):
+    """Render a batch of parsed flights (runs in an executor thread)."""
+    return [create_flight_ics(flight_data, airport_db) for flight_data in flights]
+
+
+class ICSServer:
+    """HTTP front end around a single warm airport database."""
+
+    def __init__(self, airport_db, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.airport_db = airport_db
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or opts out of keep-alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': 'malformed request line'}, False)
+                    break
+
+                headers = {}
+                for _ in range(MAX_HEADER_LINES + 1):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                else:
+                    await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                     {'error': 'too many header lines'}, False)
+                    break
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if headers.get('transfer-encoding', 'identity').lower() != 'identity':
+                    await self._send(writer, HTTPStatus.LENGTH_REQUIRED,
+                                     {'error': 'chunked request bodies are not supported, send Content-Length'}, False)
+                    break
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': 'invalid Content-Length'}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                async with self.semaphore:
+                    await self.dispatch(method, target.split('?', 1)[0], body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, method, path, body, writer, keep_alive):
+        if path == '/health' and method == 'GET':
+            await self._send(writer, HTTPStatus.OK, {'status': 'ok'}, keep_alive)
+        elif path == '/metrics' and method == 'GET' and metrics.enabled:
+            data = metrics.to_prometheus().encode('utf-8')
+            writer.write(self._head(HTTPStatus.OK, 'text/plain; version=0.0.4', keep_alive,
+                                    f"Content-Length: {len(data)}\r\n") + data)
+            await writer.drain()
+        elif path == '/ics' and method == 'POST':
+            await self.handle_ics(body, writer, keep_alive)
+        elif path in ('/health', '/ics'):
+            await self._send(writer, HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'method not allowed'}, keep_alive)
+        else:
+            await self._send(writer, HTTPStatus.NOT_FOUND, {'error': 'not found'}, keep_alive)
+
+    async def handle_ics(self, body, writer, keep_alive):
+        """Validate every flight up front, then stream the calendar as it renders.
+
+        Parsing and rendering run in the default executor, the latter one
+        batch at a time. If a batch after the first fails, the response is
+        already committed, so the connection is closed without the
+        terminating chunk.
+        """
+        # One data version for the whole response, even if a reload lands mid-stream
+        airport_db = self.airport_db.pinned()
+        loop = asyncio.get_running_loop()
+        try:
+            flights = await loop.run_in_executor(None, _parse_body, body, airport_db)
+        except Exception as e:
+            await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': str(e)}, keep_alive)
+            return
+
+        batches = [flights[i:i + RENDER_BATCH] for i in range(0, len(flights), RENDER_BATCH)] or [[]]
+        try:
+            events = await loop.run_in_executor(None, _render_events, batches[0], airport_db)
+        except Exception as e:
+            metrics.incr('server_render_errors_total')
+            await self._send(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"could not render: {e}"},
+                             keep_alive)
+            return
+
+        writer.write(self._head(HTTPStatus.OK, 'text/calendar; charset=utf-8', keep_alive,
+                                'Transfer-Encoding: chunked\r\n'
+                                'Content-Disposition: attachment; filename="flights.ics"\r\n'))
+        try:
+            with ICSWriter(_ChunkedStream(writer), buffer_size=16 * 1024) as ics:
+                for batch in batches[1:]:
+                    pending = loop.run_in_executor(None, _render_events, batch, airport_db)
+                    for event_content in events:
+                        ics.write_event(event_content)
+                    await writer.drain()
+                    events = await pending
+                for event_content in events:
+                    ics.write_event(event_content)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            metrics.incr('server_render_errors_total')
+            print(f"⚠️  Aborted calendar response: {e}")
+            raise ConnectionAbortedError(str(e)) from e
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _head(status, content_type, keep_alive, extra=''):
+        return (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"{extra}\r\n").encode('latin-1')
+
+    async def _send(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(self._head(status, 'application/json', keep_alive, f"Content-Length: {len(data)}\r\n") + data)
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8765, max_concurrency=DEFAULT_MAX_CONCURRENCY, use_cache=True,
+                reload_interval=None):
+    """Warm the airport database and serve until cancelled.
+
+    With reload_interval (seconds), changed airport data is reloaded in the
+    background and swapped in without interrupting requests.
+    """
+    airport_db = AirportDatabase(use_cache=use_cache)
+    airport_db.warm_up()
+    if reload_interval:
+        airport_db.start_auto_reload(reload_interval)
+    app = ICSServer(airport_db, max_concurrency=max_concurrency)
+
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"✓ Serving flight calendars on http://{host}:{port}/ics")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """Command-line entry point for the ICS service."""
+    parser = argparse.ArgumentParser(description="Serve .ics calendars for flight JSON over local HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="requests rendered at the same time; others wait")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the airport cache")
+    parser.add_argument('--metrics', action='store_true', help="collect metrics and expose them on GET /metrics")
+    parser.add_argument('--reload-interval', type=float, metavar='SECONDS',
+                        help="check the airport data files this often and hot-reload them when they change")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable_metrics()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrency, use_cache=not args.no_cache,
+                          reload_interval=args.reload_interval))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import AirportDatabase  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def airport_db():
+    """An airport database that never reads or writes the cache files."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return AirportDatabase(use_cache=False)
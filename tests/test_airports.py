@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.mark.parametrize('city, timezone', [
+    ('Oslo', 'Europe/Oslo'), ('Riga', 'Europe/Riga'), ('Doha', 'Asia/Qatar'), ('Osaka', 'Asia/Tokyo'),
+])
+def test_city_names_resolve_whatever_their_length(airport_db, city, timezone):
+    assert airport_db.get_timezone(city, ask_if_missing=False) == timezone
+
+
+def test_city_spanning_timezones_is_not_guessed(airport_db):
+    # Rome, Italy and Rome, Georgia share the name
+    assert airport_db.find_timezone('Rome') == ''
+
+
+def test_icao_codes(airport_db):
+    assert airport_db.find_timezone('RJBB') == 'Asia/Tokyo'
+    pytest.importorskip('numpy')
+    assert airport_db.distance_km('SYD', 'EGLL') == pytest.approx(airport_db.distance_km('SYD', 'LHR'))
+
+
+def test_impossible_flights_with_icao_codes(airport_db):
+    pytest.importorskip('numpy')
+    flags = airport_db.get_geo_index().impossible_flights(['YSSY', 'SYD'], ['EGLL', 'LHR'], [1800, 22 * 3600])
+    assert flags.tolist() == [True, False]
+
+
+def test_city_info_matches_timezone_lookup(airport_db):
+    info = airport_db.get_airport_info('OSAKA')
+    assert info['tz'] == 'Asia/Tokyo' and info['city'] == 'Osaka'
+
+
+def test_lazy_lookup_of_unknown_code_stays_on_demand(capsys):
+    from main import AirportDatabase
+    db = AirportDatabase(use_cache=False, lazy=True)
+    assert db.get_timezone('QQQ', ask_if_missing=False) == 'UTC'
+    assert db.get_timezone('Osaka', ask_if_missing=False) == 'Asia/Tokyo'
+    assert not db._state.warmed and len(db.airports) < 10
+    assert 'airports' not in capsys.readouterr().out
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from batch import parse_flight
+from main import create_flight_ics, escape_text
+
+RECORD = {
+    'flight_number': 'NH176', 'passenger_name': 'Jane Doe',
+    'departure_airport': 'KIX', 'departure_time': '2026-03-01 10:00',
+    'arrival_airport': 'HNL', 'arrival_time': '2026-02-28 22:30',
+}
+
+
+def _event_lines(event):
+    return [line for line in event.splitlines() if line]
+
+
+def test_parse_flight(airport_db):
+    flight = parse_flight(json.dumps(RECORD), airport_db)
+    assert flight['departure_timezone'] == 'Asia/Tokyo'
+    assert flight['arrival_timezone'] == 'Pacific/Honolulu'
+    assert flight['seat'] == 'Not assigned'
+
+
+@pytest.mark.parametrize('field', ['flight_number', 'passenger_name', 'departure_airport', 'seat'])
+def test_newline_in_field_is_rejected(airport_db, field):
+    record = dict(RECORD, **{field: 'NH1\nEND:VEVENT\nBEGIN:VEVENT\nUID:evil'})
+    with pytest.raises(ValueError, match='control characters'):
+        parse_flight(record, airport_db)
+
+
+def test_newline_cannot_add_calendar_lines(airport_db):
+    clean = create_flight_ics(parse_flight(RECORD, airport_db), airport_db)
+    flight = parse_flight(RECORD, airport_db)
+    flight['passenger_name'] = 'Jane\nEND:VEVENT\nBEGIN:VEVENT'
+    flight['seat'] = '1A\r\nUID:evil'
+    event = create_flight_ics(flight, airport_db)
+    assert len(_event_lines(event)) == len(_event_lines(clean))
+    assert [line for line in _event_lines(event) if line.startswith(('BEGIN:', 'END:', 'UID:'))] == [
+        'BEGIN:VEVENT', 'UID:flight-nh176-20260301@python-script', 'END:VEVENT']
+
+
+def test_escape_text():
+    assert escape_text('a,b;c\\d\ne') == r'a\,b\;c\\d\ne'
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import threading
+
+import pytest
+
+import main
+from airport_cache import JOURNAL_COMPACT_THRESHOLD, AirportJournal, file_lock
+from main import AirportDatabase
+
+
+def _open_db(**kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return AirportDatabase(**kwargs)
+
+
+def _custom(n):
+    return {'tz': 'Asia/Tokyo', 'name': f'Custom Airport (Q{n:02d})', 'city': 'Unknown', 'country': 'Unknown'}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """A working directory with a freshly built cache and snapshot."""
+    monkeypatch.chdir(tmp_path)
+    _open_db()
+    return tmp_path
+
+
+def test_journal_is_replayed_on_startup(cache_dir):
+    db = _open_db()
+    db.save_custom_airport('QAA', _custom(0))
+    assert AirportJournal(db.journal.path).read() == {'QAA': _custom(0)}
+    assert _open_db().find_timezone('QAA') == 'Asia/Tokyo'
+
+
+def test_torn_journal_line_is_ignored(cache_dir):
+    db = _open_db()
+    db.save_custom_airport('QAA', _custom(0))
+    with open(db.journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"code": "QAB", "info": {"tz"')
+    assert set(db.journal.read()) == {'QAA'}
+    assert _open_db().find_timezone('QAA') == 'Asia/Tokyo'
+
+
+def test_journal_is_compacted_at_the_threshold(cache_dir):
+    db = _open_db()
+    for n in range(JOURNAL_COMPACT_THRESHOLD - 1):
+        db.save_custom_airport(f'Q{n:02d}', _custom(n))
+    assert len(db.journal.read()) == JOURNAL_COMPACT_THRESHOLD - 1
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.save_custom_airport('QZZ', _custom(99))
+    assert db.journal.read() == {}
+    cached = json.loads(db.cache_file.read_text(encoding='utf-8'))
+    assert cached['QZZ']['tz'] == 'Asia/Tokyo' and 'Q00' in cached
+    fresh = _open_db()
+    assert fresh.snapshot is not None and 'QZZ' in fresh.snapshot
+
+
+def test_crash_between_cache_and_snapshot_write_is_recovered(cache_dir, monkeypatch):
+    db = _open_db()
+    db.save_custom_airport('QAA', _custom(0))
+
+    def crash(*args, **kwargs):
+        raise OSError('simulated crash')
+
+    # The JSON cache is rewritten, then the process dies before the snapshot and the journal reset
+    with monkeypatch.context() as patch:
+        patch.setattr(main, 'write_snapshot', crash)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.save_cache()
+    assert 'QAA' in db.journal.read()
+
+    # The cache is now newer than the snapshot: the next start rebuilds from the cache and journal
+    fresh = _open_db()
+    assert fresh.find_timezone('QAA') == 'Asia/Tokyo'
+    assert fresh.journal.read() == {}
+    assert 'QAA' in _open_db().snapshot
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_path = tmp_path / 'cache.lock'
+    acquired = threading.Event()
+
+    def contend():
+        with file_lock(lock_path):
+            acquired.set()
+
+    with file_lock(lock_path):
+        thread = threading.Thread(target=contend)
+        thread.start()
+        assert not acquired.wait(0.2)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+@pytest.mark.parametrize('code', ['ÖSA', 'NEW YORK', 'Q' * 9])
+def test_codes_the_snapshot_cannot_store_are_not_saved(cache_dir, code):
+    db = _open_db()
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        db.save_custom_airport(code, _custom(0))
+    assert 'not an ASCII airport code' in out.getvalue()
+    assert db.journal.read() == {}
+
+
+def test_journal_entries_with_unstorable_codes_are_skipped(cache_dir):
+    db = _open_db()
+    with open(db.journal.path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'code': 'ÖSA', 'info': _custom(0)}) + '\n')
+    db.save_custom_airport('QAA', _custom(1))
+    assert set(db.journal.read()) == {'QAA'}
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        db.save_cache()
+    assert 'Could not' not in out.getvalue()
+    assert 'QAA' in _open_db().snapshot
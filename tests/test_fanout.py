@@ -0,0 +1,74 @@
+import json
+
+from batch import run_fanout
+from fanout import MANIFEST_NAME, group_records, read_manifest
+from ics_update import without_dtstamp
+
+PASSENGERS = [f'Passenger {n:03d}' for n in range(60)]
+
+
+def _records(passengers):
+    # Several flights per passenger, interleaved so every sorted run mixes groups
+    return [{'flight_number': f'NH{n}', 'passenger_name': passenger,
+             'departure_airport': 'KIX', 'departure_time': f'2026-03-{n:02d} 10:00',
+             'arrival_airport': 'HNL', 'arrival_time': f'2026-03-{n - 1:02d} 22:30'}
+            for n in range(2, 5) for passenger in passengers]
+
+
+def _write(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    return path
+
+
+def _fanout(tmp_path, bookings, out_dir, **kwargs):
+    return run_fanout(bookings, out_dir, tmp_path / 'rejects.jsonl', workers=1, use_cache=False, **kwargs)
+
+
+def _layout(out_dir):
+    """Every calendar (without DTSTAMP) by relative path, plus the manifest minus checksums."""
+    files = {str(path.relative_to(out_dir)): without_dtstamp(path.read_bytes())
+             for path in out_dir.rglob('*.ics')}
+    manifest = [{k: v for k, v in entry.items() if k != 'sha256'} for entry in read_manifest(out_dir / MANIFEST_NAME)]
+    return files, manifest
+
+
+def test_group_records_spilled_and_in_memory_agree():
+    records = list(enumerate(json.dumps(record) for record in _records(PASSENGERS)))
+    in_memory = list(group_records(records))
+    assert list(group_records(records, run_size=37)) == in_memory
+    assert [key for key, _ in in_memory] == sorted(PASSENGERS)
+
+
+def test_spilled_run_gives_the_same_layout(tmp_path):
+    bookings = _write(tmp_path / 'bookings.jsonl', _records(PASSENGERS))
+    _fanout(tmp_path, bookings, tmp_path / 'memory')
+    _fanout(tmp_path, bookings, tmp_path / 'spilled', run_size=37)
+    files, manifest = _layout(tmp_path / 'memory')
+    assert len(files) == len(PASSENGERS) and len(manifest) == len(PASSENGERS)
+    assert _layout(tmp_path / 'spilled') == (files, manifest)
+
+
+def test_rerun_leaves_unchanged_calendars_alone(tmp_path):
+    bookings = _write(tmp_path / 'bookings.jsonl', _records(PASSENGERS))
+    out_dir = tmp_path / 'calendars'
+    _fanout(tmp_path, bookings, out_dir)
+    mtimes = {path: path.stat().st_mtime_ns for path in out_dir.rglob('*.ics')}
+
+    records = _records(PASSENGERS)
+    records[0]['seat'] = '12A'
+    stats = _fanout(tmp_path, _write(bookings, records), out_dir)
+
+    assert (stats['written'], stats['unchanged']) == (1, len(PASSENGERS) - 1)
+    changed = [path for path, mtime in mtimes.items() if path.stat().st_mtime_ns != mtime]
+    assert len(changed) == 1 and b'12A' in changed[0].read_bytes()
+
+
+def test_prune_removes_calendars_of_dropped_keys(tmp_path):
+    out_dir = tmp_path / 'calendars'
+    _fanout(tmp_path, _write(tmp_path / 'bookings.jsonl', _records(PASSENGERS)), out_dir)
+    kept = PASSENGERS[::2]
+    stats = _fanout(tmp_path, _write(tmp_path / 'bookings.jsonl', _records(kept)), out_dir, prune=True)
+
+    assert stats['removed'] == len(PASSENGERS) - len(kept)
+    assert len(list(out_dir.rglob('*.ics'))) == len(kept)
+    assert [entry['key'] for entry in read_manifest(out_dir / MANIFEST_NAME)] == kept
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from batch import parse_flight
+from ics_update import INDEX_SUFFIX, CalendarIndex, update_calendar
+from ics_writer import ICSWriter
+from main import create_flight_ics, flight_uid
+
+FLIGHTS = [
+    {'flight_number': f'NH{n}', 'passenger_name': 'Jane Doe',
+     'departure_airport': 'KIX', 'departure_time': f'2026-03-{n:02d} 10:00',
+     'arrival_airport': 'HNL', 'arrival_time': f'2026-03-{n - 1:02d} 22:30'}
+    for n in range(2, 6)
+]
+
+
+def _event(airport_db, record):
+    return create_flight_ics(parse_flight(record, airport_db), airport_db)
+
+
+def _uid(airport_db, record):
+    flight_data = parse_flight(record, airport_db)
+    return flight_uid(flight_data['flight_number'], flight_data['departure_time'])
+
+
+@pytest.fixture
+def calendar(tmp_path, airport_db):
+    path = tmp_path / 'flights.ics'
+    with open(path, 'wb') as out, ICSWriter(out) as writer:
+        for record in FLIGHTS:
+            writer.write_event(_event(airport_db, record))
+    return path
+
+
+def _events(path):
+    data = path.read_bytes()
+    return {uid: data[start:end] for uid, (start, end) in CalendarIndex.scan(path).events.items()}
+
+
+def _assert_saved_index_matches_scan(path):
+    saved = json.loads(path.with_name(path.name + INDEX_SUFFIX).read_text())
+    scanned = CalendarIndex.scan(path)
+    assert {uid: tuple(span) for uid, span in saved['events'].items()} == scanned.events
+    assert saved['footer'] == scanned.footer
+
+
+def test_add_change_cancel_and_unchanged(calendar, airport_db):
+    added = dict(FLIGHTS[0], flight_number='NH99')
+    changed = dict(FLIGHTS[1], seat='12A')
+    events = [_event(airport_db, record) for record in (added, changed, FLIGHTS[2])]
+    cancelled = [_uid(airport_db, FLIGHTS[3])]
+
+    stats = update_calendar(calendar, events, cancelled)
+
+    assert stats == {'added': 1, 'changed': 1, 'unchanged': 1, 'cancelled': 1, 'missing': 0}
+    result = _events(calendar)
+    assert len(result) == 5
+    assert b'12A' in result[_uid(airport_db, changed)]
+    assert b'STATUS:CANCELLED' in result[_uid(airport_db, FLIGHTS[3])]
+    assert result[_uid(airport_db, FLIGHTS[0])].count(b'STATUS:CANCELLED') == 0
+    assert calendar.read_bytes().rstrip().endswith(b'END:VCALENDAR')
+    _assert_saved_index_matches_scan(calendar)
+
+
+def test_change_and_cancel_of_one_event_keeps_the_change(calendar, airport_db):
+    changed = dict(FLIGHTS[1], seat='12A')
+    uid = _uid(airport_db, changed)
+
+    stats = update_calendar(calendar, [_event(airport_db, changed)], [uid])
+
+    assert (stats['changed'], stats['cancelled']) == (0, 1)
+    event = _events(calendar)[uid]
+    assert b'12A' in event and b'STATUS:CANCELLED' in event
+    _assert_saved_index_matches_scan(calendar)
+
+
+def test_unchanged_update_leaves_the_file_alone(calendar, airport_db):
+    before = calendar.read_bytes()
+    stats = update_calendar(calendar, [_event(airport_db, record) for record in FLIGHTS])
+    assert stats['unchanged'] == len(FLIGHTS)
+    assert calendar.read_bytes() == before
+
+
+def test_repeated_updates_reuse_the_saved_index(calendar, airport_db):
+    update_calendar(calendar, [_event(airport_db, dict(FLIGHTS[0], seat='1K'))])
+    update_calendar(calendar, [], [_uid(airport_db, FLIGHTS[2])], drop_cancelled=True)
+    assert len(_events(calendar)) == len(FLIGHTS) - 1
+    _assert_saved_index_matches_scan(calendar)
@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from batch import parse_flight
+from ics_writer import CRLF, MAX_LINE_OCTETS, ICSWriter, encode_event, fold_line
+from main import create_flight_ics
+
+
+def _unfold(data):
+    return data.replace(CRLF + b' ', b'')
+
+
+def test_line_of_exactly_75_octets_is_not_folded():
+    line = 'SUMMARY:' + 'x' * (MAX_LINE_OCTETS - len('SUMMARY:'))
+    assert fold_line(line) == line.encode('ascii')
+    assert CRLF in fold_line(line + 'x')
+
+
+@pytest.mark.parametrize('char', ['é', '東', '✈️', '🛫'])
+def test_multibyte_character_at_the_fold_is_not_split(char):
+    for offset in range(4):
+        line = 'DESCRIPTION:' + 'x' * (MAX_LINE_OCTETS - len('DESCRIPTION:') - offset) + char * 40
+        folded = fold_line(line)
+        physical = folded.split(CRLF)
+        assert all(len(part) <= MAX_LINE_OCTETS for part in physical)
+        for part in physical:
+            part.decode('utf-8')
+        assert _unfold(folded).decode('utf-8') == line
+
+
+def test_buffered_and_streamed_output_match(airport_db):
+    records = [{'flight_number': f'JL{n}', 'passenger_name': 'Ōtani Shōhei ' * 6,
+                'departure_airport': 'HND', 'departure_time': f'2026-04-{n:02d} 08:15',
+                'arrival_airport': 'CTS', 'arrival_time': f'2026-04-{n:02d} 09:50'} for n in range(1, 21)]
+    events = [create_flight_ics(parse_flight(record, airport_db), airport_db) for record in records]
+    outputs = []
+    for buffer_size in (1, 200, 1 << 20):
+        out = io.BytesIO()
+        with ICSWriter(out, buffer_size=buffer_size) as writer:
+            for event in events:
+                writer.write_event(event)
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert all(encode_event(event) in outputs[0] for event in events)
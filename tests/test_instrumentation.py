@@ -0,0 +1,65 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from instrumentation import BUCKETS, Metrics
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_prometheus_exposition_format():
+    metrics = Metrics(enabled=True)
+    metrics.incr('lookups_total', result='hit')
+    metrics.incr('lookups_total', 2, result='miss')
+    metrics.observe('render_seconds', 0.0002)
+    metrics.observe('render_seconds', 2.0)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert lines[:3] == [
+        '# TYPE air2cal_lookups_total counter',
+        'air2cal_lookups_total{result="hit"} 1',
+        'air2cal_lookups_total{result="miss"} 2',
+    ]
+    assert lines[3] == '# TYPE air2cal_render_seconds histogram'
+    buckets = lines[4:4 + len(BUCKETS) + 1]
+    assert buckets[0] == 'air2cal_render_seconds_bucket{le="1e-05"} 0'
+    assert 'air2cal_render_seconds_bucket{le="0.0005"} 1' in buckets
+    assert buckets[-1] == 'air2cal_render_seconds_bucket{le="+Inf"} 2'
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert lines[-2:] == ['air2cal_render_seconds_sum 2.0002', 'air2cal_render_seconds_count 2']
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics(enabled=True)
+    metrics.incr('errors_total', error='bad "code"\\\nnext line')
+    assert metrics.to_prometheus().splitlines()[1] == \
+        'air2cal_errors_total{error="bad \\"code\\"\\\\\\nnext line"} 1'
+
+
+def test_metrics_file_is_written_by_the_main_process_only(tmp_path):
+    script = textwrap.dedent('''
+        import multiprocessing
+        import os
+        from instrumentation import metrics
+
+        def work():
+            metrics.incr('child_total')
+
+        if __name__ == '__main__':
+            metrics.incr('parent_total')
+            process = multiprocessing.get_context('spawn').Process(target=work)
+            process.start()
+            process.join()
+            # The child exited first and must not have written the file
+            assert not os.path.exists(os.environ['AIR2CAL_METRICS_FILE'])
+    ''')
+    (tmp_path / 'job.py').write_text(script)
+    out = tmp_path / 'metrics.json'
+    env = {'PYTHONPATH': str(REPO_ROOT), 'AIR2CAL_METRICS_FILE': str(out), 'PATH': ''}
+    subprocess.run([sys.executable, 'job.py'], cwd=tmp_path, env=env, check=True, timeout=60)
+    names = [counter['name'] for counter in json.loads(out.read_text())['counters']]
+    assert names == ['parent_total']
@@ -0,0 +1,41 @@
+import contextlib
+import io
+import json
+import os
+
+from airport_reload import AirportReloader
+from main import AirportDatabase
+
+
+def test_reload_does_not_retrigger_on_its_own_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = AirportDatabase(use_cache=True)
+        reloader = AirportReloader(db, interval=3600)
+
+        cache = json.loads(db.cache_file.read_text(encoding='utf-8'))
+        cache['ZZQ'] = {'tz': 'Asia/Tokyo', 'name': 'Test Airport', 'city': 'Test', 'country': 'JP'}
+        db.cache_file.write_text(json.dumps(cache), encoding='utf-8')
+        stat = db.snapshot_file.stat()
+        # Make the edit strictly newer than the snapshot, as a later hand edit would be
+        os.utime(db.cache_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        assert reloader.check()
+        assert db.version == 1
+        assert db.get_timezone('ZZQ', ask_if_missing=False) == 'Asia/Tokyo'
+        assert not reloader.check()
+        assert db.version == 1
+
+
+def test_reload_keeps_the_loading_mode():
+    with contextlib.redirect_stdout(io.StringIO()):
+        eager = AirportDatabase(use_cache=False)
+        lazy = AirportDatabase(use_cache=False, lazy=True)
+        assert lazy.get_timezone('KIX', ask_if_missing=False) == 'Asia/Tokyo'
+        eager.reload()
+        lazy.reload()
+
+    assert not eager._state.on_demand and len(eager.airports) > 1000
+    assert lazy._state.on_demand and len(lazy.airports) == 0
+    assert lazy.get_timezone('KIX', ask_if_missing=False) == 'Asia/Tokyo'
+    assert len(lazy.airports) == 1
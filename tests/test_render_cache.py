@@ -0,0 +1,44 @@
+import json
+import re
+
+from batch import run_batch
+from render_cache import RenderCache
+
+
+def test_renders_are_reused_across_runs(tmp_path):
+    path = tmp_path / 'renders.sqlite'
+    with RenderCache(path=path) as cache:
+        cache.put(b'a', 'event a')
+    with RenderCache(path=path, preload=False) as cache:
+        assert cache.get(b'a') == 'event a'
+        assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    path = tmp_path / 'renders.sqlite'
+    with RenderCache(path=path) as cache:
+        cache.put(b'a', 'event a')
+        cache.put(b'b', 'event b')
+    with RenderCache(path=path, max_disk_entries=2) as cache:
+        assert cache.get(b'a') == 'event a'
+        cache.put(b'c', 'event c')
+    with RenderCache(path=path, preload=False) as cache:
+        assert cache.get(b'b') is None
+        assert cache.get(b'a') == 'event a' and cache.get(b'c') == 'event c'
+
+
+def test_batch_output_is_unchanged_by_the_cache(tmp_path, capsys):
+    records = [{'flight_number': f'NH{n}', 'passenger_name': 'Jane Doe',
+                'departure_airport': 'KIX', 'departure_time': f'2026-03-{n:02d} 10:00',
+                'arrival_airport': 'HNL', 'arrival_time': f'2026-03-{n - 1:02d} 22:30'} for n in range(2, 12)]
+    bookings = tmp_path / 'bookings.jsonl'
+    bookings.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    outputs = []
+    for run in range(2):
+        output = tmp_path / f'run{run}.ics'
+        assert run_batch(bookings, output, tmp_path / 'rejects.jsonl', workers=1, use_cache=False,
+                         render_cache_path=tmp_path / 'renders.sqlite') == (10, 0)
+        outputs.append(re.sub(r'DTSTAMP:\S+', '', output.read_text()))
+    assert outputs[0] == outputs[1]
+    with RenderCache(path=tmp_path / 'renders.sqlite') as cache:
+        assert len(cache) == 10
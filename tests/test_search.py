@@ -0,0 +1,53 @@
+from airport_search import AirportSearchIndex
+
+AIRPORTS = {
+    'KIX': {'name': 'Kansai International Airport', 'city': 'Osaka', 'icao': 'RJBB'},
+    'ITM': {'name': 'Osaka International Airport', 'city': 'Osaka', 'icao': 'RJOO'},
+    'MCI': {'name': 'Kansas City International Airport', 'city': 'Kansas City', 'icao': 'KMCI'},
+    'MKC': {'name': 'Kansas City Downtown Airport', 'city': 'Kansas City', 'icao': 'KMKC'},
+    'CGY': {'name': 'Laguindingan Intl', 'city': 'Laguindingan', 'icao': 'RPMY'},
+    'SHO': {'name': 'King Mswati III Intl', 'city': 'Manzini', 'icao': 'FDSK'},
+}
+
+
+def _codes(query, **kwargs):
+    return [code for code, _ in AirportSearchIndex.build(AIRPORTS).search(query, **kwargs)]
+
+
+def test_typo_prefers_closest_word():
+    # The README example: "Kansia" is one swap away from Kansai, two edits from Kansas
+    assert _codes('Kansia')[0] == 'KIX'
+
+
+def test_rare_word_decides_ties():
+    assert _codes('kansai intl')[0] == 'KIX'
+
+
+def test_codes_rank_first():
+    assert _codes('RJBB')[0] == 'KIX'
+    assert _codes('kix')[0] == 'KIX'
+
+
+def test_readme_example_with_full_data(airport_db):
+    assert airport_db.search('Kansia', limit=3)[0]['code'] == 'KIX'
+
+
+def test_common_word_only_scores_airports_of_rarer_words(monkeypatch):
+    import airport_search
+    monkeypatch.setattr(airport_search, 'MAX_POSTINGS', 3)
+    # "airport" (4 postings) is looked up only for the airports "osaka" found
+    assert _codes('osaka airport', limit=10) == ['ITM', 'KIX']
+    # On its own it walks the first 3 postings, lowest codes first
+    assert _codes('airport', limit=10) == ['ITM', 'KIX', 'MCI']
+
+
+def test_index_signature_follows_content(tmp_path, monkeypatch):
+    from main import AirportDatabase
+    monkeypatch.chdir(tmp_path)
+    signatures = []
+    for name in ('Renamed Field', 'Other Field'):
+        db = AirportDatabase(use_cache=False, lazy=True)
+        db.airports.update({code: dict(info) for code, info in AIRPORTS.items()}, QQQ={'name': name, 'city': 'X'})
+        db.loaded = True
+        signatures.append(db._search_signature())
+    assert signatures[0] != signatures[1]
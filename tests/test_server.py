@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+from main import create_flight_ics
+from server import ICSServer
+
+FLIGHT = {
+    'flight_number': 'NH176', 'passenger_name': 'Jane Doe',
+    'departure_airport': 'KIX', 'departure_time': '2026-03-01 10:00',
+    'arrival_airport': 'HNL', 'arrival_time': '2026-02-28 22:30',
+}
+
+
+def _request(airport_db, raw):
+    """Send one raw request to a fresh server and return (status code, response bytes)."""
+    async def run():
+        server = await asyncio.start_server(ICSServer(airport_db).handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    response = asyncio.run(run())
+    return int(response.split(b' ', 2)[1]), response
+
+
+def _post(body, headers):
+    return b'POST /ics HTTP/1.1\r\nHost: x\r\nConnection: close\r\n' + headers + b'\r\n' + body
+
+
+def test_post_ics(airport_db):
+    body = json.dumps(FLIGHT).encode()
+    status, response = _request(airport_db, _post(body, b'Content-Length: %d\r\n' % len(body)))
+    assert status == 200
+    assert b'BEGIN:VEVENT' in response
+
+
+@pytest.mark.parametrize('value', [b'abc', b'-5'])
+def test_malformed_content_length(airport_db, value):
+    assert _request(airport_db, _post(b'', b'Content-Length: ' + value + b'\r\n'))[0] == 400
+
+
+def test_body_too_large(airport_db):
+    assert _request(airport_db, _post(b'', b'Content-Length: 999999999\r\n'))[0] == 413
+
+
+def test_chunked_body_is_refused(airport_db):
+    body = json.dumps(FLIGHT).encode()
+    chunked = b'%x\r\n%s\r\n0\r\n\r\n' % (len(body), body)
+    assert _request(airport_db, _post(chunked, b'Transfer-Encoding: chunked\r\n'))[0] == 411
+
+
+def test_newline_in_field_is_rejected(airport_db):
+    body = json.dumps(dict(FLIGHT, flight_number='NH1\nEND:VEVENT')).encode()
+    status, response = _request(airport_db, _post(body, b'Content-Length: %d\r\n' % len(body)))
+    assert status == 400
+    assert b'control characters' in response
+
+
+def test_too_many_header_lines(airport_db):
+    headers = b''.join(b'X-Filler-%d: 1\r\n' % i for i in range(200))
+    assert _request(airport_db, _post(b'', headers))[0] == 431
+
+
+def _failing_render(monkeypatch, fail_from):
+    import server
+    calls = []
+
+    def render(flight_data, airport_db):
+        calls.append(flight_data)
+        if len(calls) >= fail_from:
+            raise RuntimeError('boom')
+        return create_flight_ics(flight_data, airport_db)
+
+    monkeypatch.setattr(server, 'create_flight_ics', render)
+    monkeypatch.setattr(server, 'RENDER_BATCH', 1)
+
+
+def test_render_error_before_streaming_is_a_500(airport_db, monkeypatch):
+    _failing_render(monkeypatch, fail_from=1)
+    body = json.dumps(FLIGHT).encode()
+    status, response = _request(airport_db, _post(body, b'Content-Length: %d\r\n' % len(body)))
+    assert status == 500
+    assert b'boom' in response
+
+
+def test_render_error_while_streaming_aborts_the_response(airport_db, monkeypatch):
+    _failing_render(monkeypatch, fail_from=2)
+    body = json.dumps([FLIGHT, dict(FLIGHT, flight_number='NH178')]).encode()
+    status, response = _request(airport_db, _post(body, b'Content-Length: %d\r\n' % len(body)))
+    assert status == 200
+    assert b'NH176' in response
+    assert not response.endswith(b'0\r\n\r\n')
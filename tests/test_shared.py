@@ -0,0 +1,37 @@
+import contextlib
+import io
+import json
+
+from batch import run_batch
+from main import AirportDatabase
+
+
+def test_attached_table_answers_lookups(airport_db):
+    with airport_db.share() as table:
+        worker_db = AirportDatabase.attach_shared(table.name)
+        try:
+            assert worker_db.get_timezone('KIX', ask_if_missing=False) == 'Asia/Tokyo'
+            assert worker_db.find_timezone('RJBB') == 'Asia/Tokyo'
+            assert worker_db.find_timezone('ZZZ') == ''
+            assert len(worker_db) == len(airport_db)
+        finally:
+            worker_db._shared.close()
+
+
+def test_worker_pool_matches_single_process(tmp_path):
+    bookings = tmp_path / 'bookings.jsonl'
+    bookings.write_text(''.join(json.dumps({
+        'flight_number': f'NH{i}', 'passenger_name': 'Jane Doe',
+        'departure_airport': 'KIX', 'departure_time': f'2026-03-{i:02d} 10:00',
+        'arrival_airport': 'HNL', 'arrival_time': f'2026-03-{i - 1:02d} 22:30',
+    }) + '\n' for i in range(2, 29)), encoding='utf-8')
+
+    calendars = []
+    for workers in (1, 2):
+        output = tmp_path / f'w{workers}.ics'
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert run_batch(bookings, output, tmp_path / 'rejects.jsonl', workers=workers,
+                             chunk_size=5, use_cache=False) == (27, 0)
+        calendars.append([line for line in output.read_text(encoding='utf-8').splitlines()
+                          if not line.startswith('DTSTAMP')])
+    assert calendars[0] == calendars[1]
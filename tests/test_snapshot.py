@@ -0,0 +1,49 @@
+import json
+import pytest
+
+from airport_snapshot import AirportSnapshot, build_snapshot
+
+
+@pytest.fixture(scope='module')
+def airports(airport_db):
+    return airport_db.all_airports()
+
+
+def test_round_trip_matches_json_cache(airports):
+    # What save_cache writes to airport_timezone_cache.json, and load_cache reads back
+    cached = json.loads(json.dumps(airports, ensure_ascii=False, default=dict))
+    snapshot = AirportSnapshot(build_snapshot(cached, source='test'))
+
+    assert snapshot.source == 'test'
+    assert list(snapshot.codes()) == sorted(cached)
+    for code, info in cached.items():
+        assert dict(snapshot.get(code)) == info, code
+        assert snapshot.get_timezone(code) == info['tz']
+    assert snapshot.code_for_icao('RJBB') == 'KIX'
+    assert snapshot.codes_in_city('Osaka') == ['ITM', 'KIX']
+
+
+def test_records_keep_their_fields_and_types(airports):
+    sources = {
+        'KIX': airports['KIX'],
+        # Built-in and custom airports have no coordinates or ICAO code
+        'QQA': {'tz': 'Asia/Tokyo', 'name': 'Custom Airport (QQA)', 'city': 'Unknown', 'country': 'Unknown'},
+        'QQB': {'tz': 'UTC', 'name': 'Edited', 'city': 'X', 'country': 'JP',
+                'lat': 34, 'lon': '135.5', 'alt': 26, 'icao': None},
+        'QQC': {'tz': 'UTC', 'name': 'Edited', 'city': 'X', 'country': 'JP', 'lat': '', 'lon': '', 'alt': 12.5},
+    }
+    snapshot = AirportSnapshot(build_snapshot(sources))
+    for code, source in sources.items():
+        record = dict(snapshot.get(code))
+        assert record == dict(source), code
+        assert {k: type(v) for k, v in record.items()} == {k: type(v) for k, v in dict(source).items()}, code
+    assert [(code, lat) for code, lat, _ in snapshot.coordinates() if lat == lat] == [('KIX', 34.4273), ('QQB', 34.0)]
+
+
+def test_close_while_iterating_coordinates(airports, tmp_path):
+    path = tmp_path / 'airports.snap'
+    path.write_bytes(build_snapshot(airports))
+    snapshot = AirportSnapshot.open(path)
+    coordinates = snapshot.coordinates()
+    next(coordinates)
+    snapshot.close()
@@ -0,0 +1,51 @@
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+np = pytest.importorskip('numpy')
+import tz_batch  # noqa: E402
+
+ZONES = ['Europe/London', 'America/New_York', 'Australia/Sydney', 'Australia/Lord_Howe',
+         'America/Sao_Paulo', 'Asia/Tokyo', 'Pacific/Apia', 'America/St_Johns']
+
+
+def _expected(local, tz_name):
+    """UTC instant and DST flags the way datetime.replace(tzinfo=ZoneInfo(...)) resolves them."""
+    zone = ZoneInfo(tz_name)
+    aware = local.replace(tzinfo=zone)
+    utc = aware.astimezone(timezone.utc).replace(tzinfo=None)
+    shifted = aware.utcoffset() != aware.replace(fold=1).utcoffset()
+    skipped = utc.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None) != local
+    return utc, shifted and not skipped, skipped
+
+
+def test_localize_matches_zoneinfo_around_dst_transitions():
+    rng = random.Random(20261017)
+    start = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp())
+    local_times, zones = [], []
+    for tz_name in ZONES:
+        _, instants, before, _ = tz_batch.transition_table(tz_name, start, end)
+        for instant, offset in zip(instants.tolist(), before.tolist()):
+            wall = datetime(1970, 1, 1) + timedelta(seconds=instant + offset)
+            for _ in range(20):
+                local_times.append(wall + timedelta(seconds=rng.randrange(-3 * 3600, 3 * 3600)))
+                zones.append(tz_name)
+    # Plus times anywhere in the range, for zones with and without DST
+    for _ in range(2000):
+        local_times.append(datetime(2000, 1, 1) + timedelta(seconds=rng.randrange(end - start)))
+        zones.append(rng.choice(ZONES))
+
+    utc, ambiguous, nonexistent = tz_batch.localize(np.array(local_times, dtype='datetime64[s]'), zones)
+
+    mismatches = [(local, tz_name)
+                  for local, tz_name, got in zip(local_times, zones, zip(utc.tolist(), ambiguous, nonexistent))
+                  if _expected(local, tz_name) != (got[0], bool(got[1]), bool(got[2]))]
+    assert len(local_times) > 5000
+    assert mismatches == []
+
+
+def test_transition_table_cache_is_bounded():
+    assert tz_batch.transition_table.cache_info().maxsize == tz_batch.TRANSITION_CACHE_SIZE
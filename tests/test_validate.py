@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+import validate  # noqa: E402
+
+
+def _records(*records):
+    return [(i, json.dumps(record)) for i, record in enumerate(records, 1)]
+
+
+def _flight(**fields):
+    record = {
+        'flight_number': 'NH176', 'passenger_name': 'Jane Doe',
+        'departure_airport': 'KIX', 'departure_time': '2026-03-01 10:00',
+        'arrival_airport': 'HNL', 'arrival_time': '2026-02-28 22:30',
+    }
+    record.update(fields)
+    return record
+
+
+def test_empty_input(airport_db):
+    report = validate.validate_records([], airport_db)
+    assert report['records'] == report['valid'] == report['errors'] == 0
+    assert report['issues'] == []
+
+
+def test_all_records_invalid(airport_db):
+    report = validate.validate_records(_records(_flight(departure_airport='ZZZ')), airport_db,
+                                       scope_field='passenger_name')
+    assert report['records'] == 1
+    assert report['valid'] == 0
+    assert report['checks'] == {'unknown_airport': 1}
+
+
+def test_duplicates_and_ordering(airport_db):
+    report = validate.validate_records(_records(
+        _flight(),
+        _flight(seat='2B'),
+        _flight(flight_number='NH177', arrival_time='2026-03-01 09:00', arrival_airport='KIX'),
+    ), airport_db)
+    assert [(issue['line'], issue['check']) for issue in report['issues']] == [
+        (2, 'duplicate_uid'), (3, 'arrival_before_departure')]
+
+
+def test_cancelled_records_checked_unless_updating(airport_db):
+    records = _records(_flight(departure_airport='ZZZ', status='cancelled'))
+    assert validate.validate_records(records, airport_db)['checks'] == {'unknown_airport': 1}
+    assert validate.validate_records(records, airport_db, update=True)['records'] == 0
+
+
+@pytest.mark.parametrize('value', ['2026', '2026-03', '2026-03-01 25:00', '01/03/2026 10:00', '2026-02-30 10:00'])
+def test_times_batch_rejects_are_invalid(airport_db, value):
+    report = validate.validate_records(_records(_flight(departure_time=value)), airport_db)
+    assert report['checks'] == {'invalid_time': 1}
+
+
+@pytest.mark.parametrize('value', ['2026-03-01 10:00', '2026-03-01T10:00', '2026-03-01 10:00:00', ' 2026-03-01 10:00'])
+def test_times_batch_accepts_are_valid(airport_db, value):
+    report = validate.validate_records(_records(_flight(departure_time=value)), airport_db)
+    assert report['errors'] == 0
+
+
+def test_family_on_one_flight_is_a_warning(airport_db):
+    report = validate.validate_records(_records(
+        _flight(), _flight(passenger_name='John Doe'), _flight(seat='2B'),
+    ), airport_db)
+    assert [(issue['line'], issue['severity']) for issue in report['issues']] == [(2, 'warning'), (3, 'error')]
+    assert report['valid'] == 2
+    by_passenger = validate.validate_records(_records(_flight(), _flight(passenger_name='John Doe')), airport_db,
+                                             scope_field='passenger_name')
+    assert by_passenger['issues'] == []
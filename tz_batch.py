@@ -0,0 +1,143 @@
+"""Vectorized timezone normalization for large batches of flights (requires NumPy).
+
+Local wall-clock times are converted to UTC one timezone group at a time:
+each zone's UTC-offset transitions over the span of its flights are found
+once, after which every flight in the group is resolved with a single
+searchsorted. Ambiguous and nonexistent local times (DST fall-back and
+spring-forward) resolve like datetime.replace(tzinfo=ZoneInfo(...)) with
+fold=0, i.e. with the offset in effect before the transition, and are
+flagged so callers can report them.
+"""
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# Spacing of the coarse offset probes used to find transitions; zones never
+# change offset twice within this window.
+_PROBE_SECONDS = 6 * 3600
+# Extra margin around a group's time span, covering the largest UTC offsets
+_MARGIN_SECONDS = 2 * 86400
+# (zone, span) tables kept by transition_table; spans are day-aligned, so a
+# long-running process with drifting batch windows would otherwise grow forever
+TRANSITION_CACHE_SIZE = 1024
+
+
+def _utcoffset(zone, ts):
+    return int(datetime.fromtimestamp(ts, zone).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=TRANSITION_CACHE_SIZE)
+def transition_table(tz_name, start, end):
+    """Return (initial_offset, utc_instants, offsets_before, offsets_after) for a zone.
+
+    Covers transitions between the UTC epoch seconds `start` and `end`;
+    offsets are in seconds.
+    """
+    zone = ZoneInfo(tz_name)
+    probes = range(start, end + _PROBE_SECONDS, _PROBE_SECONDS)
+    instants, before, after = [], [], []
+    previous_ts, previous = start, _utcoffset(zone, start)
+    initial = previous
+    for ts in probes:
+        offset = _utcoffset(zone, ts)
+        if offset != previous:
+            # Bisect down to the exact second of the change
+            lo, hi = previous_ts, ts
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _utcoffset(zone, mid) == previous:
+                    lo = mid
+                else:
+                    hi = mid
+            instants.append(hi)
+            before.append(previous)
+            after.append(offset)
+            previous = offset
+        previous_ts = ts
+    return (initial,
+            np.array(instants, dtype=np.int64),
+            np.array(before, dtype=np.int64),
+            np.array(after, dtype=np.int64))
+
+
+def _to_seconds(local_times):
+    """Coerce strings/datetimes/datetime64 to int64 epoch seconds of the wall clock."""
+    return np.asarray(local_times, dtype='datetime64[s]').astype(np.int64)
+
+
+def _localize_groups(local, group_ids, tz_names):
+    """Convert int64 wall-clock seconds to UTC, given a timezone group per element."""
+    utc = np.empty_like(local)
+    ambiguous = np.zeros(local.shape, dtype=bool)
+    nonexistent = np.zeros(local.shape, dtype=bool)
+
+    # One stable sort splits the batch into contiguous per-zone runs
+    order = np.argsort(group_ids, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(group_ids, minlength=len(tz_names)))))
+    for group, tz_name in enumerate(tz_names):
+        idx = order[bounds[group]:bounds[group + 1]]
+        if not len(idx):
+            continue
+        group_local = local[idx]
+
+        # Round the span out to whole days so nearby batches share a table
+        start = (int(group_local.min()) - _MARGIN_SECONDS) // 86400 * 86400
+        end = (int(group_local.max()) + _MARGIN_SECONDS) // 86400 * 86400
+        initial, instants, before, after = transition_table(tz_name, start, end)
+
+        # With fold=0 a local time switches to the new offset at T + max(before, after)
+        switch = instants + np.maximum(before, after)
+        i = np.searchsorted(switch, group_local, side='right')
+        utc[idx] = group_local - np.concatenate(([initial], after))[i]
+
+        # Local times within [T + min, T + max) of the next transition are repeated or skipped
+        if len(instants):
+            nxt = np.minimum(i, len(instants) - 1)
+            in_window = (i < len(instants)) & (group_local >= instants[nxt] + np.minimum(before, after)[nxt])
+            ambiguous[idx] = in_window & (after[nxt] < before[nxt])
+            nonexistent[idx] = in_window & (after[nxt] > before[nxt])
+
+    return utc.astype('datetime64[s]'), ambiguous, nonexistent
+
+
+def localize(local_times, timezones):
+    """Convert local wall-clock times to UTC.
+
+    `local_times` is array-like of naive datetimes, datetime64 values or
+    'YYYY-MM-DD HH:MM' strings; `timezones` holds an IANA name per element.
+    Returns (utc, ambiguous, nonexistent): utc as datetime64[s], plus two
+    boolean arrays flagging DST fall-back and spring-forward times.
+    """
+    names, group_ids = np.unique(np.asarray(timezones, dtype=str), return_inverse=True)
+    return _localize_groups(_to_seconds(local_times), group_ids.ravel(), names.tolist())
+
+
+def normalize_flights(departure_times, departure_airports, arrival_times, arrival_airports, airport_db):
+    """Resolve timezones and UTC instants for a batch of flights.
+
+    Airport codes are resolved once per distinct code through
+    airport_db.get_timezone(..., ask_if_missing=False). Returns a dict of
+    arrays: departure/arrival timezone, UTC instants, ambiguity and
+    nonexistence flags, and 'duration' in seconds (which create_flight_ics
+    accepts in place of recomputing it).
+    """
+    result = {}
+    for side, times, airports in (('departure', departure_times, departure_airports),
+                                  ('arrival', arrival_times, arrival_airports)):
+        codes, code_ids = np.unique(np.char.upper(np.asarray(airports, dtype=str)), return_inverse=True)
+        code_tz = [airport_db.get_timezone(str(code), ask_if_missing=False) for code in codes]
+
+        # Map airport groups onto (far fewer) timezone groups without re-sorting strings
+        tz_names = sorted(set(code_tz))
+        tz_ids = np.array([tz_names.index(tz) for tz in code_tz], dtype=np.intp)[code_ids.ravel()]
+
+        utc, ambiguous, nonexistent = _localize_groups(_to_seconds(times), tz_ids, tz_names)
+        result[f'{side}_timezone'] = np.array(tz_names, dtype=object)[tz_ids]
+        result[f'{side}_utc'] = utc
+        result[f'{side}_ambiguous'] = ambiguous
+        result[f'{side}_nonexistent'] = nonexistent
+
+    result['duration'] = (result['arrival_utc'] - result['departure_utc']).astype(np.int64)
+    return result
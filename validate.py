@@ -0,0 +1,398 @@
+"""Bulk validation of bookings before calendar generation (requires NumPy).
+
+The whole input is loaded as column arrays and every check runs as one
+vectorized pass over them: airport codes are resolved once per distinct
+code, local times are converted to UTC with tz_batch.localize, and
+duplicates and overlaps are found by sorting and comparing neighbours
+instead of comparing flights pairwise.
+
+Checks (severity):
+    invalid_record            line is not a JSON object (error)
+    missing_field             a required field is empty (error)
+    invalid_time              a time does not parse (error)
+    invalid_timezone          an explicit timezone is not an IANA name (error)
+    unknown_airport           code (or city) without a timezone in the airport
+                              database, so it would fall back to UTC; an
+                              error unless the record gives the timezone
+    arrival_before_departure  arrival is not after departure in UTC (error)
+    duplicate_uid             same event UID as an earlier record of the
+                              same passenger, so the calendar would keep
+                              only one of them (error); of another
+                              passenger in the same calendar, e.g. a
+                              family booking (warning)
+    overlapping_flights       overlaps an earlier flight of the same
+                              passenger (warning)
+    ambiguous_time            local time repeated by a DST change (warning)
+    nonexistent_time          local time skipped by a DST change (warning)
+
+Usage:
+    python3 validate.py bookings.jsonl --report report.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from batch import CANCELLED_STATUSES, REQUIRED_FIELDS, parse_datetime, read_records
+from main import AirportDatabase
+from tz_batch import localize
+
+ERROR, WARNING = 'error', 'warning'
+# Records decoded at a time; only the column arrays are kept between chunks
+CHUNK_SIZE = 65536
+# batch.DATETIME_FORMAT as a fixed-width pattern, checked without parsing; 'D' stands for a digit
+TIME_PATTERN = 'DDDD-DD-DD DD:DD'
+_TIME_CODES = np.array([ord(ch) for ch in TIME_PATTERN], dtype=np.uint32)
+_TIME_SEPARATORS = _TIME_CODES != ord('D')
+
+
+def _decode(chunk, on_issue):
+    """Decode a chunk of (line_number, record) pairs; returns (line numbers, dicts)."""
+    texts = [record for _, record in chunk if isinstance(record, str)]
+    try:
+        # One decoder call for the whole chunk instead of one per line
+        decoded = json.loads("[" + ",".join(texts) + "]") if texts else []
+    except json.JSONDecodeError:
+        decoded = None
+    decoded = iter(decoded) if decoded is not None and len(decoded) == len(texts) else None
+
+    lines, records = [], []
+    for line_no, record in chunk:
+        if isinstance(record, str):
+            if decoded is not None:
+                record = next(decoded)
+            else:
+                try:
+                    record = json.loads(record)
+                except json.JSONDecodeError as e:
+                    on_issue(line_no, 'invalid_record', ERROR, f"invalid JSON: {e}")
+                    continue
+        if not isinstance(record, dict):
+            on_issue(line_no, 'invalid_record', ERROR, "record is not an object")
+            continue
+        lines.append(line_no)
+        records.append(record)
+    return lines, records
+
+
+def _columns(records, on_issue, fields, skip_cancelled=False):
+    """Collect (line_number, record) pairs into stripped string columns, chunk by chunk."""
+    line_parts, parts = [], {field: [] for field in fields}
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, CHUNK_SIZE))
+        if not chunk:
+            break
+        lines, dicts = _decode(chunk, on_issue)
+        keep = np.ones(len(dicts), dtype=bool)
+        if skip_cancelled:
+            # In update mode cancellations only carry enough to find the event; there is nothing to check
+            status = np.char.lower(np.char.strip(np.array([str(r.get('status') or '') for r in dicts], dtype=str)))
+            keep = ~np.isin(status, CANCELLED_STATUSES)
+        line_parts.append(np.array(lines, dtype=np.int64)[keep])
+        for field, values in parts.items():
+            column = np.array([r.get(field) or '' for r in dicts], dtype=str)
+            values.append(np.char.strip(column)[keep])
+    if not line_parts:
+        return np.zeros(0, dtype=np.int64), {field: np.zeros(0, dtype=str) for field in fields}
+    return np.concatenate(line_parts), {field: np.concatenate(values) for field, values in parts.items()}
+
+
+def _parse_times(values):
+    """Parse local times to datetime64[s] exactly as batch.parse_datetime does; NaT where invalid.
+
+    'YYYY-MM-DD HH:MM' strings are parsed from their digits in one
+    vectorized pass; anything else goes through batch.parse_datetime once per distinct value, so
+    forms NumPy alone would accept (e.g. '2026') are rejected as in batch.
+    """
+    parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[s]')
+    rows = np.nonzero(np.char.str_len(values) == len(TIME_PATTERN))[0]
+    # One UCS-4 code point per column: digits and separators where the pattern has them
+    chars = values[rows].astype(f'<U{len(TIME_PATTERN)}').view(np.uint32).reshape(len(rows), len(TIME_PATTERN))
+    digits = chars.astype(np.int64) - ord('0')
+    exact = np.all(np.where(_TIME_SEPARATORS, chars == _TIME_CODES, (digits >= 0) & (digits <= 9)), axis=1)
+
+    def field(start, stop):
+        return digits[:, start:stop] @ 10 ** np.arange(stop - start - 1, -1, -1)
+
+    month = np.datetime64('1970-01', 'M') + ((field(0, 4) - 1970) * 12 + field(5, 7) - 1)
+    day, hour, minute = field(8, 10), field(11, 13), field(14, 16)
+    month_days = ((month + 1).astype('datetime64[D]') - month.astype('datetime64[D]')).astype(np.int64)
+    # Out-of-range fields (e.g. February 30) go to the per-value pass, which rejects them
+    exact &= ((field(5, 7) >= 1) & (field(5, 7) <= 12) & (day >= 1) & (day <= month_days)
+              & (hour <= 23) & (minute <= 59))
+    parsed[rows[exact]] = (month[exact].astype('datetime64[D]') + (day[exact] - 1)
+                           + (hour[exact] * 60 + minute[exact]).astype('timedelta64[m]'))
+
+    slow = np.ones(len(values), dtype=bool)
+    slow[rows[exact]] = False
+    slow &= values != ''
+    distinct, inverse = np.unique(values[slow], return_inverse=True)
+    times = np.full(len(distinct), np.datetime64('NaT'), dtype='datetime64[s]')
+    for i, value in enumerate(distinct.tolist()):
+        try:
+            times[i] = np.datetime64(parse_datetime(value, 'UTC').replace(tzinfo=None), 's')
+        except ValueError:
+            pass
+    parsed[slow] = times[inverse.ravel()]
+    return parsed
+
+
+def _resolve_airports(codes, overrides, airport_db):
+    """Return (timezone, known, invalid_timezone) arrays for one side of the flights."""
+    distinct, inverse = np.unique(codes, return_inverse=True)
+    inverse = inverse.ravel()
+    found = [airport_db.find_timezone(code.upper()) if code else '' for code in distinct.tolist()]
+    known = np.array([bool(tz) for tz in found], dtype=bool)[inverse]
+    airport_tz = np.array([tz or 'UTC' for tz in found], dtype=str)[inverse]
+
+    invalid_names = []
+    for name in np.unique(overrides).tolist():
+        try:
+            if name:
+                ZoneInfo(name)
+        except Exception:
+            invalid_names.append(name)
+    invalid = np.isin(overrides, invalid_names)
+    return np.where((overrides != '') & ~invalid, overrides, airport_tz), known, invalid
+
+
+def _ids(values):
+    """Dense integer ids for a string column (equal strings, equal ids)."""
+    return np.unique(values, return_inverse=True)[1].ravel()
+
+
+def _uid_keys(flight_numbers, departure_local):
+    """Integer keys equal exactly when main.flight_uid() is: (flight number id, local date).
+
+    The number is normalized like flight_uid() does, but only once per
+    distinct number, so no per-row strings are built.
+    """
+    distinct, inverse = np.unique(flight_numbers, return_inverse=True)
+    normalized = np.char.lower(np.char.replace(np.char.replace(distinct, ' ', '-'), '/', '-'))
+    number_ids = _ids(normalized)[inverse.ravel()]
+    return number_ids, departure_local.astype('datetime64[D]').astype(np.int64)
+
+
+def _runs(keys):
+    """Stable-sort rows by several integer keys (the last is primary).
+
+    Returns (order, starts, first): starts marks sorted positions that begin
+    a run of equal keys, first gives each position the start of its run.
+    """
+    order = np.lexsort(keys)
+    starts = np.ones(len(order), dtype=bool)
+    for key in keys:
+        ordered = key[order]
+        starts[1:] &= ordered[1:] == ordered[:-1]
+    starts[1:] = ~starts[1:]
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+    return order, starts, first
+
+
+def _repeats(rows, lines, keys):
+    """Flag rows whose keys(rows) equal an earlier row's, first record of each run kept.
+
+    Returns (flagged, first_line) over all rows of `lines`.
+    """
+    flagged = np.zeros(len(lines), dtype=bool)
+    first_line = np.zeros(len(lines), dtype=np.int64)
+    # Nothing left to compare (empty input, or every record already has an error)
+    if len(rows):
+        order, starts, first = _runs(keys(rows))
+        flagged[rows[order[~starts]]] = True
+        first_line[rows[order]] = lines[rows[order[first]]]
+    return flagged, first_line
+
+
+def _overlaps(group_ids, departure, arrival):
+    """Return (rows, earlier_rows): flights departing before an earlier flight of their group lands.
+
+    One lexsort by (group, departure); a running maximum of arrivals that
+    restarts at each group finds every overlap, not only adjacent ones.
+    """
+    order = np.lexsort((departure, group_ids))
+    groups, dep, arr = group_ids[order], departure[order], arrival[order]
+    if not len(order):
+        return order, order
+    # Lift each group above the previous one so a single accumulate never leaks across groups
+    low, span = int(min(dep.min(), arr.min())), int(max(dep.max(), arr.max()) - min(dep.min(), arr.min())) + 1
+    lifted = (arr - low) + groups.astype(np.int64) * span
+    running = np.maximum.accumulate(lifted)
+
+    # Remember which row set the running maximum, to name it in the report
+    new_max = np.ones(len(order), dtype=bool)
+    new_max[1:] = lifted[1:] >= running[:-1]
+    holder = np.maximum.accumulate(np.where(new_max, np.arange(len(order)), 0))
+
+    same_group = np.zeros(len(order), dtype=bool)
+    same_group[1:] = groups[1:] == groups[:-1]
+    lifted_dep = (dep - low) + groups.astype(np.int64) * span
+    hit = np.zeros(len(order), dtype=bool)
+    hit[1:] = same_group[1:] & (lifted_dep[1:] < running[:-1])
+    positions = np.nonzero(hit)[0]
+    return order[positions], order[holder[positions - 1]]
+
+
+def validate_records(records, airport_db, scope_field=None, update=False):
+    """Validate (line_number, record) pairs as read by batch.read_records.
+
+    Duplicate UIDs are counted across the whole input, or within each value
+    of `scope_field` (e.g. 'passenger_name' when every passenger gets their
+    own calendar). With `update`, the records are changes for an update run
+    and records with status 'cancelled' are not checked; otherwise they are
+    rendered like any other flight and checked as such. Returns a report dict: record and issue counts, counts
+    per check, and 'issues' as {line, check, severity, message} sorted by line.
+    """
+    issues = []
+
+    def on_issue(line_no, check, severity, message):
+        issues.append({'line': line_no, 'check': check, 'severity': severity, 'message': message})
+
+    fields = set(REQUIRED_FIELDS) | {'departure_timezone', 'arrival_timezone'}
+    if scope_field:
+        fields.add(scope_field)
+    lines, col = _columns(records, on_issue, sorted(fields), skip_cancelled=update)
+    count = len(lines)
+
+    def report(mask, check, severity, template, *columns):
+        # Pull only the flagged rows out of the arrays, as Python values, in one go
+        rows = np.nonzero(mask)[0]
+        values = zip(*(column[rows].tolist() for column in columns)) if columns else itertools.repeat(())
+        for line_no, args in zip(lines[rows].tolist(), values):
+            on_issue(line_no, check, severity, template.format(*args))
+
+    # Required fields
+    missing = np.zeros(count, dtype=bool)
+    for field in REQUIRED_FIELDS:
+        empty = col[field] == ''
+        report(empty, 'missing_field', ERROR, f"missing field: {field}")
+        missing |= empty
+
+    # Airports and timezones, resolved once per distinct code / zone name
+    zones, utc, local = {}, {}, {}
+    usable = ~missing
+    for side in ('departure', 'arrival'):
+        codes, overrides = col[f'{side}_airport'], col[f'{side}_timezone']
+        timezone, known, invalid_tz = _resolve_airports(codes, overrides, airport_db)
+        zones[side] = timezone
+        report(invalid_tz, 'invalid_timezone', ERROR,
+               f"{side}_timezone is not a known timezone: {{}}", overrides)
+        unknown = ~known & (codes != '')
+        report(unknown & (overrides == ''), 'unknown_airport', ERROR,
+               f"unknown {side} airport {{}} (would fall back to UTC)", codes)
+        report(unknown & (overrides != ''), 'unknown_airport', WARNING,
+               f"unknown {side} airport {{}} (timezone given in the record)", codes)
+
+        times = _parse_times(col[f'{side}_time'])
+        bad_time = np.isnat(times) & (col[f'{side}_time'] != '')
+        report(bad_time, 'invalid_time', ERROR, f"{side}_time does not parse: {{}}", col[f'{side}_time'])
+        usable &= ~np.isnat(times) & ~invalid_tz & ~(unknown & (overrides == ''))
+
+        # NaT would widen the transition tables to the whole calendar; park those rows at the epoch
+        local[side] = np.where(np.isnat(times), np.datetime64(0, 's'), times)
+        utc[side], ambiguous, nonexistent = localize(local[side], timezone)
+        report(ambiguous & usable, 'ambiguous_time', WARNING,
+               f"{side} time occurs twice (DST change); using the earlier one")
+        report(nonexistent & usable, 'nonexistent_time', WARNING, f"{side} time is skipped by a DST change")
+
+    departure = utc['departure'].astype(np.int64)
+    arrival = utc['arrival'].astype(np.int64)
+    backwards = usable & (arrival <= departure)
+    report(backwards, 'arrival_before_departure', ERROR, "arrival {} ({}) is not after departure {} ({})",
+           col['arrival_time'], zones['arrival'], col['departure_time'], zones['departure'])
+    usable &= ~backwards
+
+    # Duplicate UIDs: sort the keys and compare neighbours; the first record of each run wins.
+    # The same passenger twice is an error, passengers sharing a calendar (a family booking) a warning.
+    def uid_keys(rows, *fields):
+        number_ids, days = _uid_keys(col['flight_number'][rows], local['departure'][rows])
+        return (days, number_ids) + tuple(_ids(col[field][rows]) for field in fields)
+
+    scope = (scope_field,) if scope_field else ()
+    duplicate, first_line = _repeats(np.nonzero(usable)[0], lines,
+                                     lambda rows: uid_keys(rows, *scope, 'passenger_name'))
+    report(duplicate, 'duplicate_uid', ERROR, "same flight and departure date as line {}", first_line)
+    usable &= ~duplicate
+    shared, first_line = _repeats(np.nonzero(usable)[0], lines, lambda rows: uid_keys(rows, *scope))
+    report(shared, 'duplicate_uid', WARNING, "same flight and departure date as line {} (another passenger), "
+           "so calendar apps show one event for both", first_line)
+
+    # Overlapping flights of one passenger
+    rows = np.nonzero(usable)[0]
+    later, earlier = _overlaps(_ids(col['passenger_name'][rows]), departure[rows], arrival[rows])
+    overlapping = np.zeros(count, dtype=bool)
+    overlapping[rows[later]] = True
+    other_line = np.zeros(count, dtype=np.int64)
+    other_line[rows[later]] = lines[rows[earlier]]
+    report(overlapping, 'overlapping_flights', WARNING, "departs before the flight on line {} of {} lands",
+           other_line, col['passenger_name'])
+
+    issues.sort(key=lambda issue: issue['line'])
+    checks = {}
+    for issue in issues:
+        checks[issue['check']] = checks.get(issue['check'], 0) + 1
+    error_lines = {issue['line'] for issue in issues if issue['severity'] == ERROR}
+    return {
+        'records': count + sum(1 for issue in issues if issue['check'] == 'invalid_record'),
+        'valid': count - len(error_lines.intersection(lines.tolist())),
+        'errors': sum(1 for issue in issues if issue['severity'] == ERROR),
+        'warnings': sum(1 for issue in issues if issue['severity'] == WARNING),
+        'checks': checks,
+        'issues': issues,
+    }
+
+
+def error_messages(report):
+    """Map line number -> message for records with errors (for the reject file)."""
+    messages = {}
+    for issue in report['issues']:
+        if issue['severity'] == ERROR and issue['line'] not in messages:
+            messages[issue['line']] = f"{issue['check']}: {issue['message']}"
+    return messages
+
+
+def validate_file(input_path, report_path=None, airport_db=None, scope_field=None, update=False):
+    """Validate a CSV/JSONL bookings file, optionally writing the report as JSON."""
+    if airport_db is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            airport_db = AirportDatabase(use_cache=True)
+    report = validate_records(read_records(input_path), airport_db, scope_field, update)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, separators=(',', ':'))
+    return report
+
+
+def print_summary(report):
+    print(f"📊 {report['records']} record(s): {report['valid']} valid, "
+          f"{report['errors']} error(s), {report['warnings']} warning(s)")
+    for check, count in sorted(report['checks'].items(), key=lambda item: -item[1]):
+        print(f"   {check}: {count}")
+
+
+def main():
+    """Command-line entry point for validating a bookings file."""
+    parser = argparse.ArgumentParser(description="Check a CSV or JSONL bookings file before generating calendars.")
+    parser.add_argument('input', help="bookings file (.csv or .jsonl)")
+    parser.add_argument('--report', help="write the full report as JSON to this file")
+    parser.add_argument('--group-by', metavar='FIELD',
+                        help="count duplicate flights within each value of FIELD (one calendar per value)")
+    parser.add_argument('--update', action='store_true',
+                        help="the records are changes for batch.py --update (cancellations are not checked)")
+    args = parser.parse_args()
+
+    report = validate_file(args.input, args.report, scope_field=args.group_by, update=args.update)
+    print_summary(report)
+    if args.report:
+        print(f"📁 Report written to {os.path.abspath(args.report)}")
+    raise SystemExit(1 if report['errors'] else 0)
+
+
+if __name__ == "__main__":
+    main()